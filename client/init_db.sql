@@ -19,6 +19,13 @@ CREATE TABLE IF NOT EXISTS users (
     CONSTRAINT username_valid_pattern CHECK (username ~ '^[a-z_][a-z0-9_-]*$')
 );
 
+-- Última revisión de users aplicada (sincronización incremental)
+CREATE TABLE IF NOT EXISTS sync_state (
+    name VARCHAR PRIMARY KEY,
+    revision BIGINT,
+    digest VARCHAR  -- Digest del último snapshot aplicado (NULL tras un delta)
+);
+
 -- Índices para mejorar rendimiento
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
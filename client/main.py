@@ -6,8 +6,30 @@ from fastapi import FastAPI, HTTPException
 from client.router.containers import router as containers_router
 from client.router.metrics import router as metrics_router
 from client.router.sync import router as sync_router
+from client.utils.decompress import DecompressRequestMiddleware
+from client.utils.gpu import gpu_collector
+from client.utils.heartbeat import heartbeat
+from client.utils.sampler import sampler
+from client.utils.shipper import shipper
 
 app = FastAPI()
+app.add_middleware(DecompressRequestMiddleware)  # Cuerpos gzip/zstd del servidor central
+
+
+@app.on_event("startup")
+def start_background_workers():
+    """Arranca el muestreo de métricas, el envío de lotes y el latido al servidor central"""
+    sampler.start()
+    shipper.start()
+    heartbeat.start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    heartbeat.stop()
+    shipper.stop()
+    sampler.stop()
+    gpu_collector.stop()
 
 
 @app.get("/")
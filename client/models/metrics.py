@@ -1,8 +1,11 @@
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, Optional
 from datetime import datetime
 import json
 
+from ..utils.gpu import compact_gpu_usage
+from ..utils.rates import compact_disk_rates, compact_network_rates
+
 class MetricOut(BaseModel):
     server_id: int
     cpu_usage: str
@@ -10,9 +13,13 @@ class MetricOut(BaseModel):
     disk_usage: str
     timestamp: str
     gpu_usage: str = "N/A"
+    disk_io: str = "{}"  # disk throughput/IOPS rates, see compact_disk_rates
+    network_io: str = "{}"  # per-NIC throughput/packet/error rates, see compact_network_rates
 
     @staticmethod
-    def from_system_info(server_id: int, system_info: dict) -> "MetricOut":
+    def from_system_info(
+        server_id: int, system_info: dict, collected_at: Optional[datetime] = None
+    ) -> "MetricOut":
         cpu = system_info.get("cpu", {})
         ram = system_info.get("ram", {})
         disk = system_info.get("disk", {})
@@ -40,10 +47,80 @@ class MetricOut(BaseModel):
             cpu_usage=cpu_str,
             memory_usage=memory_str,
             disk_usage=disk_str,
-            timestamp=datetime.utcnow().isoformat() + "Z",
-            gpu_usage="N/A"
+            timestamp=(collected_at or datetime.utcnow()).isoformat() + "Z",
+            gpu_usage=compact_gpu_usage(system_info.get("gpu")),
+            disk_io=compact_disk_rates(disk.get("rates")),
+            network_io=compact_network_rates((system_info.get("network") or {}).get("rates")),
         )
 
+def _mean(values) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 2) if values else None
+
+
+class MetricSample(BaseModel):
+    """
+    Muestra tipada con campos numéricos (ver utils/metric_codec.py).
+
+    Es lo que envía el shipper: en binario compacto si el servidor lo acepta,
+    o como JSON en el campo "samples" del lote.
+    """
+
+    ts: float  # epoch UTC en segundos
+    cpu_percent: Optional[float] = None
+    load_1: Optional[float] = None
+    mem_percent: Optional[float] = None
+    mem_used: Optional[float] = None  # bytes
+    mem_total: Optional[float] = None  # bytes
+    swap_percent: Optional[float] = None
+    disk_percent: Optional[float] = None
+    disk_used: Optional[float] = None  # bytes
+    disk_total: Optional[float] = None  # bytes
+    disk_read_bps: Optional[float] = None
+    disk_write_bps: Optional[float] = None
+    net_rx_bps: Optional[float] = None
+    net_tx_bps: Optional[float] = None
+    gpu_percent: Optional[float] = None  # media de carga de todas las GPUs
+    gpu_mem_percent: Optional[float] = None  # media de memoria de todas las GPUs
+    gpu_usage: str = "N/A"  # detalle por GPU, ver compact_gpu_usage
+    disk_io: str = "{}"  # tasas/IOPS por disco, ver compact_disk_rates
+    network_io: str = "{}"  # tasas/paquetes/errores por NIC, ver compact_network_rates
+
+    @staticmethod
+    def from_system_info(system_info: dict, ts: float) -> "MetricSample":
+        cpu = system_info.get("cpu") or {}
+        ram = system_info.get("ram") or {}
+        swap = system_info.get("swap") or {}
+        disk = system_info.get("disk") or {}
+        disk_usage = disk.get("usage") or {}
+        disk_rates = (disk.get("rates") or {}).get("total") or {}
+        network_rates = (system_info.get("network") or {}).get("rates")
+        net_rates = (network_rates or {}).get("total") or {}
+        gpu_devices = (system_info.get("gpu") or {}).get("devices") or []
+        load_avg = cpu.get("load_avg")
+        return MetricSample(
+            ts=ts,
+            cpu_percent=cpu.get("usage_percent"),
+            load_1=load_avg[0] if load_avg else None,
+            mem_percent=ram.get("percent"),
+            mem_used=ram.get("used"),
+            mem_total=ram.get("total"),
+            swap_percent=swap.get("percent"),
+            disk_percent=disk_usage.get("percent"),
+            disk_used=disk_usage.get("used"),
+            disk_total=disk_usage.get("total"),
+            disk_read_bps=disk_rates.get("read_bytes"),
+            disk_write_bps=disk_rates.get("write_bytes"),
+            net_rx_bps=net_rates.get("bytes_recv"),
+            net_tx_bps=net_rates.get("bytes_sent"),
+            gpu_percent=_mean(d.get("load") for d in gpu_devices),
+            gpu_mem_percent=_mean(d.get("memory_utilization") for d in gpu_devices),
+            gpu_usage=compact_gpu_usage(system_info.get("gpu")),
+            disk_io=compact_disk_rates(disk.get("rates")),
+            network_io=compact_network_rates(network_rates),
+        )
+
+
 class LocalSystemMetrics(BaseModel):
     data: Any
     collected_at: str
@@ -2,18 +2,38 @@
 Router para reportar estado de contenedores Docker locales.
 
 Este módulo NO usa base de datos local, consulta Docker directamente.
+El uso de recursos por contenedor sale de los cgroups (utils/cgroups.py),
+muestreado en segundo plano por el colector "containers".
 """
 
 import os
 import subprocess
-from typing import List
+from typing import Dict, List
+
+from fastapi.concurrency import run_in_threadpool
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from ..utils.collectors import get_collector
+
 router = APIRouter(prefix="/api/containers", tags=["Containers"])
 
 
+class ContainerResources(BaseModel):
+    """Uso de recursos de un contenedor según sus cgroups"""
+
+    cpu_percent: float | None = None  # relativo a un núcleo (200 = 2 núcleos)
+    memory_bytes: int | None = None
+    memory_limit: int | None = None
+    memory_percent: float | None = None
+    io_read_bps: float | None = None
+    io_write_bps: float | None = None
+    io_read_iops: float | None = None
+    io_write_iops: float | None = None
+    gpu_memory_mb: float | None = None
+
+
 class ContainerReport(BaseModel):
     """Modelo para reportar estado de un contenedor local"""
 
@@ -23,6 +43,12 @@ class ContainerReport(BaseModel):
     status: str  # running, exited, created, paused, etc.
     ports: str | None = None
     created: str | None = None
+    resources: ContainerResources | None = None  # Solo contenedores en ejecución
+
+
+class ContainerResourcesEntry(ContainerResources):
+    container_id: str
+    name: str | None = None
 
 
 class ContainerReportResponse(BaseModel):
@@ -134,6 +160,59 @@ def get_all_docker_containers() -> List[ContainerReport]:
         raise
 
 
+def get_container_resources() -> Dict[str, dict]:
+    """
+    Último uso de recursos por contenedor ({id completo: métricas}).
+
+    Se sirve desde la caché del colector "containers" (refrescada por el
+    muestreador cada pocos segundos), así que no recorre los cgroups en cada
+    petición salvo que el valor haya caducado.
+    """
+    collector = get_collector("containers")
+    return (collector.get() if collector else None) or {}
+
+
+def _resources_for(container_id: str, resources: Dict[str, dict]) -> dict | None:
+    # docker ps devuelve el ID corto (12 caracteres); los cgroups el completo
+    for full_id, usage in resources.items():
+        if full_id.startswith(container_id):
+            return usage
+    return None
+
+
+def attach_resources(containers: List[ContainerReport]) -> List[ContainerReport]:
+    resources = get_container_resources()
+    for container in containers:
+        usage = _resources_for(container.container_id, resources)
+        if usage is not None:
+            container.resources = ContainerResources(**usage)
+    return containers
+
+
+@router.get("/resources", response_model=List[ContainerResourcesEntry])
+async def container_resources():
+    """
+    Uso de CPU, memoria, IO y memoria de GPU por contenedor en ejecución,
+    ordenado de mayor a menor consumo de CPU.
+
+    Los nombres se resuelven con docker ps; si Docker no responde se
+    devuelven solo los IDs.
+    """
+    resources = await run_in_threadpool(get_container_resources)
+    try:
+        containers = await run_in_threadpool(get_all_docker_containers)
+        names = {c.container_id: c.name for c in containers}
+    except Exception:
+        names = {}
+
+    entries = []
+    for full_id, usage in resources.items():
+        name = next((n for short_id, n in names.items() if full_id.startswith(short_id)), None)
+        entries.append(ContainerResourcesEntry(container_id=full_id, name=name, **usage))
+    entries.sort(key=lambda e: e.cpu_percent or 0, reverse=True)
+    return entries
+
+
 @router.get("/report", response_model=ContainerReportResponse)
 async def report_containers():
     """
@@ -147,7 +226,7 @@ async def report_containers():
     No usa base de datos local, consulta Docker directamente.
     """
     try:
-        containers = get_all_docker_containers()
+        containers = attach_resources(get_all_docker_containers())
 
         return ContainerReportResponse(
             success=True,
@@ -184,6 +263,7 @@ async def get_container_status(container_name: str):
             raise HTTPException(
                 status_code=404, detail=f"Container '{container_name}' not found"
             )
+        attach_resources([container])
 
         return {
             "success": True,
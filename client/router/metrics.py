@@ -1,19 +1,90 @@
-from fastapi import APIRouter, Query
-from typing import Any
-from ..utils.metrics import get_system_info, build_server_metric
+import math
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, List, Optional, Union
+from ..utils.collectors import PROFILES, filter_snapshot, list_collectors, snapshot_covers
+from ..utils.metrics import build_server_metric, get_system_info
+from ..utils.sampler import sampler, sample_datetime
 from ..models.metrics import MetricOut, LocalSystemMetrics
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
-@router.get("/local", response_model=LocalSystemMetrics)
-async def local_metrics():
-    """Return raw detailed local system metrics snapshot."""
-    return LocalSystemMetrics(data=get_system_info(), collected_at="now")
 
-@router.get("/server-format", response_model=MetricOut)
-async def server_format_metric(server_id: int = Query(1, ge=1)):
-    """Return a compact metric formatted for server ingestion/storage."""
-    metric = build_server_metric(server_id)
+def _latest_sample():
+    sample = sampler.latest()
+    if sample is None:
+        # El muestreador aún no ha tomado la primera muestra (arranque)
+        raise HTTPException(
+            status_code=503,
+            detail="No metrics sample available yet",
+            headers={"Retry-After": str(math.ceil(sampler.interval))},
+        )
+    return sample
+
+
+def _to_metric_out(metric: Any) -> MetricOut:
     if isinstance(metric, MetricOut):
         return metric
-    return MetricOut(**metric)  # type: ignore
\ No newline at end of file
+    return MetricOut(**metric)  # type: ignore
+
+
+@router.get("/local", response_model=Union[LocalSystemMetrics, List[LocalSystemMetrics]])
+async def local_metrics(
+    profile: str = Query("standard", description="Collector profile: minimal, standard or full"),
+    since: Optional[datetime] = Query(None, description="Only samples taken after this instant"),
+    last: Optional[int] = Query(None, ge=1, description="Return at most the N newest samples"),
+):
+    """Return the newest detailed local snapshot, or a window of them if since/last is given.
+
+    Profiles the background sampler already covers are served from its buffer;
+    richer ones (e.g. `full`, which includes network connections) are collected
+    on request.
+    """
+    if profile not in PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown profile '{profile}'. Available: {', '.join(PROFILES)}",
+        )
+
+    if since is None and last is None:
+        if not snapshot_covers(profile, sampler.profile):
+            data = await run_in_threadpool(get_system_info, profile)
+            return LocalSystemMetrics(data=data, collected_at=datetime.utcnow().isoformat() + "Z")
+        ts, data = _latest_sample()
+        return LocalSystemMetrics(
+            data=filter_snapshot(data, profile), collected_at=sample_datetime(ts).isoformat() + "Z"
+        )
+    return [
+        LocalSystemMetrics(
+            data=filter_snapshot(data, profile), collected_at=sample_datetime(ts).isoformat() + "Z"
+        )
+        for ts, data in sampler.window(since=since, last=last)
+    ]
+
+
+@router.get("/server-format", response_model=Union[MetricOut, List[MetricOut]])
+async def server_format_metric(
+    server_id: int = Query(1, ge=1),
+    since: Optional[datetime] = Query(None, description="Only samples taken after this instant"),
+    last: Optional[int] = Query(None, ge=1, description="Return at most the N newest samples"),
+):
+    """Return compact metrics formatted for server ingestion/storage."""
+    if since is None and last is None:
+        ts, data = _latest_sample()
+        return _to_metric_out(build_server_metric(server_id, data, sample_datetime(ts)))
+    return [
+        _to_metric_out(build_server_metric(server_id, data, sample_datetime(ts)))
+        for ts, data in sampler.window(since=since, last=last)
+    ]
+
+
+@router.get("/collectors")
+async def collectors_info():
+    """List registered collectors with their cadence, cost class and profiles."""
+    return {
+        "sampler_profile": sampler.profile,
+        "sampler_interval": sampler.interval,
+        "profiles": PROFILES,
+        "collectors": list_collectors(),
+    }
@@ -1,5 +1,23 @@
 """
 Router para sincronización de datos desde el servidor central
+
+Los usuarios llegan de dos formas:
+- POST /api/sync/users: lista completa (snapshot); borra los que no vienen
+- POST /api/sync/users/delta: solo los cambios desde la revisión base_revision
+
+La última revisión aplicada se guarda en sync_state, en la misma transacción
+que los cambios. Si un delta no empieza en una revisión que el cliente ya
+tiene, se responde 409 con la revisión local y el servidor envía lo que falta
+(o un snapshot).
+
+Cada snapshot trae el digest de su contenido (también en If-None-Match), que
+se guarda en sync_state al aplicarlo. Si llega otro snapshot con el mismo
+digest, se responde 304 sin reescribir usuarios ni regenerar los ficheros
+NSS/PAM; solo se actualiza la revisión. Un delta borra el digest guardado.
+
+Los usuarios se escriben por lotes (utils/user_store.py): COPY a una tabla
+temporal, un upsert que solo reescribe las filas que cambian y, en los
+snapshots, un único DELETE de los que faltan.
 """
 
 import os
@@ -8,10 +26,11 @@ from datetime import datetime
 from typing import List, Optional
 
 import psycopg2
-from dateutil import parser as date_parser
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from pydantic import BaseModel
 
+from client.utils.user_store import apply_users
+
 router = APIRouter(prefix="/api/sync", tags=["Synchronization"])
 
 
@@ -52,6 +71,15 @@ def ensure_tables_exist(conn):
                 ADD COLUMN IF NOT EXISTS password_changed_at TIMESTAMP WITH TIME ZONE DEFAULT NULL
         """)
 
+        # Revisión de users aplicada (sincronización incremental)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                name VARCHAR PRIMARY KEY,
+                revision BIGINT
+            )
+        """)
+        cur.execute("ALTER TABLE sync_state ADD COLUMN IF NOT EXISTS digest VARCHAR")
+
         # Crear índices si no existen
         cur.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
@@ -93,9 +121,21 @@ class SyncRequest(BaseModel):
     """Request de sincronización con metadatos"""
 
     server_url: Optional[str] = None  # URL del servidor central
+    revision: Optional[int] = None  # Revisión de users del snapshot
+    digest: Optional[str] = None  # Digest del contenido (ETag del snapshot)
     users: List[UserSync]
 
 
+class DeltaSyncRequest(BaseModel):
+    """Cambios de usuarios entre base_revision y revision"""
+
+    server_url: Optional[str] = None
+    base_revision: int
+    revision: int
+    users: List[UserSync] = []  # Creados o modificados
+    deleted_ids: List[int] = []
+
+
 class SyncResponse(BaseModel):
     """Respuesta de sincronización"""
 
@@ -105,6 +145,8 @@ class SyncResponse(BaseModel):
     users_created: int
     users_updated: int
     users_deleted: int
+    users_unchanged: int = 0
+    revision: Optional[int] = None  # Revisión aplicada
 
 
 def get_db_connection():
@@ -118,8 +160,207 @@ def get_db_connection():
     )
 
 
+def _save_server_url(server_url: str) -> None:
+    """Guarda la URL del servidor central en /etc/default/sssd-pgsql"""
+    try:
+        config_file = "/etc/default/sssd-pgsql"
+        config_lines = []
+        server_url_exists = False
+
+        # Leer configuración existente si existe
+        if os.path.exists(config_file):
+            with open(config_file, "r") as f:
+                for line in f:
+                    if line.startswith("SERVER_URL="):
+                        config_lines.append(f"SERVER_URL={server_url}\n")
+                        server_url_exists = True
+                    else:
+                        config_lines.append(line)
+
+        # Si no existe la línea, agregarla
+        if not server_url_exists:
+            config_lines.append(f"SERVER_URL={server_url}\n")
+
+        # Escribir configuración actualizada
+        with open(config_file, "w") as f:
+            f.writelines(config_lines)
+
+        print(f"✅ SERVER_URL auto-configurado: {server_url}")
+    except Exception as e:
+        print(f"⚠️  No se pudo auto-configurar SERVER_URL: {str(e)}")
+        # No fallar la sincronización por esto
+
+
+def _open_db():
+    """Conecta a la base de datos local y verifica/crea las tablas"""
+    print("🔌 Connecting to local database...")
+    try:
+        conn = get_db_connection()
+        print("✅ Database connection established")
+    except psycopg2.OperationalError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Database connection failed: {str(e)}. Please verify that client_db is running.",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unexpected error connecting to database: {str(e)}",
+        )
+
+    print("🗄️  Verifying/creating database tables...")
+    try:
+        ensure_tables_exist(conn)
+        print("✅ Database tables verified")
+    except Exception as e:
+        conn.close()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to initialize database tables: {str(e)}",
+        )
+    return conn
+
+
+def get_local_revision(cur) -> Optional[int]:
+    """Última revisión de users aplicada, o None si nunca se aplicó ninguna"""
+    cur.execute("SELECT revision FROM sync_state WHERE name = 'users'")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def get_local_digest(cur) -> Optional[str]:
+    """Digest del último snapshot aplicado, o None si después llegó un delta"""
+    cur.execute("SELECT digest FROM sync_state WHERE name = 'users'")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _set_local_revision(cur, revision: Optional[int], digest: Optional[str] = None) -> None:
+    cur.execute(
+        """
+        INSERT INTO sync_state (name, revision, digest) VALUES ('users', %s, %s)
+        ON CONFLICT (name) DO UPDATE SET revision = EXCLUDED.revision, digest = EXCLUDED.digest
+        """,
+        (revision, digest),
+    )
+
+
+def _etag_matches(if_none_match: Optional[str], digest: Optional[str]) -> bool:
+    """Si la cabecera If-None-Match incluye el digest (admite W/ y varias ETags)"""
+    if not if_none_match or not digest:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/").strip('"') == digest for tag in tags)
+
+
+def _nss_files_present() -> bool:
+    return os.path.exists("/etc/passwd-pgsql") and os.path.exists("/var/lib/extrausers/shadow")
+
+
+def _commit(conn) -> None:
+    print(f"\n💾 Committing changes to database...")
+    try:
+        conn.commit()
+        print(f"✅ Database changes committed successfully")
+    except Exception as e:
+        conn.rollback()
+        if conn:
+            conn.close()
+        raise HTTPException(
+            status_code=500, detail=f"Failed to commit database changes: {str(e)}"
+        )
+
+
+def _regenerate_nss_files() -> List[str]:
+    """Regenera passwd y shadow desde la base de datos local. Devuelve los errores"""
+    # Crear directorios necesarios si no existen
+    print("\n📁 Creating necessary directories...")
+    os.makedirs("/var/lib/extrausers", exist_ok=True)
+    os.makedirs("/etc", exist_ok=True)
+
+    # Regenerar archivos passwd y shadow con manejo de errores
+    print("🔄 Regenerating NSS/PAM files...")
+    errors = []
+
+    try:
+        result = subprocess.run(
+            ["bash", "/app/client/utils/generate_passwd_from_db.sh"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        if result.returncode != 0:
+            error_msg = f"generate_passwd_from_db.sh failed (exit {result.returncode}): {result.stderr}"
+            print(f"ERROR: {error_msg}")
+            errors.append(error_msg)
+        else:
+            print("✅ Successfully generated /etc/passwd-pgsql")
+    except subprocess.TimeoutExpired:
+        error_msg = "generate_passwd_from_db.sh timed out"
+        print(f"ERROR: {error_msg}")
+        errors.append(error_msg)
+    except Exception as e:
+        error_msg = f"generate_passwd_from_db.sh exception: {str(e)}"
+        print(f"ERROR: {error_msg}")
+        errors.append(error_msg)
+
+    try:
+        result = subprocess.run(
+            ["bash", "/app/client/utils/generate_shadow_from_db.sh"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        if result.returncode != 0:
+            error_msg = f"generate_shadow_from_db.sh failed (exit {result.returncode}): {result.stderr}"
+            print(f"ERROR: {error_msg}")
+            errors.append(error_msg)
+        else:
+            print("✅ Successfully generated /var/lib/extrausers/shadow")
+    except subprocess.TimeoutExpired:
+        error_msg = "generate_shadow_from_db.sh timed out"
+        print(f"ERROR: {error_msg}")
+        errors.append(error_msg)
+    except Exception as e:
+        error_msg = f"generate_shadow_from_db.sh exception: {str(e)}"
+        print(f"ERROR: {error_msg}")
+        errors.append(error_msg)
+
+    return errors
+
+
+def _raise_sync_error(e: Exception):
+    """Convierte un error inesperado de la sincronización en HTTPException"""
+    if isinstance(e, HTTPException):
+        # Re-raise HTTP exceptions with logging
+        print(f"\n❌ HTTP Exception: {e.status_code} - {e.detail}")
+        raise e
+
+    import traceback
+
+    if isinstance(e, psycopg2.OperationalError):
+        error_msg = (
+            f"Database operational error: {str(e)}. Please check database connectivity."
+        )
+        status_code = 503
+    elif isinstance(e, psycopg2.Error):
+        error_msg = f"Database error during synchronization: {str(e)}"
+        status_code = 500
+    else:
+        error_msg = (
+            f"Unexpected error synchronizing users: {type(e).__name__}: {str(e)}"
+        )
+        status_code = 500
+    print(f"\n❌ {error_msg}")
+    print(f"Traceback: {traceback.format_exc()}")
+    raise HTTPException(status_code=status_code, detail=error_msg)
+
+
 @router.post("/users", response_model=SyncResponse)
-async def sync_users(sync_data: SyncRequest):
+async def sync_users(
+    sync_data: SyncRequest,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Sincroniza la lista completa de usuarios desde el servidor central.
     También guarda la URL del servidor para sincronización de contraseñas.
@@ -130,375 +371,167 @@ async def sync_users(sync_data: SyncRequest):
     3. Recibe la lista completa de usuarios desde el servidor central
     4. Actualiza o crea usuarios en la base de datos local
     5. Elimina usuarios que ya no existen en el servidor central
-    6. Mantiene la base de datos local sincronizada
+    6. Guarda la revisión y el digest del snapshot para los siguientes deltas
     7. Regenera archivos NSS/PAM para autenticación SSH
-    """
-    print("=" * 80)
-    print("🔄 CLIENT: Received sync request")
-    print(f"📦 Total users to sync: {len(sync_data.users)}")
-    print(f"🌐 Server URL: {sync_data.server_url}")
-
-    # Log estructura del primer usuario para debug
-    if sync_data.users:
-        first_user = sync_data.users[0]
-        print(f"📝 Sample user structure:")
-        print(f"   - id: {first_user.id}")
-        print(f"   - username: {first_user.username}")
-        print(f"   - email: {first_user.email}")
-        print(f"   - is_admin: {first_user.is_admin}")
-        print(f"   - is_active: {first_user.is_active}")
-        print(f"   - must_change_password: {first_user.must_change_password}")
-        print(f"   - system_uid: {first_user.system_uid}")
-        print(f"   - system_gid: {first_user.system_gid}")
-        print(
-            f"   - ssh_public_key: {'Present' if first_user.ssh_public_key else 'None'}"
-        )
-        print(f"   - created_at: {first_user.created_at}")
-    print("=" * 80)
 
+    Si If-None-Match coincide con el digest del último snapshot aplicado,
+    responde 304 y se salta los pasos 4, 5 y 7 (solo guarda la revisión).
+    """
     users = sync_data.users
+    print(f"🔄 CLIENT: Received snapshot with {len(users)} users (revision {sync_data.revision})")
 
     # Guardar SERVER_URL si fue proporcionado
     if sync_data.server_url:
-        try:
-            config_file = "/etc/default/sssd-pgsql"
-            config_lines = []
-            server_url_exists = False
-
-            # Leer configuración existente si existe
-            if os.path.exists(config_file):
-                with open(config_file, "r") as f:
-                    for line in f:
-                        if line.startswith("SERVER_URL="):
-                            config_lines.append(f"SERVER_URL={sync_data.server_url}\n")
-                            server_url_exists = True
-                        else:
-                            config_lines.append(line)
-
-            # Si no existe la línea, agregarla
-            if not server_url_exists:
-                config_lines.append(f"SERVER_URL={sync_data.server_url}\n")
-
-            # Escribir configuración actualizada
-            with open(config_file, "w") as f:
-                f.writelines(config_lines)
-
-            print(f"✅ SERVER_URL auto-configurado: {sync_data.server_url}")
-        except Exception as e:
-            print(f"⚠️  No se pudo auto-configurar SERVER_URL: {str(e)}")
-            # No fallar la sincronización por esto
+        _save_server_url(sync_data.server_url)
 
     conn = None
     try:
-        print("🔌 Connecting to local database...")
-        # Conectar a la base de datos
-        try:
-            conn = get_db_connection()
-            print("✅ Database connection established")
-        except psycopg2.OperationalError as e:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Database connection failed: {str(e)}. Please verify that client_db is running.",
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Unexpected error connecting to database: {str(e)}",
-            )
-
-        # Verificar/crear tablas
-        print("🗄️  Verifying/creating database tables...")
-        try:
-            ensure_tables_exist(conn)
-            print("✅ Database tables verified")
-        except Exception as e:
-            if conn:
-                conn.close()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to initialize database tables: {str(e)}",
-            )
-
+        conn = _open_db()
         cur = conn.cursor()
 
-        users_created = 0
-        users_updated = 0
-        users_deleted = 0
-
-        # IDs de usuarios que vienen del servidor central
-        central_user_ids = {user.id for user in users}
-        print(f"📋 Central user IDs: {central_user_ids}")
-
-        # Obtener IDs de usuarios locales
-        try:
-            cur.execute("SELECT id FROM users")
-            local_user_ids = {row[0] for row in cur.fetchall()}
-            print(f"📋 Local user IDs: {local_user_ids}")
-        except psycopg2.ProgrammingError as e:
-            if conn:
-                conn.close()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error querying users table: {str(e)}. Table may not exist or be corrupted.",
-            )
+        local_digest = get_local_digest(cur)
+        if _etag_matches(if_none_match, local_digest):
+            if get_local_revision(cur) != sync_data.revision:
+                _set_local_revision(cur, sync_data.revision, local_digest)
+                _commit(conn)
+            cur.close()
+            conn.close()
+            if not _nss_files_present():
+                _regenerate_nss_files()
+            print(f"✅ Snapshot {local_digest[:19]} already applied, revision={sync_data.revision}")
+            return Response(status_code=304, headers={"ETag": f'"{local_digest}"'})
 
-        # Procesar cada usuario del servidor central
-        print(f"\n⚙️  Processing {len(users)} users...")
-        for user in users:
-            try:
-                print(f"   Processing user: {user.username} (id={user.id})")
-                # Parsear created_at si viene como string
-                created_at_value = user.created_at
-                if isinstance(created_at_value, str):
-                    try:
-                        created_at_value = date_parser.parse(created_at_value)
-                    except:
-                        created_at_value = None
-
-                # system_gid puede ser None - será detectado y actualizado automáticamente
-                # por el script sync_docker_group.sh que detecta el GID de Docker del servidor
-                system_gid_value = user.system_gid
-
-                # Verificar si el usuario existe localmente
-                cur.execute("SELECT id FROM users WHERE id = %s", (user.id,))
-                existing = cur.fetchone()
-
-                if existing:
-                    # Actualizar usuario existente
-                    print(f"      ↻ Updating existing user: {user.username}")
-                    try:
-                        cur.execute(
-                            """
-                            UPDATE users
-                            SET username = %s,
-                                email = %s,
-                                password_hash = %s,
-                                is_admin = %s,
-                                is_active = %s,
-                                must_change_password = %s,
-                                system_uid = %s,
-                                system_gid = %s,
-                                ssh_public_key = %s,
-                                password_max_age_days = %s,
-                                password_changed_at = %s,
-                                created_at = %s
-                            WHERE id = %s
-                        """,
-                            (
-                                user.username,
-                                user.email,
-                                user.password_hash,
-                                user.is_admin,
-                                user.is_active,
-                                user.must_change_password,
-                                user.system_uid,
-                                system_gid_value,
-                                user.ssh_public_key,
-                                user.password_max_age_days,
-                                user.password_changed_at,
-                                created_at_value,
-                                user.id,
-                            ),
-                        )
-                        users_updated += 1
-                        print(f"      ✅ User {user.username} updated successfully")
-                    except psycopg2.IntegrityError as e:
-                        print(
-                            f"      ⚠️  Warning: Could not update user {user.username}: {str(e)}"
-                        )
-                        conn.rollback()
-                        continue
-                else:
-                    # Crear nuevo usuario
-                    print(f"      + Creating new user: {user.username}")
-                    try:
-                        cur.execute(
-                            """
-                            INSERT INTO users
-                            (id, username, email, password_hash, is_admin, is_active,
-                             must_change_password, system_uid, system_gid, ssh_public_key,
-                             password_max_age_days, password_changed_at, created_at)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                            (
-                                user.id,
-                                user.username,
-                                user.email,
-                                user.password_hash,
-                                user.is_admin,
-                                user.is_active,
-                                user.must_change_password,
-                                user.system_uid,
-                                system_gid_value,
-                                user.ssh_public_key,
-                                user.password_max_age_days,
-                                user.password_changed_at,
-                                created_at_value,
-                            ),
-                        )
-                        users_created += 1
-                        print(f"      ✅ User {user.username} created successfully")
-                    except psycopg2.IntegrityError as e:
-                        print(
-                            f"      ⚠️  Warning: Could not create user {user.username}: {str(e)}"
-                        )
-                        conn.rollback()
-                        continue
-
-            except Exception as e:
-                print(f"      ❌ Error processing user {user.username}: {str(e)}")
-                import traceback
-
-                print(f"      Traceback: {traceback.format_exc()}")
-                conn.rollback()
-                continue
-
-        # Eliminar usuarios que ya no existen en el servidor central
-        users_to_delete = local_user_ids - central_user_ids
-        print(f"\n🗑️  Users to delete: {users_to_delete}")
-        if users_to_delete:
-            try:
-                cur.execute(
-                    "DELETE FROM users WHERE id = ANY(%s)", (list(users_to_delete),)
-                )
-                users_deleted = len(users_to_delete)
-                print(f"   ✅ Deleted {users_deleted} users")
-            except Exception as e:
-                print(f"   ⚠️  Warning: Could not delete users: {str(e)}")
-                conn.rollback()
+        counts = apply_users(cur, (user.model_dump() for user in users), delete_missing=True)
+        _set_local_revision(cur, sync_data.revision, sync_data.digest)
 
         # Commit todos los cambios
-        print(f"\n💾 Committing changes to database...")
-        try:
-            conn.commit()
-            print(f"✅ Database changes committed successfully")
-        except Exception as e:
-            conn.rollback()
-            if conn:
-                conn.close()
-            raise HTTPException(
-                status_code=500, detail=f"Failed to commit database changes: {str(e)}"
-            )
+        _commit(conn)
 
         cur.close()
         conn.close()
 
-        # Crear directorios necesarios si no existen
-        print("\n📁 Creating necessary directories...")
-        os.makedirs("/var/lib/extrausers", exist_ok=True)
-        os.makedirs("/etc", exist_ok=True)
-
-        # Regenerar archivos passwd y shadow con manejo de errores
-        print("🔄 Regenerating NSS/PAM files...")
-        errors = []
-
-        try:
-            result = subprocess.run(
-                ["bash", "/app/client/utils/generate_passwd_from_db.sh"],
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            if result.returncode != 0:
-                error_msg = f"generate_passwd_from_db.sh failed (exit {result.returncode}): {result.stderr}"
-                print(f"ERROR: {error_msg}")
-                errors.append(error_msg)
-            else:
-                print("✅ Successfully generated /etc/passwd-pgsql")
-        except subprocess.TimeoutExpired:
-            error_msg = "generate_passwd_from_db.sh timed out"
-            print(f"ERROR: {error_msg}")
-            errors.append(error_msg)
-        except Exception as e:
-            error_msg = f"generate_passwd_from_db.sh exception: {str(e)}"
-            print(f"ERROR: {error_msg}")
-            errors.append(error_msg)
-
-        try:
-            result = subprocess.run(
-                ["bash", "/app/client/utils/generate_shadow_from_db.sh"],
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            if result.returncode != 0:
-                error_msg = f"generate_shadow_from_db.sh failed (exit {result.returncode}): {result.stderr}"
-                print(f"ERROR: {error_msg}")
-                errors.append(error_msg)
-            else:
-                print("✅ Successfully generated /var/lib/extrausers/shadow")
-        except subprocess.TimeoutExpired:
-            error_msg = "generate_shadow_from_db.sh timed out"
-            print(f"ERROR: {error_msg}")
-            errors.append(error_msg)
-        except Exception as e:
-            error_msg = f"generate_shadow_from_db.sh exception: {str(e)}"
-            print(f"ERROR: {error_msg}")
-            errors.append(error_msg)
-
-        # Mensaje informativo sobre permisos de Docker
-        print("")
-        print("ℹ️  IMPORTANTE: Los usuarios sincronizados necesitan permisos de Docker")
-        print("   Para darles acceso, ejecuta en el host:")
-        print("   sudo bash /ruta/a/add_users_to_docker.sh")
-        print("")
+        errors = _regenerate_nss_files()
 
         # Si hay errores, incluirlos en la respuesta pero no fallar
         message = f"Successfully synchronized {len(users)} users"
         if errors:
             message += f" (Warnings: {'; '.join(errors)})"
 
-        print("\n" + "=" * 80)
-        print(f"✅ SYNC COMPLETED SUCCESSFULLY")
-        print(f"   Total users: {len(users)}")
-        print(f"   Created: {users_created}")
-        print(f"   Updated: {users_updated}")
-        print(f"   Deleted: {users_deleted}")
-        print("=" * 80 + "\n")
+        print(
+            f"✅ SYNC COMPLETED: {len(users)} users, created={counts['created']}, "
+            f"updated={counts['updated']}, unchanged={counts['unchanged']}, "
+            f"deleted={counts['deleted']}, revision={sync_data.revision}"
+        )
 
         return SyncResponse(
             success=True,
             message=message,
             users_synced=len(users),
-            users_created=users_created,
-            users_updated=users_updated,
-            users_deleted=users_deleted,
+            users_created=counts["created"],
+            users_updated=counts["updated"],
+            users_deleted=counts["deleted"],
+            users_unchanged=counts["unchanged"],
+            revision=sync_data.revision,
         )
 
-    except HTTPException as http_ex:
-        # Re-raise HTTP exceptions with logging
-        print(f"\n❌ HTTP Exception: {http_ex.status_code} - {http_ex.detail}")
-        raise
+    except Exception as e:
+        _raise_sync_error(e)
 
-    except psycopg2.OperationalError as e:
-        error_msg = (
-            f"Database operational error: {str(e)}. Please check database connectivity."
-        )
-        print(f"\n❌ {error_msg}")
-        import traceback
+    finally:
+        # Asegurar que la conexión se cierre
+        if conn and not conn.closed:
+            conn.close()
 
-        print(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=503, detail=error_msg)
 
-    except psycopg2.Error as e:
-        error_msg = f"Database error during synchronization: {str(e)}"
-        print(f"\n❌ {error_msg}")
-        import traceback
+@router.post("/users/delta", response_model=SyncResponse)
+async def sync_users_delta(delta: DeltaSyncRequest):
+    """
+    Aplica solo los cambios de usuarios entre base_revision y revision.
+
+    - 409 con {"revision": <local>} si el cliente no tiene base_revision
+      (nunca sincronizó o se perdió algún cambio); el servidor reenvía desde
+      la revisión local o un snapshot
+    - Si ya está en revision o más allá, no hace nada
+    - Los borrados se aplican antes que las altas, por si se reutiliza un
+      username; los ficheros NSS/PAM solo se regeneran si algo cambió
+    """
+    print(
+        f"🔄 CLIENT: Received delta r{delta.base_revision}→r{delta.revision}: "
+        f"{len(delta.users)} changed, {len(delta.deleted_ids)} deleted"
+    )
 
-        print(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=error_msg)
+    if delta.server_url:
+        _save_server_url(delta.server_url)
 
-    except Exception as e:
-        error_msg = (
-            f"Unexpected error synchronizing users: {type(e).__name__}: {str(e)}"
+    conn = None
+    try:
+        conn = _open_db()
+        cur = conn.cursor()
+
+        local_revision = get_local_revision(cur)
+        if local_revision is None or local_revision < delta.base_revision:
+            print(f"⚠️  Local revision {local_revision} cannot apply delta from r{delta.base_revision}")
+            raise HTTPException(
+                status_code=409,
+                detail={
+                    "message": "Delta does not start at a revision applied on this client",
+                    "revision": local_revision,
+                },
+            )
+        if local_revision >= delta.revision:
+            print(f"ℹ️  Already at revision {local_revision}, nothing to apply")
+            return SyncResponse(
+                success=True,
+                message=f"Already at revision {local_revision}",
+                users_synced=0,
+                users_created=0,
+                users_updated=0,
+                users_deleted=0,
+                revision=local_revision,
+            )
+
+        users_deleted = 0
+        if delta.deleted_ids:
+            cur.execute("DELETE FROM users WHERE id = ANY(%s)", (delta.deleted_ids,))
+            users_deleted = cur.rowcount
+
+        # Un fallo (p. ej. un UNIQUE) deshace la transacción: la revisión no avanza
+        counts = apply_users(cur, (user.model_dump() for user in delta.users))
+        users_created = counts["created"]
+        users_updated = counts["updated"]
+
+        _set_local_revision(cur, delta.revision)
+        _commit(conn)
+        cur.close()
+        conn.close()
+
+        errors = []
+        if users_created or users_updated or users_deleted:
+            errors = _regenerate_nss_files()
+
+        message = f"Applied revision {delta.revision}"
+        if errors:
+            message += f" (Warnings: {'; '.join(errors)})"
+        print(
+            f"✅ DELTA APPLIED: r{delta.revision} "
+            f"(created={users_created}, updated={users_updated}, "
+            f"unchanged={counts['unchanged']}, deleted={users_deleted})"
         )
-        print(f"\n❌ {error_msg}")
-        import traceback
 
-        print(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=error_msg)
+        return SyncResponse(
+            success=True,
+            message=message,
+            users_synced=len(delta.users),
+            users_created=users_created,
+            users_updated=users_updated,
+            users_deleted=users_deleted,
+            users_unchanged=counts["unchanged"],
+            revision=delta.revision,
+        )
+
+    except Exception as e:
+        _raise_sync_error(e)
 
     finally:
-        # Asegurar que la conexión se cierre
         if conn and not conn.closed:
             conn.close()
@@ -0,0 +1,100 @@
+"""
+Pruebas de utils/cgroups.py sobre árboles de cgroups (v1 y v2) y /proc falsos.
+"""
+
+from client.utils.cgroups import ContainerResourceMonitor
+
+CID = "a" * 64
+OTHER = "b" * 64
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _v2_tree(root, usage_usec, memory, rbytes, wbytes, rios, wios):
+    _write(root / "cgroup.controllers", "cpu io memory\n")
+    scope = root / "system.slice" / f"docker-{CID}.scope"
+    _write(scope / "cpu.stat", f"usage_usec {usage_usec}\nuser_usec 0\nsystem_usec 0\n")
+    _write(scope / "memory.current", f"{memory}\n")
+    _write(scope / "memory.max", f"{1024 ** 3}\n")
+    # Dos dispositivos: se suman
+    _write(
+        scope / "io.stat",
+        f"8:0 rbytes={rbytes} wbytes={wbytes} rios={rios} wios={wios} dbytes=0 dios=0\n"
+        "8:16 rbytes=0 wbytes=0 rios=0 wios=0 dbytes=0 dios=0\n",
+    )
+
+
+def _v1_tree(root, usage_ns, memory, rbytes, wbytes, rios, wios):
+    _write(root / "cpu,cpuacct" / "docker" / CID / "cpuacct.usage", f"{usage_ns}\n")
+    memory_dir = root / "memory" / "docker" / CID
+    _write(memory_dir / "memory.usage_in_bytes", f"{memory}\n")
+    _write(memory_dir / "memory.limit_in_bytes", "9223372036854771712\n")  # sin límite
+    blkio = root / "blkio" / "docker" / CID
+    _write(
+        blkio / "blkio.throttle.io_service_bytes",
+        f"8:0 Read {rbytes}\n8:0 Write {wbytes}\n8:0 Total {rbytes + wbytes}\nTotal {rbytes + wbytes}\n",
+    )
+    _write(
+        blkio / "blkio.throttle.io_serviced",
+        f"8:0 Read {rios}\n8:0 Write {wios}\n8:0 Total {rios + wios}\nTotal {rios + wios}\n",
+    )
+
+
+def test_v2_deltas(tmp_path):
+    monitor = ContainerResourceMonitor(root=str(tmp_path), proc_root=str(tmp_path / "proc"))
+    _v2_tree(tmp_path, 1_000_000, 256 * 1024 ** 2, 0, 0, 0, 0)
+    first = monitor.sample(ts=100.0)
+    assert first[CID]["cpu_percent"] is None
+    assert first[CID]["memory_percent"] == 25.0
+
+    # 2 s después: 1,5 núcleos, 8 MiB leídos y 4 MiB escritos
+    _v2_tree(tmp_path, 4_000_000, 512 * 1024 ** 2, 8 * 1024 ** 2, 4 * 1024 ** 2, 200, 100)
+    second = monitor.sample(ts=102.0)[CID]
+    assert second["cpu_percent"] == 150.0
+    assert second["memory_bytes"] == 512 * 1024 ** 2
+    assert second["memory_limit"] == 1024 ** 3
+    assert second["memory_percent"] == 50.0
+    assert second["io_read_bps"] == 4 * 1024 ** 2
+    assert second["io_write_bps"] == 2 * 1024 ** 2
+    assert second["io_read_iops"] == 100
+    assert second["io_write_iops"] == 50
+
+
+def test_v1_deltas(tmp_path):
+    monitor = ContainerResourceMonitor(root=str(tmp_path), proc_root=str(tmp_path / "proc"))
+    _v1_tree(tmp_path, 0, 100 * 1024 ** 2, 0, 0, 0, 0)
+    assert monitor.sample(ts=0.0)[CID]["io_read_bps"] is None
+
+    # 4 s después: medio núcleo, 1 MiB leído y 2 MiB escritos
+    _v1_tree(tmp_path, 2_000_000_000, 120 * 1024 ** 2, 1024 ** 2, 2 * 1024 ** 2, 40, 80)
+    second = monitor.sample(ts=4.0)[CID]
+    assert second["cpu_percent"] == 50.0
+    assert second["memory_bytes"] == 120 * 1024 ** 2
+    assert second["memory_limit"] is None
+    assert second["memory_percent"] is None
+    assert second["io_read_bps"] == 256 * 1024
+    assert second["io_write_bps"] == 512 * 1024
+    assert second["io_read_iops"] == 10
+    assert second["io_write_iops"] == 20
+
+
+def test_gpu_memory_by_container(tmp_path):
+    proc = tmp_path / "proc"
+    _write(proc / "10" / "cgroup", f"0::/system.slice/docker-{CID}.scope\n")
+    _write(proc / "11" / "cgroup", f"12:memory:/docker/{CID}\n")
+    _write(proc / "12" / "cgroup", f"0::/system.slice/docker-{OTHER}.scope\n")
+    _write(proc / "13" / "cgroup", "0::/user.slice/user-1000.slice\n")
+    _v2_tree(tmp_path / "cgroup", 0, 0, 0, 0, 0, 0)
+
+    monitor = ContainerResourceMonitor(root=str(tmp_path / "cgroup"), proc_root=str(proc))
+    devices = [
+        {"processes": [{"pid": 10, "used_memory_mb": 1000}, {"pid": 13, "used_memory_mb": 50}]},
+        {"processes": [{"pid": 11, "used_memory_mb": 500}, {"pid": 12, "used_memory_mb": 300}]},
+    ]
+    sample = monitor.sample(gpu_devices=devices, ts=0.0)
+    assert sample[CID]["gpu_memory_mb"] == 1500
+    # Solo se informan los contenedores con cgroup en CGROUP_ROOT
+    assert OTHER not in sample
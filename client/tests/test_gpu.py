@@ -0,0 +1,106 @@
+"""
+Pruebas de utils/gpu.py con el nvidia-smi falso de scripts/testing.
+"""
+
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from client.utils import gpu
+from client.utils.gpu import GPUCollector, compact_gpu_usage
+
+FAKE_NVIDIA_SMI = Path(__file__).resolve().parents[2] / "scripts" / "testing" / "fake_nvidia_smi.sh"
+
+pytestmark = pytest.mark.skipif(shutil.which("bash") is None, reason="fake nvidia-smi needs bash")
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.05)
+    raise AssertionError("condition not met in time")
+
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    binary = tmp_path / "nvidia-smi"
+    binary.symlink_to(FAKE_NVIDIA_SMI)
+    monkeypatch.setenv("FAKE_GPU_COUNT", "2")
+    monkeypatch.setenv("FAKE_GPU_PIDS", "4242:1024,4343:512")
+    monkeypatch.setattr(gpu, "RESTART_BACKOFF_SECONDS", 0)
+    collector = GPUCollector(poll_ms=100, binary=str(binary))
+    yield collector
+    collector.stop()
+
+
+def _loaded(collector):
+    snapshot = collector.snapshot()
+    devices = snapshot["devices"] or []
+    if len(devices) == 2 and all(d.get("load") is not None for d in devices) and devices[0]["processes"]:
+        return snapshot
+    return None
+
+
+def test_snapshot_and_compact_usage(collector):
+    snapshot = _wait_for(lambda: _loaded(collector))
+    first, second = snapshot["devices"]
+
+    assert [first["id"], second["id"]] == [0, 1]
+    assert first["uuid"] == "GPU-fake-0" and first["name"] == "NVIDIA Fake 0"
+    assert first["memory_total_mb"] == 24576
+    assert 0 <= first["load"] < 100
+    assert 0 <= first["memory_used_mb"] < 24576
+    assert first["memory_utilization"] == round(first["memory_used_mb"] / 24576 * 100, 2)
+    assert first["power_draw_w"] is None  # [N/A]
+    assert first["processes"] == [
+        {"pid": 4242, "name": "python", "used_memory_mb": 1024.0},
+        {"pid": 4343, "name": "python", "used_memory_mb": 512.0},
+    ]
+    assert second["processes"] == []
+    assert json.loads(snapshot["summary"])["gpu_id"] == 0
+
+    usage = json.loads(compact_gpu_usage(snapshot))
+    assert [entry[0] for entry in usage] == [0, 1]
+    assert usage[0][1:5] == [first["load"], first["memory_utilization"], first["memory_used_mb"], first["temperature"]]
+    assert usage[0][5] == [[4242, 1024.0], [4343, 512.0]]
+    assert usage[1][5] == []
+
+
+def test_readers_restart_after_exit(collector):
+    _wait_for(lambda: _loaded(collector))
+    pids = {reader._proc.pid for reader in collector._readers}
+    for reader in collector._readers:
+        reader._proc.kill()
+    _wait_for(lambda: not any(reader.alive for reader in collector._readers))
+
+    collector.ensure_started()
+    assert all(reader.alive for reader in collector._readers)
+    assert not pids & {reader._proc.pid for reader in collector._readers}
+    _wait_for(lambda: _loaded(collector))
+
+
+def test_concurrent_ensure_started_spawns_one_pair(collector, monkeypatch):
+    started = []
+    original = gpu._LoopReader.start
+
+    def counting_start(reader):
+        started.append(reader.name)
+        time.sleep(0.05)  # Ensancha la ventana de la carrera
+        original(reader)
+
+    monkeypatch.setattr(gpu._LoopReader, "start", counting_start)
+    assert collector.discover()
+    threads = [threading.Thread(target=collector.ensure_started) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(started) == ["gpu-apps", "gpu-query"]
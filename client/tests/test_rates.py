@@ -0,0 +1,22 @@
+"""
+Pruebas de utils/rates.py: tasas entre lecturas y contadores que retroceden.
+"""
+
+from client.utils.rates import CounterRates, counter_delta
+
+
+def test_counter_delta_treats_any_decrease_as_reset():
+    assert counter_delta(100, 350) == 250
+    # Un contador de 64 bits reiniciado cerca de 2^32 no es un desbordamiento
+    assert counter_delta(2**32 - 10, 5) == 5
+    assert counter_delta(2**40, 0) == 0
+
+
+def test_counter_rates():
+    rates = CounterRates(["read_bytes"])
+    assert rates.update({"sda": {"read_bytes": 1000}}, ts=10.0) is None
+    assert rates.update({"sda": {"read_bytes": 5000}, "sdb": {"read_bytes": 7}}, ts=12.0) == {
+        "sda": {"read_bytes": 2000.0}
+    }
+    # sda reiniciado: cuenta desde 0
+    assert rates.update({"sda": {"read_bytes": 300}}, ts=13.0) == {"sda": {"read_bytes": 300.0}}
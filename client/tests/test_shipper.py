@@ -0,0 +1,80 @@
+"""
+Pruebas de utils/shipper.py: qué hace avanzar el spool y qué se reintenta.
+"""
+
+import httpx
+import pytest
+
+pytest.importorskip("pydantic")
+
+from client.utils.metric_codec import encode_samples
+from client.utils.shipper import MetricShipper
+from client.utils.spool import MetricSpool
+
+
+class _NoSamples:
+    def window(self, since=None):
+        return []
+
+
+def _shipper(handler):
+    shipper = MetricShipper(_NoSamples(), MetricSpool(None, 1024 * 1024), replay_rate=1e9)
+    shipper._http = httpx.Client(transport=httpx.MockTransport(handler))
+    return shipper
+
+
+def _sample(ts):
+    return {"ts": ts, "cpu_percent": 10.0}
+
+
+@pytest.fixture(autouse=True)
+def _server_url(monkeypatch):
+    monkeypatch.setenv("SERVER_URL", "http://server.test")
+
+
+def test_corrupt_record_is_skipped():
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(202)
+
+    shipper = _shipper(handler)
+    shipper.spool.append(encode_samples([_sample(1.0)]))
+    shipper.spool.append(encode_samples([_sample(2.0)])[:-3])  # truncado
+    shipper.spool.append(b"garbage")
+
+    assert shipper.ship_once()
+    assert len(shipper.spool) == 0
+    assert len(sent) == 1
+
+
+@pytest.mark.parametrize("status_code", [400, 404, 422])
+def test_permanent_rejection_drops_batch(status_code):
+    shipper = _shipper(lambda request: httpx.Response(status_code, text="rejected"))
+    shipper.spool.append(encode_samples([_sample(1.0)]))
+
+    assert shipper.ship_once()
+    assert len(shipper.spool) == 0
+
+
+@pytest.mark.parametrize("status_code", [408, 429, 500, 503])
+def test_temporary_failure_keeps_batch(status_code):
+    shipper = _shipper(lambda request: httpx.Response(status_code, headers={"Retry-After": "7"}))
+    shipper.spool.append(encode_samples([_sample(1.0)]))
+
+    assert not shipper.ship_once()
+    assert len(shipper.spool) == 1
+    if status_code in (429, 503):
+        assert shipper.next_delay() == 7
+
+
+def test_transport_error_keeps_batch():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    shipper = _shipper(handler)
+    shipper.spool.append(encode_samples([_sample(1.0)]))
+
+    assert not shipper.ship_once()
+    assert len(shipper.spool) == 1
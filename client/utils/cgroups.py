@@ -0,0 +1,227 @@
+"""
+Métricas por contenedor leídas directamente de los cgroups.
+
+Leer los ficheros de contabilidad del kernel es mucho más barato que
+`docker stats` (que abre un stream por contenedor a través del daemon):
+
+- cgroup v2: cpu.stat (usage_usec), memory.current, memory.max, io.stat
+- cgroup v1: cpuacct.usage, memory.usage_in_bytes, memory.limit_in_bytes,
+  blkio.throttle.io_service_bytes / io_serviced
+
+Los contenedores se localizan por su ID de 64 caracteres en las rutas que usan
+los drivers systemd (system.slice/docker-<id>.scope) y cgroupfs (docker/<id>).
+CGROUP_ROOT permite apuntar a un árbol montado desde el host (el cliente corre
+en un contenedor y su propio /sys/fs/cgroup solo muestra su cgroup) o a un
+árbol falso en un directorio temporal.
+"""
+
+import os
+import re
+import time
+from typing import Dict, Iterable, Optional
+
+from .rates import CounterRates
+
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+PROC_ROOT = os.getenv("PROC_ROOT", "/proc")
+
+_CONTAINER_DIR = re.compile(r"^(?:docker-)?([0-9a-f]{64})(?:\.scope)?$")
+_CONTAINER_ID_IN_PATH = re.compile(r"(?:docker[-/])([0-9a-f]{64})")
+
+# Directorios padre donde Docker crea los cgroups de los contenedores
+_PARENTS = ("system.slice", "docker")
+_V1_CONTROLLERS = {
+    "cpu": ("cpu,cpuacct", "cpuacct", "cpu"),
+    "memory": ("memory",),
+    "blkio": ("blkio",),
+}
+_UNLIMITED = 2**60  # memory.limit_in_bytes sin límite en v1 (0x7FFFFFFFFFFFF000)
+
+RATE_FIELDS = ["cpu_usec", "io_read_bytes", "io_write_bytes", "io_read_ops", "io_write_ops"]
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _read_int(path: str) -> Optional[int]:
+    value = _read(path)
+    if value is None:
+        return None
+    value = value.strip()
+    if not value or value == "max":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _read_keyed(path: str) -> Dict[str, int]:
+    """Fichero 'clave valor' por línea (cpu.stat, memory.stat)."""
+    values = {}
+    for line in (_read(path) or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+    return values
+
+
+def is_cgroup_v2(root: str = CGROUP_ROOT) -> bool:
+    return os.path.exists(os.path.join(root, "cgroup.controllers"))
+
+
+def _scan(base: str) -> Dict[str, str]:
+    """{container_id: ruta} de los cgroups de contenedor bajo `base`."""
+    found = {}
+    for parent in _PARENTS:
+        directory = os.path.join(base, parent)
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            continue
+        for entry in entries:
+            match = _CONTAINER_DIR.match(entry)
+            if match:
+                found[match.group(1)] = os.path.join(directory, entry)
+    return found
+
+
+def discover_containers(root: str = CGROUP_ROOT) -> Dict[str, Dict[str, str]]:
+    """
+    Localiza los cgroups de los contenedores en ejecución.
+
+    Devuelve {container_id: {controlador: ruta}}; en v2 todas las claves
+    apuntan al mismo directorio unificado.
+    """
+    if is_cgroup_v2(root):
+        return {
+            cid: {"cpu": path, "memory": path, "blkio": path}
+            for cid, path in _scan(root).items()
+        }
+
+    containers: Dict[str, Dict[str, str]] = {}
+    for controller, candidates in _V1_CONTROLLERS.items():
+        for name in candidates:
+            base = os.path.join(root, name)
+            if not os.path.isdir(base):
+                continue
+            for cid, path in _scan(base).items():
+                containers.setdefault(cid, {})[controller] = path
+            break
+    return containers
+
+
+def _io_v2(path: str) -> Dict[str, int]:
+    # "8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0" por dispositivo
+    totals = {"io_read_bytes": 0, "io_write_bytes": 0, "io_read_ops": 0, "io_write_ops": 0}
+    keys = {"rbytes": "io_read_bytes", "wbytes": "io_write_bytes", "rios": "io_read_ops", "wios": "io_write_ops"}
+    for line in (_read(os.path.join(path, "io.stat")) or "").splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key in keys and value.isdigit():
+                totals[keys[key]] += int(value)
+    return totals
+
+
+def _io_v1(path: str) -> Dict[str, int]:
+    # "8:0 Read 123" / "8:0 Write 456" por dispositivo, más una línea "Total"
+    totals = {"io_read_bytes": 0, "io_write_bytes": 0, "io_read_ops": 0, "io_write_ops": 0}
+    for filename, suffix in (("blkio.throttle.io_service_bytes", "bytes"), ("blkio.throttle.io_serviced", "ops")):
+        for line in (_read(os.path.join(path, filename)) or "").splitlines():
+            parts = line.split()
+            if len(parts) == 3 and parts[1] in ("Read", "Write") and parts[2].isdigit():
+                totals[f"io_{parts[1].lower()}_{suffix}"] += int(parts[2])
+    return totals
+
+
+def read_container_counters(paths: Dict[str, str], v2: bool) -> dict:
+    """Contadores crudos de un contenedor (CPU en µs, memoria e IO en bytes)."""
+    if v2:
+        path = paths["cpu"]
+        return {
+            "cpu_usec": _read_keyed(os.path.join(path, "cpu.stat")).get("usage_usec", 0),
+            "memory_bytes": _read_int(os.path.join(path, "memory.current")),
+            "memory_limit": _read_int(os.path.join(path, "memory.max")),
+            **_io_v2(path),
+        }
+
+    cpu_ns = _read_int(os.path.join(paths["cpu"], "cpuacct.usage")) if "cpu" in paths else None
+    memory_path = paths.get("memory")
+    limit = _read_int(os.path.join(memory_path, "memory.limit_in_bytes")) if memory_path else None
+    return {
+        "cpu_usec": (cpu_ns or 0) // 1000,
+        "memory_bytes": _read_int(os.path.join(memory_path, "memory.usage_in_bytes")) if memory_path else None,
+        "memory_limit": limit if limit is not None and limit < _UNLIMITED else None,
+        **(_io_v1(paths["blkio"]) if "blkio" in paths else {}),
+    }
+
+
+def container_id_for_pid(pid: int, proc_root: str = PROC_ROOT) -> Optional[str]:
+    """ID del contenedor Docker al que pertenece un proceso del host, si lo hay."""
+    match = _CONTAINER_ID_IN_PATH.search(_read(os.path.join(proc_root, str(pid), "cgroup")) or "")
+    return match.group(1) if match else None
+
+
+class ContainerResourceMonitor:
+    """
+    Uso de recursos por contenedor con tasas entre lecturas consecutivas.
+
+    sample() se llama desde el muestreador (colector "containers"); la
+    primera lectura de cada contenedor no tiene tasas todavía.
+    """
+
+    def __init__(self, root: str = CGROUP_ROOT, proc_root: str = PROC_ROOT):
+        self.root = root
+        self.proc_root = proc_root
+        self._rates = CounterRates(RATE_FIELDS)
+
+    def sample(self, gpu_devices: Optional[Iterable[dict]] = None, ts: Optional[float] = None) -> Dict[str, dict]:
+        """
+        Devuelve {container_id: {cpu_percent, memory_*, io_*_bps, io_*_iops, gpu_memory_mb}}.
+
+        cpu_percent es relativo a un núcleo (200 = dos núcleos completos).
+        gpu_devices: dispositivos del colector de GPU, para atribuir la memoria
+        de GPU de cada proceso a su contenedor.
+        """
+        v2 = is_cgroup_v2(self.root)
+        counters = {
+            cid: read_container_counters(paths, v2)
+            for cid, paths in discover_containers(self.root).items()
+        }
+        rates = self._rates.update(counters, time.monotonic() if ts is None else ts) or {}
+        gpu_memory = self._gpu_memory_by_container(gpu_devices)
+
+        result = {}
+        for cid, raw in counters.items():
+            rate = rates.get(cid)
+            limit = raw.get("memory_limit")
+            memory = raw.get("memory_bytes")
+            result[cid] = {
+                "cpu_percent": round(rate["cpu_usec"] / 1e4, 2) if rate else None,
+                "memory_bytes": memory,
+                "memory_limit": limit,
+                "memory_percent": round(memory / limit * 100, 2) if memory is not None and limit else None,
+                "io_read_bps": rate["io_read_bytes"] if rate else None,
+                "io_write_bps": rate["io_write_bytes"] if rate else None,
+                "io_read_iops": rate["io_read_ops"] if rate else None,
+                "io_write_iops": rate["io_write_ops"] if rate else None,
+                "gpu_memory_mb": gpu_memory.get(cid),
+            }
+        return result
+
+    def _gpu_memory_by_container(self, gpu_devices: Optional[Iterable[dict]]) -> Dict[str, float]:
+        usage: Dict[str, float] = {}
+        for device in gpu_devices or []:
+            for process in device.get("processes") or []:
+                cid = container_id_for_pid(process.get("pid"), self.proc_root)
+                if cid:
+                    usage[cid] = usage.get(cid, 0) + (process.get("used_memory_mb") or 0)
+        return usage
+
+
+container_monitor = ContainerResourceMonitor()
@@ -0,0 +1,152 @@
+"""
+Colectores de métricas con cadencia propia.
+
+Cada colector produce una sección (o subsección) del snapshot de
+get_system_info() y cachea su último valor durante `interval` segundos, así
+las lecturas caras (particiones, sensores) no se repiten en cada muestra.
+Los colectores con interval=None son "bajo demanda": solo se ejecutan cuando
+se piden explícitamente (p.ej. las conexiones de red con el perfil `full`).
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+COST_LOW = "low"
+COST_MEDIUM = "medium"
+COST_HIGH = "high"
+
+
+class Collector:
+    """Una fuente de métricas con intervalo de refresco y clase de coste."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], object],
+        interval: Optional[float],
+        cost: str = COST_LOW,
+    ):
+        # name "disk.io" → info["disk"]["io"]; name "cpu" → info["cpu"]
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cost = cost
+        self._value: object = None
+        self._collected_at: float = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def on_demand(self) -> bool:
+        return self.interval is None
+
+    def is_stale(self, now: float) -> bool:
+        if not self._collected_at:
+            return True
+        if self.on_demand:
+            return True
+        return now - self._collected_at >= self.interval
+
+    def get(self, force: bool = False) -> object:
+        """Devuelve el valor cacheado, refrescándolo si ha caducado."""
+        with self._lock:
+            now = time.monotonic()
+            if force or self.is_stale(now):
+                try:
+                    self._value = self.func()
+                except Exception as e:
+                    print(f"⚠️  Collector '{self.name}' failed: {type(e).__name__}: {str(e)}")
+                    self._value = None
+                self._collected_at = now
+            return self._value
+
+    def describe(self) -> dict:
+        age = time.monotonic() - self._collected_at if self._collected_at else None
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "cost": self.cost,
+            "on_demand": self.on_demand,
+            "age_seconds": round(age, 3) if age is not None else None,
+        }
+
+
+_collectors: Dict[str, Collector] = {}
+
+# Perfiles con nombre: qué colectores incluye cada uno
+PROFILES: Dict[str, List[str]] = {
+    "minimal": [],
+    "standard": [],
+    "full": [],
+}
+
+
+def register_collector(collector: Collector, profiles: List[str]) -> Collector:
+    """Registra un colector y lo añade a los perfiles indicados."""
+    _collectors[collector.name] = collector
+    for profile in profiles:
+        if collector.name not in PROFILES.setdefault(profile, []):
+            PROFILES[profile].append(collector.name)
+    return collector
+
+
+def get_collector(name: str) -> Optional[Collector]:
+    return _collectors.get(name)
+
+
+def list_collectors() -> List[dict]:
+    return [c.describe() for c in _collectors.values()]
+
+
+def _profile_names(profile: str) -> List[str]:
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown metrics profile '{profile}'. Available: {', '.join(PROFILES)}"
+        )
+    return PROFILES[profile]
+
+
+def collect(profile: str = "standard", include_on_demand: bool = True) -> dict:
+    """
+    Construye un snapshot con los colectores de un perfil.
+
+    Args:
+        profile: Nombre del perfil (minimal, standard, full)
+        include_on_demand: Si es False, omite los colectores bajo demanda
+            (el muestreador en segundo plano nunca los ejecuta)
+    """
+    info: dict = {}
+    for name in _profile_names(profile):
+        collector = _collectors[name]
+        if collector.on_demand and not include_on_demand:
+            continue
+        value = collector.get()
+        if "." in name:
+            section, key = name.split(".", 1)
+            info.setdefault(section, {})[key] = value
+        else:
+            info[name] = value
+    return info
+
+
+def filter_snapshot(data: dict, profile: str) -> dict:
+    """Recorta un snapshot existente a las claves de un perfil."""
+    info: dict = {}
+    for name in _profile_names(profile):
+        if "." in name:
+            section, key = name.split(".", 1)
+            if key in (data.get(section) or {}):
+                info.setdefault(section, {})[key] = data[section][key]
+        elif name in data:
+            info[name] = data[name]
+    return info
+
+
+def snapshot_covers(profile: str, sampled_profile: str) -> bool:
+    """True si un snapshot del perfil `sampled_profile` contiene todo lo de `profile`."""
+    sampled = {
+        name
+        for name in _profile_names(sampled_profile)
+        if not _collectors[name].on_demand
+    }
+    return set(_profile_names(profile)) <= sampled
@@ -0,0 +1,133 @@
+"""
+Descompresión de los cuerpos que envía el servidor central.
+
+El servidor comprime los payloads grandes (sincronización de usuarios) con
+gzip, o zstd si lo tiene configurado. Este middleware ASGI descomprime el
+cuerpo según Content-Encoding antes de que llegue a las rutas, que siguen
+leyendo JSON normal:
+
+- gzip: siempre
+- zstd: si está instalado el módulo zstandard; si no, 415 y el servidor
+  reintenta con gzip
+- Cuerpo corrupto: 400
+- Más de SYNC_MAX_BODY_BYTES (64 MiB) descomprimidos: 413
+
+Las respuestas a un cuerpo descomprimido llevan la cabecera X-Content-Decoded
+con la codificación: así el servidor distingue un 400/422 por el contenido
+(no debe cambiar de codificación) de uno de un agente que no la entiende.
+"""
+
+import json
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sin él solo se acepta gzip
+    zstandard = None
+
+MAX_BODY_BYTES = int(os.getenv("SYNC_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+DECODED_HEADER = b"x-content-decoded"
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def _gunzip(body: bytes) -> bytes:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, MAX_BODY_BYTES + 1)
+    if len(data) > MAX_BODY_BYTES:
+        raise BodyTooLarge()
+    if not decompressor.eof:
+        raise zlib.error("truncated gzip body")
+    return data
+
+
+def _unzstd(body: bytes) -> bytes:
+    reader = zstandard.ZstdDecompressor().stream_reader(body)
+    data = reader.read(MAX_BODY_BYTES + 1)
+    if len(data) > MAX_BODY_BYTES:
+        raise BodyTooLarge()
+    return data
+
+
+DECODERS = {"gzip": _gunzip}
+if zstandard is not None:
+    DECODERS["zstd"] = _unzstd
+
+
+class DecompressRequestMiddleware:
+    """Middleware ASGI que sustituye el cuerpo comprimido por el original."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if encoding in ("", "identity"):
+            return await self.app(scope, receive, send)
+
+        decoder = DECODERS.get(encoding)
+        if decoder is None:
+            return await _error(send, 415, f"Unsupported content encoding '{encoding}'")
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+
+        try:
+            body = decoder(b"".join(chunks))
+        except BodyTooLarge:
+            return await _error(send, 413, "Decompressed body too large")
+        except Exception as e:  # zlib.error, zstandard.ZstdError...
+            return await _error(send, 400, f"Invalid {encoding} body: {str(e)}")
+
+        # Las rutas ven un cuerpo normal sin Content-Encoding
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode())]
+
+        sent = False
+
+        async def receive_body():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_decoded(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(DECODED_HEADER, encoding.encode())]
+            await send(message)
+
+        await self.app(scope, receive_body, send_decoded)
+
+
+async def _error(send, status_code: int, detail: str) -> None:
+    payload = json.dumps({"detail": detail}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": payload})
@@ -0,0 +1,342 @@
+"""
+Colector de GPU NVIDIA basado en procesos `nvidia-smi --loop-ms` persistentes.
+
+En lugar de lanzar nvidia-smi (o GPUtil, que hace lo mismo) en cada petición,
+se descubren los dispositivos una sola vez y se mantienen dos lectores:
+
+- uno con `--query-gpu` que actualiza carga/memoria/temperatura por dispositivo
+- otro con `--query-compute-apps` que da la memoria usada por cada proceso
+
+Ambos escriben en memoria y snapshot() solo lee ese estado. El binario se busca
+en PATH, así que se puede probar con un `nvidia-smi` falso (ver
+scripts/testing/fake_nvidia_smi.sh).
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .metric_codec import fit_json
+
+GPU_QUERY_FIELDS = [
+    "index",
+    "uuid",
+    "name",
+    "utilization.gpu",
+    "utilization.memory",
+    "memory.total",
+    "memory.used",
+    "temperature.gpu",
+    "power.draw",
+]
+APPS_QUERY_FIELDS = ["timestamp", "gpu_uuid", "pid", "process_name", "used_memory"]
+
+# Tiempo de espera antes de relanzar nvidia-smi si el lector muere
+RESTART_BACKOFF_SECONDS = 30
+
+
+def _num(value: str) -> Optional[float]:
+    """Convierte un campo de nvidia-smi a float ('[N/A]', '[Not Supported]' → None)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _split_csv(line: str) -> List[str]:
+    return [p.strip() for p in line.split(",")]
+
+
+class _LoopReader:
+    """Mantiene un `nvidia-smi ... --loop-ms` vivo y entrega cada línea a un callback."""
+
+    def __init__(self, name: str, args: List[str], on_line, on_exit=None):
+        self.name = name
+        self.args = args
+        self.on_line = on_line
+        self.on_exit = on_exit
+        self._proc: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        self._proc = subprocess.Popen(
+            self.args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self._thread = threading.Thread(target=self._read, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _read(self) -> None:
+        proc = self._proc
+        try:
+            for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    self.on_line(line)
+        except Exception as e:
+            print(f"⚠️  {self.name} reader error: {type(e).__name__}: {str(e)}")
+        finally:
+            proc.wait()
+            if self.on_exit:
+                self.on_exit()
+
+    def stop(self) -> None:
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._proc = None
+        self._thread = None
+
+
+class GPUCollector:
+    """Estado de las GPUs mantenido por lectores nvidia-smi de larga duración."""
+
+    def __init__(self, poll_ms: int = 1000, binary: str = "nvidia-smi"):
+        self.poll_ms = max(int(poll_ms), 100)
+        self.binary = binary
+        self._lock = threading.Lock()
+        # Arranque/parada de los lectores: ensure_started() se llama desde varios
+        # colectores (gpu, containers) y no deben lanzar dos parejas de nvidia-smi.
+        # Aparte de _lock, que toman los hilos lectores que stop() espera.
+        self._lifecycle_lock = threading.Lock()
+        self._devices: Dict[int, dict] = {}
+        self._uuid_to_index: Dict[str, int] = {}
+        self._processes: Dict[int, List[dict]] = {}
+        self._pending_apps: Dict[int, List[dict]] = {}
+        self._pending_ts: Optional[str] = None
+        self._last_apps_line = 0.0
+        self._readers: List[_LoopReader] = []
+        self._discovered = False
+        self._available = False
+        self._next_retry = 0.0
+
+    # --- ciclo de vida ---
+
+    def discover(self) -> bool:
+        """Busca nvidia-smi y enumera los dispositivos una sola vez."""
+        self._discovered = True
+        path = shutil.which(self.binary)
+        if not path:
+            self._available = False
+            return False
+        try:
+            result = subprocess.run(
+                [path, "--query-gpu=index,uuid,name,memory.total", "--format=csv,noheader,nounits"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=5,
+            )
+        except Exception as e:
+            print(f"⚠️  GPU discovery failed: {type(e).__name__}: {str(e)}")
+            self._available = False
+            return False
+
+        devices = {}
+        uuids = {}
+        if result.returncode == 0:
+            for line in result.stdout.splitlines():
+                parts = _split_csv(line)
+                if len(parts) != 4 or _num(parts[0]) is None:
+                    continue
+                idx = int(parts[0])
+                uuids[parts[1]] = idx
+                devices[idx] = {
+                    "id": idx,
+                    "uuid": parts[1],
+                    "name": parts[2],
+                    "memory_total_mb": _num(parts[3]),
+                }
+
+        with self._lock:
+            self._devices = devices
+            self._uuid_to_index = uuids
+        self.binary = path
+        self._available = bool(devices)
+        if devices:
+            print(f"✅ GPU collector discovered {len(devices)} device(s)")
+        return self._available
+
+    def ensure_started(self) -> None:
+        """Descubre las GPUs la primera vez y (re)lanza los lectores si no están vivos."""
+        with self._lifecycle_lock:
+            self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if not self._discovered:
+            self.discover()
+        if not self._available:
+            return
+        if self._readers and all(r.alive for r in self._readers):
+            return
+        if time.monotonic() < self._next_retry:
+            return
+
+        self._stop_readers()
+        loop = f"--loop-ms={self.poll_ms}"
+        self._readers = [
+            _LoopReader(
+                "gpu-query",
+                [self.binary, f"--query-gpu={','.join(GPU_QUERY_FIELDS)}", "--format=csv,noheader,nounits", loop],
+                self._on_gpu_line,
+                self._on_reader_exit,
+            ),
+            _LoopReader(
+                "gpu-apps",
+                [self.binary, f"--query-compute-apps={','.join(APPS_QUERY_FIELDS)}", "--format=csv,noheader,nounits", loop],
+                self._on_apps_line,
+                self._on_reader_exit,
+            ),
+        ]
+        try:
+            for reader in self._readers:
+                reader.start()
+        except Exception as e:
+            print(f"⚠️  Could not start nvidia-smi readers: {type(e).__name__}: {str(e)}")
+            self._on_reader_exit()
+
+    def stop(self) -> None:
+        with self._lifecycle_lock:
+            self._stop_readers()
+
+    def _stop_readers(self) -> None:
+        for reader in self._readers:
+            reader.stop()
+        self._readers = []
+
+    def _on_reader_exit(self) -> None:
+        self._next_retry = time.monotonic() + RESTART_BACKOFF_SECONDS
+
+    # --- parseo ---
+
+    def _on_gpu_line(self, line: str) -> None:
+        parts = _split_csv(line)
+        if len(parts) != len(GPU_QUERY_FIELDS) or _num(parts[0]) is None:
+            return
+        idx = int(parts[0])
+        _, uuid, name, util_gpu, util_mem, mem_total, mem_used, temp, power = parts
+        mem_total_f = _num(mem_total)
+        mem_used_f = _num(mem_used)
+        with self._lock:
+            self._uuid_to_index[uuid] = idx
+            self._devices[idx] = {
+                "id": idx,
+                "uuid": uuid,
+                "name": name,
+                "load": _num(util_gpu),
+                "memory_controller_load": _num(util_mem),
+                "memory_used_mb": mem_used_f,
+                "memory_total_mb": mem_total_f,
+                "memory_utilization": round(mem_used_f / mem_total_f * 100, 2)
+                if mem_total_f and mem_used_f is not None
+                else None,
+                "temperature": _num(temp),
+                "power_draw_w": _num(power),
+                "updated_at": time.time(),
+            }
+
+    def _on_apps_line(self, line: str) -> None:
+        parts = _split_csv(line)
+        if len(parts) != len(APPS_QUERY_FIELDS) or _num(parts[2]) is None:
+            return
+        ts, gpu_uuid, pid, process_name, used_memory = parts
+        with self._lock:
+            self._last_apps_line = time.monotonic()
+            # Cada iteración del loop comparte timestamp: al cambiar, la anterior está completa
+            if ts != self._pending_ts:
+                if self._pending_ts is not None:
+                    self._processes = self._pending_apps
+                self._pending_apps = {}
+                self._pending_ts = ts
+            idx = self._uuid_to_index.get(gpu_uuid)
+            if idx is None:
+                return
+            self._pending_apps.setdefault(idx, []).append(
+                {
+                    "pid": int(pid),
+                    "name": process_name,
+                    "used_memory_mb": _num(used_memory),
+                }
+            )
+
+    def _current_processes(self) -> Dict[int, List[dict]]:
+        # Sin procesos nvidia-smi no imprime nada: si no hay líneas recientes, no hay procesos
+        stale_after = 2 * self.poll_ms / 1000
+        if time.monotonic() - self._last_apps_line > stale_after:
+            return {}
+        if self._pending_ts is not None and not self._processes:
+            return self._pending_apps
+        return self._processes
+
+    # --- lectura ---
+
+    def snapshot(self) -> dict:
+        """Estado actual de todas las GPUs, sin lanzar procesos."""
+        self.ensure_started()
+        with self._lock:
+            processes = self._current_processes()
+            devices = []
+            for idx in sorted(self._devices):
+                device = dict(self._devices[idx])
+                device["processes"] = list(processes.get(idx, []))
+                devices.append(device)
+
+        summary = "N/A"
+        if devices and devices[0].get("load") is not None:
+            first = devices[0]
+            summary = json.dumps({
+                "gpu_id": first["id"],
+                "load_percent": first["load"],
+                "mem_percent": first.get("memory_utilization"),
+                "temp_c": first.get("temperature"),
+            })
+        return {"devices": devices or None, "summary": summary}
+
+
+def compact_gpu_usage(gpu_info: Optional[dict]) -> str:
+    """
+    Formato compacto para el campo gpu_usage del servidor.
+
+    Una entrada por GPU: [id, carga %, memoria %, memoria usada MB, temp °C,
+    [[pid, memoria MB], ...]]. "N/A" si no hay GPUs. Como mucho
+    MAX_TEXT_BYTES: si no cabe, se quitan las listas de procesos y, si aún
+    no basta, las últimas GPUs.
+    """
+    devices = (gpu_info or {}).get("devices") or []
+    if not devices:
+        return "N/A"
+    entries = [
+        [
+            d.get("id"),
+            d.get("load"),
+            d.get("memory_utilization"),
+            d.get("memory_used_mb"),
+            d.get("temperature"),
+            [[p["pid"], p.get("used_memory_mb")] for p in d.get("processes") or []],
+        ]
+        for d in devices
+    ]
+    text = fit_json(list, entries)
+    if len(json.loads(text)) < len(entries):
+        # No caben todas las GPUs con sus procesos: mejor todas sin procesos
+        text = fit_json(list, [entry[:5] + [[]] for entry in entries])
+    return text
+
+
+gpu_collector = GPUCollector(poll_ms=int(os.getenv("GPU_POLL_MS", "1000")))
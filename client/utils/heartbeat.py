@@ -0,0 +1,132 @@
+"""
+Latido periódico del agente hacia el servidor central.
+
+Cada HEARTBEAT_INTERVAL segundos se envía un POST JSON muy pequeño a
+/client-api/heartbeat (autenticado con X-Client-Secret) con la versión del
+agente, su uptime y un resumen de carga tomado de la última muestra del
+muestreador. El servidor marca el host como offline si faltan
+HEARTBEAT_MISSED latidos seguidos, sin tener que sondearlo.
+
+Es independiente del shipper de métricas: un atraso de métricas en el spool
+no retrasa el latido.
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from ..models.metrics import MetricSample
+from .sampler import MetricsSampler, sampler
+from .shipper import resolve_server_url
+
+AGENT_VERSION = os.getenv("AGENT_VERSION", "1.0.0")
+
+
+class HeartbeatSender:
+    """Hilo que envía el latido del agente al servidor central."""
+
+    def __init__(self, sampler: MetricsSampler, interval: float = 15.0, timeout: float = 5.0):
+        self.sampler = sampler
+        self.interval = max(interval, 1.0)
+        self.timeout = min(timeout, self.interval)
+        self.server_id = int(os.getenv("SERVER_ID", "0")) or None
+        self.client_secret = os.getenv("CLIENT_SECRET", "")
+        self.hostname = os.getenv("HOSTNAME") or socket.gethostname()
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._http: Optional[httpx.Client] = None
+        self._failing = False
+
+    @property
+    def enabled(self) -> bool:
+        if os.getenv("HEARTBEAT_ENABLED", "true").lower() == "false":
+            return False
+        return bool(self.client_secret)
+
+    def start(self) -> None:
+        if not self.enabled:
+            print("ℹ️  Heartbeat disabled (set CLIENT_SECRET to enable)")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._http = httpx.Client(timeout=self.timeout)
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+        print(f"✅ Heartbeat started (interval={self.interval}s)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        if self._http:
+            self._http.close()
+            self._http = None
+
+    def _run(self) -> None:
+        # Primer latido en cuanto arranca: el host pasa a online sin esperar un intervalo
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.send_once()
+            except Exception as e:
+                # Un error inesperado (muestra, URL...) no debe matar el hilo: el
+                # servidor daría el host por caído al dejar de recibir latidos
+                print(f"⚠️  Heartbeat error: {type(e).__name__}: {str(e)}")
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+    def payload(self) -> dict:
+        """Cuerpo del latido: versión, uptime y resumen de carga."""
+        body = {
+            "server_id": self.server_id,
+            "version": AGENT_VERSION,
+            "uptime_seconds": round(time.monotonic() - self._started, 1),
+            "interval": self.interval,
+        }
+        latest = self.sampler.window(last=1)  # Sin tomar una muestra nueva
+        if latest:
+            ts, data = latest[0]
+            sample = MetricSample.from_system_info(data, ts)
+            body.update(
+                load_1=sample.load_1,
+                cpu_percent=sample.cpu_percent,
+                mem_percent=sample.mem_percent,
+            )
+        return body
+
+    def send_once(self) -> bool:
+        server_url = resolve_server_url()
+        if not server_url:
+            return False
+        try:
+            response = self._http.post(
+                f"{server_url}/client-api/heartbeat",
+                json=self.payload(),
+                headers={
+                    "X-Client-Secret": self.client_secret,
+                    "X-Client-Host": self.hostname,
+                },
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # Avisar una vez por racha de fallos, no en cada latido
+            if not self._failing:
+                print(f"⚠️  Heartbeat not sent: {str(e)}")
+            self._failing = True
+            return False
+        if self._failing:
+            print("✅ Heartbeat delivered again")
+        self._failing = False
+        return True
+
+
+heartbeat = HeartbeatSender(
+    sampler,
+    interval=float(os.getenv("HEARTBEAT_INTERVAL", "15")),
+)
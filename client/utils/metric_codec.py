@@ -0,0 +1,157 @@
+"""
+Codificación binaria compacta de muestras de métricas tipadas (agente → servidor).
+
+Una trama es una cabecera seguida de una fila de tamaño fijo por muestra:
+
+    cabecera: magic "PPM1" | versión u8 | nº de campos u8 | server_id i32 | nº de muestras u32
+    muestra:  ts f64 | un valor por campo de FIELDS (f32 o f64)
+              | len u16 por campo de TEXT_FIELDS | los textos utf-8, en ese orden
+
+Los valores ausentes viajan como NaN. Los textos (gpu_usage, disk_io,
+network_io: JSON compacto) tienen como mucho MAX_TEXT_BYTES bytes; fit_json
+los recorta por entradas completas para que quepan y encode_samples rechaza
+(ValueError) los que no. La versión 1 solo llevaba gpu_usage; se sigue
+decodificando porque el spool del agente puede tener tramas antiguas.
+Solo usa `struct` y `json` de la librería
+estándar. Este módulo es una copia idéntica de server/utils/metric_codec.py:
+cliente y servidor se despliegan por separado y ambos deben hablar el mismo
+formato.
+"""
+
+import json
+import math
+import struct
+from typing import Callable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "application/x-pp-metrics"
+MAGIC = b"PPM1"
+VERSION = 2
+MAX_TEXT_BYTES = 0xFFFF  # longitud u16
+
+# (campo, formato struct): porcentajes y tasas en f32, bytes absolutos en f64
+FIELDS = [
+    ("cpu_percent", "f"),
+    ("load_1", "f"),
+    ("mem_percent", "f"),
+    ("mem_used", "d"),
+    ("mem_total", "d"),
+    ("swap_percent", "f"),
+    ("disk_percent", "f"),
+    ("disk_used", "d"),
+    ("disk_total", "d"),
+    ("disk_read_bps", "f"),
+    ("disk_write_bps", "f"),
+    ("net_rx_bps", "f"),
+    ("net_tx_bps", "f"),
+    ("gpu_percent", "f"),
+    ("gpu_mem_percent", "f"),
+]
+FIELD_NAMES = [name for name, _ in FIELDS]
+
+# (campo, valor si falta): JSON compacto de longitud variable
+TEXT_FIELDS = [("gpu_usage", "N/A"), ("disk_io", "{}"), ("network_io", "{}")]
+_TEXT_FIELDS_BY_VERSION = {1: TEXT_FIELDS[:1], 2: TEXT_FIELDS}
+
+_HEADER = struct.Struct("<4sBBiI")
+_ROWS = {
+    version: struct.Struct("<d" + "".join(fmt for _, fmt in FIELDS) + "H" * len(texts))
+    for version, texts in _TEXT_FIELDS_BY_VERSION.items()
+}
+
+
+class UnsupportedFrame(ValueError):
+    """Trama de otra versión o con otros campos (el servidor responde 415)."""
+
+
+def fit_json(build: Callable[[Sequence], object], entries: Sequence, limit: int = MAX_TEXT_BYTES) -> str:
+    """
+    JSON compacto de build(entries), quitando entradas del final hasta que
+    ocupe como mucho `limit` bytes en utf-8. Siempre corta entre entradas
+    completas, así que el resultado es JSON válido.
+    """
+    entries = list(entries)
+    text = json.dumps(build(entries), separators=(",", ":"))
+    while entries and len(text.encode("utf-8")) > limit:
+        size = len(text.encode("utf-8"))
+        keep = min(len(entries) - 1, int(len(entries) * limit / size))
+        entries = entries[:keep]
+        text = json.dumps(build(entries), separators=(",", ":"))
+    return text
+
+
+def _value(sample: dict, name: str) -> float:
+    value = sample.get(name)
+    return math.nan if value is None else float(value)
+
+
+def _text(sample: dict, name: str) -> bytes:
+    data = (sample.get(name) or "").encode("utf-8")
+    if len(data) > MAX_TEXT_BYTES:
+        raise ValueError(f"{name} is {len(data)} bytes, the limit is {MAX_TEXT_BYTES}")
+    return data
+
+
+def encode_samples(samples: List[dict], server_id: Optional[int] = None) -> bytes:
+    """
+    Codifica una lista de muestras (dicts con ts, FIELDS y TEXT_FIELDS).
+
+    Raises:
+        ValueError: si un texto supera MAX_TEXT_BYTES
+    """
+    row = _ROWS[VERSION]
+    parts = [_HEADER.pack(MAGIC, VERSION, len(FIELDS), server_id or 0, len(samples))]
+    for sample in samples:
+        texts = [_text(sample, name) for name, _ in TEXT_FIELDS]
+        parts.append(
+            row.pack(
+                float(sample["ts"]),
+                *[_value(sample, name) for name in FIELD_NAMES],
+                *[len(text) for text in texts],
+            )
+        )
+        parts.extend(texts)
+    return b"".join(parts)
+
+
+def decode_samples(data: bytes) -> Tuple[Optional[int], List[dict]]:
+    """
+    Decodifica una trama. Devuelve (server_id o None, muestras).
+
+    Raises:
+        UnsupportedFrame: si la trama no es de una versión conocida
+        ValueError: si está truncada o un texto no es utf-8 válido
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Metrics frame too short")
+    magic, version, field_count, server_id, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in _ROWS or field_count != len(FIELDS):
+        raise UnsupportedFrame(
+            f"Unsupported metrics frame (magic={magic!r}, version={version}, fields={field_count})"
+        )
+    row_struct = _ROWS[version]
+    text_fields = _TEXT_FIELDS_BY_VERSION[version]
+
+    samples = []
+    offset = _HEADER.size
+    try:
+        for _ in range(count):
+            row = row_struct.unpack_from(data, offset)
+            offset += row_struct.size
+            values, lengths = row[1 : 1 + len(FIELDS)], row[1 + len(FIELDS) :]
+
+            sample = {"ts": row[0]}
+            for name, value in zip(FIELD_NAMES, values):
+                sample[name] = None if math.isnan(value) else value
+            for (name, missing), length in zip(TEXT_FIELDS, lengths):
+                if offset + length > len(data):
+                    raise ValueError("Metrics frame truncated")
+                text = bytes(data[offset : offset + length]).decode("utf-8")
+                offset += length
+                sample[name] = text or missing
+            for name, missing in TEXT_FIELDS[len(text_fields) :]:
+                sample[name] = missing
+            samples.append(sample)
+    except struct.error:
+        raise ValueError("Metrics frame truncated")
+
+    return (server_id or None), samples
@@ -1,52 +1,104 @@
 import psutil
-import subprocess
-import json
 from datetime import datetime
 from . import __name__ as package_name  # placeholder if needed
+from .cgroups import container_monitor
+from .collectors import COST_HIGH, COST_LOW, COST_MEDIUM, Collector, collect, register_collector
+from .gpu import compact_gpu_usage, gpu_collector
+from .rates import (
+    DISK_RATE_FIELDS,
+    NET_RATE_FIELDS,
+    CounterRates,
+    compact_disk_rates,
+    compact_network_rates,
+)
 try:
     from ..models.metrics import MetricOut
 except Exception:
     MetricOut = None  # Avoid hard failure if import path changes
 
-def get_system_info():
-    info = {}
-
-    # CPU
-    info["cpu"] = {
-        "usage_percent": psutil.cpu_percent(interval=1),
-        "usage_per_core": psutil.cpu_percent(interval=1, percpu=True),
+def _collect_cpu():
+    # interval=None: usage since the previous call (the module primes it on import)
+    freq = psutil.cpu_freq()
+    return {
+        "usage_percent": psutil.cpu_percent(interval=None),
+        "usage_per_core": psutil.cpu_percent(interval=None, percpu=True),
         "cores_logical": psutil.cpu_count(logical=True),
         "cores_physical": psutil.cpu_count(logical=False),
-        "frequency": psutil.cpu_freq()._asdict() if psutil.cpu_freq() else None,
+        "frequency": freq._asdict() if freq else None,
         "load_avg": psutil.getloadavg() if hasattr(psutil, "getloadavg") else None
     }
 
-    # RAM
-    ram = psutil.virtual_memory()
-    info["ram"] = ram._asdict()
 
-    # SWAP
-    swap = psutil.swap_memory()
-    info["swap"] = swap._asdict()
+def _collect_ram():
+    return psutil.virtual_memory()._asdict()
+
+
+def _collect_swap():
+    return psutil.swap_memory()._asdict()
 
-    # Disco
-    disk_partitions = [p._asdict() for p in psutil.disk_partitions()]
+
+def _collect_disk_usage():
     disk_usage = psutil.disk_usage("/") if hasattr(psutil, "disk_usage") else None
+    return disk_usage._asdict() if disk_usage else None
+
+
+def _collect_disk_io():
     disk_io = psutil.disk_io_counters() if hasattr(psutil, "disk_io_counters") else None
+    return disk_io._asdict() if disk_io else None
+
 
-    info["disk"] = {
-        "partitions": disk_partitions,
-        "usage": disk_usage._asdict() if disk_usage else None,
-        "io": disk_io._asdict() if disk_io else None
+_disk_rates = CounterRates(DISK_RATE_FIELDS)
+_network_rates = CounterRates(NET_RATE_FIELDS)
+
+
+def _collect_disk_rates():
+    # Per-interval rates from consecutive readings; "total" excludes partitions
+    if not hasattr(psutil, "disk_io_counters"):
+        return None
+    total = psutil.disk_io_counters()
+    per_disk = psutil.disk_io_counters(perdisk=True) or {}
+    counters = {name: c._asdict() for name, c in per_disk.items()}
+    if total:
+        counters["total"] = total._asdict()
+    rates = _disk_rates.update(counters)
+    if rates is None:
+        return None
+    return {
+        "total": rates.pop("total", None),
+        "per_disk": rates,
     }
 
-    # Red
-    info["network"] = {
-        "io": psutil.net_io_counters()._asdict(),
-        "connections": [c._asdict() for c in psutil.net_connections()]
+
+def _collect_disk_partitions():
+    return [p._asdict() for p in psutil.disk_partitions()]
+
+
+def _collect_network_io():
+    return psutil.net_io_counters()._asdict()
+
+
+def _collect_network_rates():
+    counters = {name: c._asdict() for name, c in psutil.net_io_counters(pernic=True).items()}
+    counters["total"] = psutil.net_io_counters()._asdict()
+    rates = _network_rates.update(counters)
+    if rates is None:
+        return None
+    return {
+        "total": rates.pop("total", None),
+        "per_nic": rates,
     }
 
-    # Sensores (si existen)
+
+def _collect_network_connections():
+    return [c._asdict() for c in psutil.net_connections()]
+
+
+def _collect_containers():
+    # Per-container usage from cgroup accounting files; GPU memory attributed by PID
+    return container_monitor.sample(gpu_collector.snapshot().get("devices"))
+
+
+def _collect_sensors():
     sensors_temperatures = getattr(psutil, "sensors_temperatures", None)
     sensors_fans = getattr(psutil, "sensors_fans", None)
     sensors_battery = getattr(psutil, "sensors_battery", None)
@@ -57,105 +109,75 @@ def get_system_info():
     except Exception:
         temps = fans = battery = None
 
-    info["sensors"] = {
+    return {
         "temperatures": {k: [t._asdict() for t in v] for k, v in temps.items()} if isinstance(temps, dict) else None,
         "fans": {k: [f._asdict() for f in v] for k, v in fans.items()} if isinstance(fans, dict) else None,
         "battery": getattr(battery, "_asdict")() if battery and callable(getattr(battery, "_asdict", None)) else None
     }
 
-    # GPU metrics (NVIDIA / generic) - attempt GPUtil first, then nvidia-smi
-    gpu_list = []
-    summary = "N/A"
-    try:
-        import GPUtil  # type: ignore
-        gpus = GPUtil.getGPUs()
-        for g in gpus:
-            gpu_entry = {
-                "id": g.id,
-                "name": g.name,
-                "load": round(g.load * 100, 2),  # percent
-                "memory_used_mb": round(g.memoryUsed, 2),
-                "memory_total_mb": round(g.memoryTotal, 2),
-                "memory_utilization": round((g.memoryUsed / g.memoryTotal * 100) if g.memoryTotal else 0, 2),
-                "temperature": g.temperature,
-                "uuid": getattr(g, "uuid", None),
-            }
-            gpu_list.append(gpu_entry)
-        if gpu_list:
-            # Simple summary: first GPU load and memory utilization
-            first = gpu_list[0]
-            summary = json.dumps({
-                "gpu_id": first["id"],
-                "load_percent": first["load"],
-                "mem_percent": first["memory_utilization"],
-                "temp_c": first["temperature"],
-            })
-    except Exception:
-        # Fallback to nvidia-smi parsing
-        try:
-            cmd = [
-                "nvidia-smi",
-                "--query-gpu=index,name,utilization.gpu,utilization.memory,memory.total,memory.used,temperature.gpu",
-                "--format=csv,noheader,nounits"
-            ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=2)
-            if result.returncode == 0:
-                lines = [l.strip() for l in result.stdout.splitlines() if l.strip()]
-                for line in lines:
-                    parts = [p.strip() for p in line.split(',')]
-                    if len(parts) == 7:
-                        idx, name, util_gpu, util_mem, mem_total, mem_used, temp = parts
-                        mem_total_f = float(mem_total)
-                        mem_used_f = float(mem_used)
-                        mem_util = round((mem_used_f / mem_total_f * 100) if mem_total_f else 0, 2)
-                        gpu_entry = {
-                            "id": int(idx),
-                            "name": name,
-                            "load": float(util_gpu),
-                            "memory_used_mb": mem_used_f,
-                            "memory_total_mb": mem_total_f,
-                            "memory_utilization": mem_util,
-                            "temperature": float(temp),
-                        }
-                        gpu_list.append(gpu_entry)
-                if gpu_list:
-                    first = gpu_list[0]
-                    summary = json.dumps({
-                        "gpu_id": first["id"],
-                        "load_percent": first["load"],
-                        "mem_percent": first["memory_utilization"],
-                        "temp_c": first["temperature"],
-                    })
-        except Exception:
-            pass
-
-    info["gpu"] = {
-        "devices": gpu_list if gpu_list else None,
-        "summary": summary
-    }
 
-    return info
+# Cadence per collector: cheap gauges every second, cumulative counters every
+# few seconds, slow-changing inventory every few minutes, sockets on request only.
+register_collector(Collector("cpu", _collect_cpu, 1, COST_LOW), ["minimal", "standard", "full"])
+register_collector(Collector("ram", _collect_ram, 1, COST_LOW), ["minimal", "standard", "full"])
+register_collector(Collector("swap", _collect_swap, 5, COST_LOW), ["standard", "full"])
+register_collector(Collector("disk.usage", _collect_disk_usage, 5, COST_LOW), ["minimal", "standard", "full"])
+register_collector(Collector("disk.io", _collect_disk_io, 5, COST_LOW), ["standard", "full"])
+register_collector(Collector("disk.rates", _collect_disk_rates, 5, COST_LOW), ["standard", "full"])
+register_collector(Collector("disk.partitions", _collect_disk_partitions, 300, COST_MEDIUM), ["full"])
+register_collector(Collector("network.io", _collect_network_io, 5, COST_LOW), ["standard", "full"])
+register_collector(Collector("network.rates", _collect_network_rates, 5, COST_LOW), ["standard", "full"])
+register_collector(Collector("network.connections", _collect_network_connections, None, COST_HIGH), ["full"])
+register_collector(Collector("sensors", _collect_sensors, 300, COST_MEDIUM), ["full"])
+register_collector(Collector("containers", _collect_containers, 5, COST_LOW), ["standard", "full"])
+# GPU state is kept in memory by long-lived nvidia-smi readers, so reading it is cheap
+register_collector(Collector("gpu", gpu_collector.snapshot, 1, COST_LOW), ["standard", "full"])
+
+# Prime psutil.cpu_percent so the first non-blocking reading has a baseline
+psutil.cpu_percent(interval=None)
+psutil.cpu_percent(interval=None, percpu=True)
+
+
+def get_system_info(profile="full", include_on_demand=True):
+    """
+    Collect a system snapshot for the given profile (minimal, standard, full).
+
+    Each collector refreshes on its own cadence and serves its cached value in
+    between, so repeated calls are cheap. On-demand collectors (network
+    connections) only run when include_on_demand is True.
+    """
+    return collect(profile, include_on_demand=include_on_demand)
+
+def build_server_metric(server_id: int, sys_info: dict = None, collected_at: datetime = None):
+    """Return a MetricOut instance (or dict fallback) compatible with server schema.
 
-def build_server_metric(server_id: int):
-    """Return a MetricOut instance (or dict fallback) compatible with server schema."""
-    sys_info = get_system_info()
+    If sys_info is given (e.g. a sampler snapshot) it is reused instead of
+    collecting a new one.
+    """
+    if sys_info is None:
+        sys_info = get_system_info("standard")
     if MetricOut is not None:
-        return MetricOut.from_system_info(server_id=server_id, system_info=sys_info)
+        return MetricOut.from_system_info(
+            server_id=server_id, system_info=sys_info, collected_at=collected_at
+        )
     # Fallback dict if model unavailable
     from json import dumps
     cpu = sys_info.get("cpu", {})
     ram = sys_info.get("ram", {})
     disk = sys_info.get("disk", {}).get("usage", {})
-    gpu_summary = sys_info.get("gpu", {}).get("summary", "N/A")
     return {
         "server_id": server_id,
         "cpu_usage": dumps({"usage_percent": cpu.get("usage_percent")}),
         "memory_usage": dumps({"used": ram.get("used"), "percent": ram.get("percent")}),
         "disk_usage": dumps({"percent": disk.get("percent")}),
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "gpu_usage": gpu_summary
+        "timestamp": (collected_at or datetime.utcnow()).isoformat() + "Z",
+        "gpu_usage": compact_gpu_usage(sys_info.get("gpu")),
+        "disk_io": compact_disk_rates(sys_info.get("disk", {}).get("rates")),
+        "network_io": compact_network_rates(sys_info.get("network", {}).get("rates")),
     }
 
 if __name__ == "__main__":
     import pprint
+    import time
+    time.sleep(1)  # let cpu_percent accumulate a measurement window
     pprint.pprint(get_system_info())
\ No newline at end of file
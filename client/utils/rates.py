@@ -0,0 +1,132 @@
+"""
+Cálculo de tasas (por segundo) a partir de contadores acumulados.
+
+psutil devuelve contadores que solo crecen (bytes leídos, paquetes enviados...).
+CounterRates guarda la lectura anterior de cada dispositivo y convierte la
+diferencia en tasas. Los desbordamientos de 32 bits ya los corrige psutil
+(nowrap=True, el valor por defecto de disk_io_counters y net_io_counters), así
+que un contador que retrocede es un reinicio (driver recargado, NIC recreada,
+contenedor nuevo): se asume que empezó en 0.
+"""
+
+import time
+from typing import Dict, Iterable, Optional
+
+from .metric_codec import fit_json
+
+
+def counter_delta(previous: int, current: int) -> int:
+    """Diferencia entre dos lecturas de un contador monótono."""
+    if current >= previous:
+        return current - previous
+    # Reinicio: tratarlo como desbordamiento convertiría un contador de 64 bits
+    # reiniciado en un pico de hasta 4 GiB
+    return current
+
+
+class CounterRates:
+    """Tasas por dispositivo entre dos lecturas consecutivas."""
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = list(fields)
+        self._previous: Dict[str, dict] = {}
+        self._previous_ts: Optional[float] = None
+
+    def update(self, counters: Dict[str, dict], ts: Optional[float] = None) -> Optional[Dict[str, dict]]:
+        """
+        Registra una lectura {dispositivo: {campo: valor}} y devuelve
+        {dispositivo: {campo: valor/s}}. En la primera lectura devuelve None.
+        Los dispositivos nuevos aparecen a partir de su segunda lectura.
+        """
+        ts = time.monotonic() if ts is None else ts
+        previous, previous_ts = self._previous, self._previous_ts
+        self._previous = {name: dict(values) for name, values in counters.items()}
+        self._previous_ts = ts
+
+        if previous_ts is None:
+            return None
+        elapsed = ts - previous_ts
+        if elapsed <= 0:
+            return None
+
+        rates = {}
+        for name, values in counters.items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            rates[name] = {
+                field: round(counter_delta(before.get(field, 0), values.get(field, 0)) / elapsed, 2)
+                for field in self.fields
+            }
+        return rates
+
+
+DISK_RATE_FIELDS = ["read_bytes", "write_bytes", "read_count", "write_count"]
+NET_RATE_FIELDS = [
+    "bytes_recv",
+    "bytes_sent",
+    "packets_recv",
+    "packets_sent",
+    "errin",
+    "errout",
+    "dropin",
+    "dropout",
+]
+
+
+def compact_disk_rates(rates: Optional[dict]) -> str:
+    """
+    Formato servidor de las tasas de disco:
+    {"total": {...}, "disks": {nombre: [read B/s, write B/s, read IOPS, write IOPS]}}
+
+    Como mucho MAX_TEXT_BYTES (metric_codec): si no cabe, se omiten los últimos discos.
+    """
+    if not rates:
+        return "{}"
+
+    def row(r):
+        return [r["read_bytes"], r["write_bytes"], r["read_count"], r["write_count"]]
+
+    total = rates.get("total") or {}
+    return fit_json(
+        lambda disks: {
+            "total": {
+                "read_bps": total.get("read_bytes"),
+                "write_bps": total.get("write_bytes"),
+                "read_iops": total.get("read_count"),
+                "write_iops": total.get("write_count"),
+            },
+            "disks": dict(disks),
+        },
+        [(name, row(r)) for name, r in (rates.get("per_disk") or {}).items()],
+    )
+
+
+def compact_network_rates(rates: Optional[dict]) -> str:
+    """
+    Formato servidor de las tasas de red:
+    {"total": {...}, "nics": {nombre: [rx B/s, tx B/s, rx pkt/s, tx pkt/s, err/s, drop/s]}}
+
+    Como mucho MAX_TEXT_BYTES (metric_codec): si no cabe, se omiten las últimas NICs.
+    """
+    if not rates:
+        return "{}"
+
+    def row(r):
+        return [
+            r["bytes_recv"],
+            r["bytes_sent"],
+            r["packets_recv"],
+            r["packets_sent"],
+            round(r["errin"] + r["errout"], 2),
+            round(r["dropin"] + r["dropout"], 2),
+        ]
+
+    total = row(rates["total"]) if rates.get("total") else [None] * 6
+    return fit_json(
+        lambda nics: {
+            "total": dict(zip(["rx_bps", "tx_bps", "rx_pps", "tx_pps", "err_ps", "drop_ps"], total)),
+            "nics": dict(nics),
+        },
+        [(name, row(r)) for name, r in (rates.get("per_nic") or {}).items()],
+    )
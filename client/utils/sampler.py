@@ -0,0 +1,125 @@
+"""
+Muestreo de métricas en segundo plano para el agente cliente.
+
+Un hilo daemon toma una muestra de get_system_info() (perfil METRIC_PROFILE)
+cada METRIC_INTERVAL segundos y la guarda en un buffer circular de tamaño fijo. Los endpoints de
+/metrics leen de este buffer, así que nunca bloquean esperando a psutil.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from .metrics import get_system_info
+
+# (timestamp epoch, snapshot de get_system_info)
+Sample = Tuple[float, dict]
+
+
+class MetricsSampler:
+    """Hilo que mantiene las últimas `buffer_size` muestras del sistema."""
+
+    def __init__(
+        self, interval: float = 1.0, buffer_size: int = 300, profile: str = "standard"
+    ):
+        self.interval = max(interval, 0.1)
+        self.profile = profile
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-sampler", daemon=True
+        )
+        self._thread.start()
+        print(
+            f"✅ Metrics sampler started (profile={self.profile}, interval={self.interval}s, buffer={self._buffer.maxlen})"
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        # Dejar una ventana de medición para el primer cpu_percent no bloqueante
+        self._stop.wait(self.interval)
+
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.sample_once()
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(self.interval - elapsed, 0))
+
+    def sample_once(self) -> Optional[Sample]:
+        """Toma una muestra y la añade al buffer."""
+        try:
+            # Los colectores bajo demanda (conexiones) nunca se muestrean aquí
+            data = get_system_info(self.profile, include_on_demand=False)
+        except Exception as e:
+            print(f"⚠️  Metrics sampler error: {type(e).__name__}: {str(e)}")
+            return None
+
+        sample = (time.time(), data)
+        with self._lock:
+            self._buffer.append(sample)
+        return sample
+
+    def latest(self) -> Optional[Sample]:
+        """
+        Devuelve la muestra más reciente, o None si aún no hay ninguna.
+
+        No muestrea aquí: se llama desde handlers async y psutil bloquearía el
+        event loop. Hasta la primera muestra del hilo las rutas responden 503.
+        """
+        with self._lock:
+            return self._buffer[-1] if self._buffer else None
+
+    def window(
+        self, since: Optional[datetime] = None, last: Optional[int] = None
+    ) -> List[Sample]:
+        """
+        Devuelve muestras en orden cronológico.
+
+        Args:
+            since: Solo muestras tomadas después de este instante
+            last: Como máximo las N muestras más recientes
+        """
+        since_ts = _to_epoch(since) if since else None
+        result = []
+        with self._lock:
+            for sample in reversed(self._buffer):
+                if since_ts is not None and sample[0] <= since_ts:
+                    break
+                result.append(sample)
+                if last is not None and len(result) >= last:
+                    break
+        result.reverse()
+        return result
+
+
+def _to_epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def sample_datetime(ts: float) -> datetime:
+    """Convierte el timestamp de una muestra a datetime UTC naive (como utcnow())."""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
+
+
+sampler = MetricsSampler(
+    interval=float(os.getenv("METRIC_INTERVAL", "1")),
+    buffer_size=int(os.getenv("METRIC_BUFFER_SIZE", "300")),
+    profile=os.getenv("METRIC_PROFILE", "standard"),
+)
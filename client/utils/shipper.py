@@ -0,0 +1,263 @@
+"""
+Envío de métricas al servidor central en lotes comprimidos.
+
+Cada METRIC_SHIP_INTERVAL segundos el shipper toma del muestreador las muestras
+nuevas desde el último envío, las convierte a MetricSample y las manda en un solo
+POST gzip a /client-api/metrics/batch, autenticado con X-Client-Secret.
+El cuerpo va en el formato binario de metric_codec (METRIC_WIRE_FORMAT=binary,
+por defecto); si el servidor responde 415 se pasa a JSON para el resto de la
+vida del proceso.
+Si el envío falla, las muestras quedan pendientes (hasta METRIC_SHIP_MAX_PENDING)
+y se reintentan en el siguiente ciclo. Un lote que el servidor rechaza de forma
+permanente (4xx salvo 408/429) o un registro corrupto del spool se descartan
+con un aviso, para no bloquear lo que viene detrás.
+"""
+
+import gzip
+import json
+import os
+import random
+import socket
+import threading
+from typing import List, Optional
+
+import httpx
+
+from ..models.metrics import MetricSample
+from .metric_codec import CONTENT_TYPE as BINARY_CONTENT_TYPE, decode_samples, encode_samples
+from .sampler import MetricsSampler, sample_datetime, sampler
+from .spool import MetricSpool, open_spool
+
+SERVER_CONFIG_FILE = "/etc/default/sssd-pgsql"
+# Respuestas 4xx que son temporales; el resto de 4xx descarta el lote
+_RETRYABLE_4XX = {408, 429}
+
+
+def resolve_server_url() -> Optional[str]:
+    """
+    URL del servidor central: SERVER_URL, luego la guardada por /api/sync/users
+    en /etc/default/sssd-pgsql, y por último SERVER_HOST/SERVER_PORT.
+    """
+    url = os.getenv("SERVER_URL")
+    if url:
+        return url.rstrip("/")
+
+    try:
+        with open(SERVER_CONFIG_FILE, "r") as f:
+            for line in f:
+                if line.startswith("SERVER_URL="):
+                    value = line.split("=", 1)[1].strip().strip('"')
+                    if value:
+                        return value.rstrip("/")
+    except OSError:
+        pass
+
+    host = os.getenv("SERVER_HOST")
+    if host:
+        return f"http://{host}:{os.getenv('SERVER_PORT', '8000')}"
+    return None
+
+
+class MetricShipper:
+    """Hilo que empuja lotes de métricas al servidor central."""
+
+    def __init__(
+        self,
+        sampler: MetricsSampler,
+        spool: MetricSpool,
+        interval: float = 5.0,
+        batch_size: int = 1000,
+        replay_rate: float = 2000.0,
+        max_backoff: float = 300.0,
+        timeout: float = 10.0,
+        wire_format: str = "binary",
+    ):
+        self.sampler = sampler
+        self.spool = spool
+        self.interval = max(interval, 0.5)
+        self.batch_size = batch_size
+        self.replay_rate = max(replay_rate, 1.0)
+        self.max_backoff = max(max_backoff, self.interval)
+        self.timeout = timeout
+        self.wire_format = "json" if wire_format == "json" else "binary"
+        self.server_id = int(os.getenv("SERVER_ID", "0")) or None
+        self.client_secret = os.getenv("CLIENT_SECRET", "")
+        self.hostname = os.getenv("HOSTNAME") or socket.gethostname()
+        self._last_ts: Optional[float] = None
+        self._failures = 0
+        self._retry_after: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._http: Optional[httpx.Client] = None
+
+    @property
+    def enabled(self) -> bool:
+        if os.getenv("METRIC_SHIPPING", "true").lower() == "false":
+            return False
+        return bool(self.client_secret)
+
+    def start(self) -> None:
+        if not self.enabled:
+            print("ℹ️  Metric shipping disabled (set CLIENT_SECRET to enable)")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._http = httpx.Client(timeout=self.timeout)
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-shipper", daemon=True
+        )
+        self._thread.start()
+        print(f"✅ Metric shipper started (interval={self.interval}s)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        if self._http:
+            self._http.close()
+            self._http = None
+        if self.enabled:
+            # Las muestras del último ciclo se guardan para el próximo arranque
+            self.collect_new()
+        self.spool.flush()
+
+    def next_delay(self) -> float:
+        """Espera hasta el próximo ciclo: el intervalo normal o el backoff tras fallos."""
+        if self._retry_after is not None:
+            delay, self._retry_after = self._retry_after, None
+            return delay
+        if not self._failures:
+            return self.interval
+        backoff = min(self.interval * 2 ** self._failures, self.max_backoff)
+        return random.uniform(backoff / 2, backoff)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.next_delay()):
+            try:
+                ok = self.ship_once()
+            except Exception as e:
+                print(f"⚠️  Metric shipper error: {type(e).__name__}: {str(e)}")
+                ok = False
+            self._failures = 0 if ok else min(self._failures + 1, 16)
+
+    def collect_new(self) -> int:
+        """Añade al spool las muestras del buffer posteriores al último envío."""
+        samples = self.sampler.window(
+            since=sample_datetime(self._last_ts) if self._last_ts else None
+        )
+        for ts, data in samples:
+            sample = MetricSample.from_system_info(data, ts).model_dump()
+            self.spool.append(encode_samples([sample]))
+        if samples:
+            self._last_ts = samples[-1][0]
+        return len(samples)
+
+    def ship_once(self) -> bool:
+        """Envía todo lo pendiente del spool. False si el servidor no lo aceptó."""
+        self.collect_new()
+        if not len(self.spool):
+            return True
+
+        server_url = resolve_server_url()
+        if not server_url:
+            return False
+
+        while len(self.spool):
+            records, position = self.spool.peek(self.batch_size)
+            if not records:
+                break
+            samples = self.decode_records(records)
+            if samples and not self.send_batch(server_url, samples):
+                return False
+            self.spool.commit(position)
+
+            if len(self.spool):
+                # Reenvío del atraso a ritmo limitado
+                if self._stop.wait(len(samples) / self.replay_rate):
+                    break
+        return True
+
+    def decode_records(self, records: List[bytes]) -> List[dict]:
+        """
+        Muestras de los registros del spool. Un registro corrupto o truncado
+        (el spool sobrevive a reinicios y cortes) se descarta: si no, peek()
+        lo devolvería en cada ciclo y el envío quedaría parado para siempre.
+        """
+        samples = []
+        for record in records:
+            try:
+                samples.extend(decode_samples(record)[1])
+            except ValueError as e:
+                print(f"⚠️  Dropping corrupt spool record ({len(record)} bytes): {str(e)}")
+        return samples
+
+    def encode_batch(self, samples: List[dict]) -> tuple:
+        """Devuelve (content_type, cuerpo sin comprimir) según wire_format."""
+        if self.wire_format == "binary":
+            return BINARY_CONTENT_TYPE, encode_samples(samples, self.server_id)
+        body = json.dumps(
+            {"server_id": self.server_id, "samples": samples},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        return "application/json", body
+
+    def send_batch(self, server_url: str, samples: List[dict]) -> bool:
+        """
+        True si el spool puede avanzar: el servidor aceptó el lote o lo
+        rechazó de forma permanente (4xx salvo 408/429), en cuyo caso se
+        descarta; reenviarlo no cambiaría la respuesta y bloquearía todo lo
+        que viene detrás. 408, 429, 5xx y errores de red se reintentan.
+        """
+        content_type, body = self.encode_batch(samples)
+        try:
+            response = self._http.post(
+                f"{server_url}/client-api/metrics/batch",
+                content=gzip.compress(body),
+                headers={
+                    "Content-Type": content_type,
+                    "Content-Encoding": "gzip",
+                    "X-Client-Secret": self.client_secret,
+                    "X-Client-Host": self.hostname,
+                },
+            )
+            if self.wire_format == "binary" and (
+                response.status_code == 415
+                # Servidores anteriores responden 422 a una versión de trama que no conocen
+                or (response.status_code == 422 and "Unsupported metrics frame" in response.text)
+            ):
+                # Servidor sin soporte binario (o sin esta versión): seguir en JSON
+                print("ℹ️  Server does not accept binary metrics, falling back to JSON")
+                self.wire_format = "json"
+                return self.send_batch(server_url, samples)
+            response.raise_for_status()
+            return True
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            if 400 <= status_code < 500 and status_code not in _RETRYABLE_4XX:
+                print(
+                    f"❌ Metric batch of {len(samples)} samples dropped: "
+                    f"HTTP {status_code} - {e.response.text[:200]}"
+                )
+                return True
+            retry_after = e.response.headers.get("retry-after", "")
+            if status_code in (429, 503) and retry_after.isdigit():
+                self._retry_after = float(retry_after)
+            print(f"⚠️  Metric batch rejected: HTTP {status_code} - {e.response.text[:200]}")
+        except httpx.HTTPError as e:
+            print(f"⚠️  Metric batch not sent ({len(self.spool)} samples spooled): {str(e)}")
+        return False
+
+
+shipper = MetricShipper(
+    sampler,
+    open_spool(
+        os.getenv("METRIC_SPOOL_PATH", "/app/client_data/metrics.spool"),
+        float(os.getenv("METRIC_SPOOL_SIZE_MB", "64")),
+    ),
+    interval=float(os.getenv("METRIC_SHIP_INTERVAL", "5")),
+    batch_size=int(os.getenv("METRIC_SHIP_BATCH_SIZE", "1000")),
+    replay_rate=float(os.getenv("METRIC_REPLAY_RATE", "2000")),
+    wire_format=os.getenv("METRIC_WIRE_FORMAT", "binary").lower(),
+)
@@ -0,0 +1,187 @@
+"""
+Spool en disco para las métricas que aún no se han enviado al servidor.
+
+Es un buffer circular de tamaño fijo sobre un fichero mapeado en memoria
+(METRIC_SPOOL_PATH, METRIC_SPOOL_SIZE_MB). Las posiciones de escritura y
+lectura son offsets lógicos que solo crecen; el offset físico es
+`posición % capacidad`. Cada registro es `longitud u32 | payload`.
+
+    cabecera (64 B): magic | capacidad | pos. escritura | pos. lectura | registros | descartados
+
+Si el spool se llena se descartan los registros más antiguos. Los registros
+se leen con peek() y solo se eliminan con commit() cuando el servidor ha
+confirmado el lote, así que un fallo a mitad de envío no pierde datos y el
+reenvío conserva el orden. Sobrevive a reinicios del agente.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+MAGIC = b"PPSPOOL1"
+_HEADER = struct.Struct("<8sQQQQQ")
+HEADER_SIZE = 64
+_LEN = struct.Struct("<I")
+
+
+class MetricSpool:
+    def __init__(self, path: Optional[str], capacity: int):
+        """
+        Args:
+            path: Fichero del spool; None para un spool solo en memoria
+            capacity: Bytes de datos (sin contar la cabecera)
+        """
+        self.path = path
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._mm = self._open()
+        magic, capacity, write_pos, read_pos, count, dropped = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or capacity != self.capacity or read_pos > write_pos:
+            write_pos = read_pos = count = dropped = 0
+        self._write_pos = write_pos
+        self._read_pos = read_pos
+        self._count = count
+        self.dropped = dropped
+        self._store_header()
+
+    def _open(self) -> mmap.mmap:
+        size = HEADER_SIZE + self.capacity
+        if self.path is None:
+            return mmap.mmap(-1, size)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size != size:
+                # Tamaño distinto (o fichero nuevo): la cabecera no validará y se reinicia
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _store_header(self) -> None:
+        _HEADER.pack_into(
+            self._mm, 0, MAGIC, self.capacity,
+            self._write_pos, self._read_pos, self._count, self.dropped,
+        )
+
+    def _write_at(self, pos: int, data: bytes) -> None:
+        offset = pos % self.capacity
+        first = min(len(data), self.capacity - offset)
+        self._mm[HEADER_SIZE + offset : HEADER_SIZE + offset + first] = data[:first]
+        if first < len(data):
+            self._mm[HEADER_SIZE : HEADER_SIZE + len(data) - first] = data[first:]
+
+    def _read_at(self, pos: int, size: int) -> bytes:
+        offset = pos % self.capacity
+        first = min(size, self.capacity - offset)
+        data = self._mm[HEADER_SIZE + offset : HEADER_SIZE + offset + first]
+        if first < size:
+            data += self._mm[HEADER_SIZE : HEADER_SIZE + size - first]
+        return data
+
+    def _record_size(self, pos: int) -> Optional[int]:
+        """Tamaño total del registro en `pos`, o None si la cabecera del registro es inválida."""
+        if self._write_pos - pos < _LEN.size:
+            return None
+        (length,) = _LEN.unpack(self._read_at(pos, _LEN.size))
+        size = _LEN.size + length
+        if length == 0 or size > self._write_pos - pos:
+            return None
+        return size
+
+    def _reset_unread(self) -> None:
+        print(f"⚠️  Metric spool corrupted at offset {self._read_pos}, discarding {self._count} records")
+        self.dropped += self._count
+        self._read_pos = self._write_pos
+        self._count = 0
+
+    def append(self, payload: bytes) -> bool:
+        """Añade un registro; descarta los más antiguos si no hay sitio."""
+        record = _LEN.pack(len(payload)) + payload
+        if not payload or len(record) > self.capacity:
+            return False
+        with self._lock:
+            while self._write_pos + len(record) - self._read_pos > self.capacity:
+                size = self._record_size(self._read_pos)
+                if size is None:
+                    self._reset_unread()
+                    break
+                self._read_pos += size
+                self._count -= 1
+                self.dropped += 1
+            self._write_at(self._write_pos, record)
+            self._write_pos += len(record)
+            self._count += 1
+            self._store_header()
+        return True
+
+    def peek(self, max_records: int) -> Tuple[List[bytes], int]:
+        """
+        Devuelve hasta `max_records` registros desde el cursor de lectura, sin
+        consumirlos, y la posición a pasar a commit() tras enviarlos.
+        """
+        records = []
+        with self._lock:
+            pos = self._read_pos
+            while len(records) < max_records and pos < self._write_pos:
+                size = self._record_size(pos)
+                if size is None:
+                    self._reset_unread()
+                    self._store_header()
+                    return [], self._read_pos
+                records.append(self._read_at(pos + _LEN.size, size - _LEN.size))
+                pos += size
+        return records, pos
+
+    def commit(self, position: int) -> None:
+        """Marca como enviados los registros anteriores a `position`."""
+        with self._lock:
+            # Si append() descartó parte del lote mientras se enviaba, el cursor
+            # ya está más adelante y solo se consumen los registros restantes
+            while self._read_pos < min(position, self._write_pos):
+                size = self._record_size(self._read_pos)
+                if size is None:
+                    self._reset_unread()
+                    break
+                self._read_pos += size
+                self._count -= 1
+            self._store_header()
+            self._mm.flush()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def flush(self) -> None:
+        with self._lock:
+            self._mm.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "capacity_bytes": self.capacity,
+                "used_bytes": self._write_pos - self._read_pos,
+                "records": self._count,
+                "dropped": self.dropped,
+            }
+
+
+def open_spool(path: Optional[str], size_mb: float) -> MetricSpool:
+    """Abre el spool en disco; si no se puede, usa uno en memoria del mismo tamaño."""
+    capacity = max(int(size_mb * 1024 * 1024), 4096)
+    if path:
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            return MetricSpool(path, capacity)
+        except OSError as e:
+            print(f"⚠️  Cannot open metric spool {path} ({str(e)}), using memory only")
+    return MetricSpool(None, capacity)
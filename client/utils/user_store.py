@@ -0,0 +1,131 @@
+"""
+Escritura por lotes de los usuarios sincronizados en la base de datos local.
+
+En lugar de un SELECT y un INSERT/UPDATE por usuario, cada sincronización
+hace pocas sentencias sobre conjuntos, dentro de la transacción de quien
+llama (no hace commit):
+
+1. COPY de los usuarios recibidos a una tabla temporal (sync_users, se
+   borra al confirmar)
+2. Snapshot: un DELETE con anti-join borra los usuarios locales que no vienen
+3. Los usuarios locales que van a cambiar de username/email/system_uid a uno
+   que ahora tiene otro usuario del lote se "aparcan" con valores
+   provisionales, para que los intercambios no choquen con los UNIQUE
+4. INSERT ... ON CONFLICT (id) DO UPDATE ... WHERE la fila cambia: las
+   filas iguales no se reescriben
+
+apply_users() devuelve cuántos se crearon, actualizaron, quedaron igual y
+se borraron. Solo depende de psycopg2 (lo usa también
+scripts/benchmarks/user_sync_bench.py).
+"""
+
+import io
+from datetime import datetime
+from typing import Iterable, Mapping
+
+USER_COLUMNS = (
+    "id",
+    "username",
+    "email",
+    "password_hash",
+    "is_admin",
+    "is_active",
+    "must_change_password",
+    "system_uid",
+    "system_gid",
+    "ssh_public_key",
+    "password_max_age_days",
+    "password_changed_at",
+    "created_at",
+)
+
+_COLUMNS = ", ".join(USER_COLUMNS)
+_UPDATED = [column for column in USER_COLUMNS if column != "id"]
+
+_UPSERT_SQL = f"""
+WITH applied AS (
+    INSERT INTO users ({_COLUMNS})
+    SELECT {_COLUMNS} FROM sync_users
+    ON CONFLICT (id) DO UPDATE SET
+        {", ".join(f"{column} = EXCLUDED.{column}" for column in _UPDATED)}
+    WHERE ({", ".join(f"users.{column}" for column in _UPDATED)})
+        IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in _UPDATED)})
+    RETURNING (xmax = 0) AS created
+)
+SELECT COUNT(*) FILTER (WHERE created), COUNT(*) FILTER (WHERE NOT created) FROM applied
+"""
+
+# Valores provisionales válidos para el CHECK de username; se sobrescriben en el upsert
+_PARK_SQL = """
+UPDATE users u
+SET username = '_sync_' || u.id, email = u.id || '@sync.invalid', system_uid = -u.id
+FROM sync_users s
+WHERE s.id = u.id
+  AND (s.username, s.email, s.system_uid) IS DISTINCT FROM (u.username, u.email, u.system_uid)
+  AND EXISTS (
+      SELECT 1 FROM sync_users o
+      WHERE o.id <> u.id
+        AND (o.username = u.username OR o.email = u.email OR o.system_uid = u.system_uid)
+  )
+"""
+
+
+def _copy_value(value) -> str:
+    """Valor en el formato de texto de COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def stage_users(cur, users: Iterable[Mapping]) -> int:
+    """Carga los usuarios (dicts con USER_COLUMNS) en la tabla temporal sync_users."""
+    cur.execute("DROP TABLE IF EXISTS pg_temp.sync_users")
+    cur.execute(
+        f"CREATE TEMP TABLE sync_users ON COMMIT DROP AS SELECT {_COLUMNS} FROM users WITH NO DATA"
+    )
+    buffer = io.StringIO()
+    count = 0
+    for user in users:
+        buffer.write("\t".join(_copy_value(user[column]) for column in USER_COLUMNS))
+        buffer.write("\n")
+        count += 1
+    buffer.seek(0)
+    cur.copy_expert(f"COPY sync_users ({_COLUMNS}) FROM STDIN", buffer)
+    cur.execute("ANALYZE sync_users")
+    return count
+
+
+def apply_users(cur, users: Iterable[Mapping], delete_missing: bool = False) -> dict:
+    """
+    Crea o actualiza `users` en la tabla local; con delete_missing (snapshot)
+    borra además los usuarios locales que no vienen.
+    """
+    received = stage_users(cur, users)
+
+    deleted = 0
+    if delete_missing:
+        cur.execute(
+            "DELETE FROM users u WHERE NOT EXISTS (SELECT 1 FROM sync_users s WHERE s.id = u.id)"
+        )
+        deleted = cur.rowcount
+
+    cur.execute(_PARK_SQL)
+    cur.execute(_UPSERT_SQL)
+    created, updated = cur.fetchone()
+    return {
+        "received": received,
+        "created": created,
+        "updated": updated,
+        "unchanged": received - created - updated,
+        "deleted": deleted,
+    }
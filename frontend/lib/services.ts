@@ -9,16 +9,37 @@ export interface Server {
     ssh_private_key_path: string | null;
     ssh_status?: string; // pending, deployed, failed
     has_ssh_password?: boolean; // Indica si tiene contraseña SSH guardada
+    status_checked_at?: string | null; // Última comprobación del monitor de estado
+    last_heartbeat_at?: string | null; // Último latido del agente
+    agent_version?: string | null;
 }
 
 export interface Metric {
     id: number;
     server_id: number;
+    timestamp: string; // ISO 8601 con zona horaria
+    cpu_percent: number | null;
+    load_1: number | null;
+    mem_percent: number | null;
+    mem_used: number | null; // bytes
+    mem_total: number | null; // bytes
+    swap_percent: number | null;
+    disk_percent: number | null;
+    disk_used: number | null; // bytes
+    disk_total: number | null; // bytes
+    disk_read_bps: number | null;
+    disk_write_bps: number | null;
+    net_rx_bps: number | null;
+    net_tx_bps: number | null;
+    gpu_percent: number | null; // media de todas las GPUs
+    gpu_mem_percent: number | null;
+    gpu_usage: string; // JSON: detalle por GPU
+    disk_io?: string; // JSON: tasas de disco (B/s, IOPS) calculadas por el cliente
+    network_io?: string; // JSON: tasas por NIC (B/s, paquetes/s, errores/s)
+    // Formato anterior (JSON en texto), derivado de las columnas numéricas
     cpu_usage: string;
     memory_usage: string;
     disk_usage: string;
-    gpu_usage: string;
-    timestamp: string;
 }
 
 export interface Playbook {
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la reducción LTTB de server/utils/downsample.py.
+
+Sobre una serie sintética (paseo aleatorio con picos cortos, como la carga de
+GPU de un job) compara para --points puntos de salida:
+- lttb-numpy:  lttb_indices (cubos y medias vectorizados con NumPy)
+- lttb-python: LTTB de referencia en Python puro, punto a punto
+- stride:      quedarse con 1 de cada k muestras
+- mean:        media de cada cubo
+
+Mide tiempo y cuántos de los picos de la serie original sobreviven. Requiere numpy.
+
+Uso:
+    python scripts/benchmarks/lttb_bench.py [--size 1000000] [--points 500] [--repeat 5]
+"""
+
+import argparse
+import importlib.util
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+DOWNSAMPLE_PATH = Path(__file__).resolve().parents[2] / "server" / "utils" / "downsample.py"
+
+
+def load_downsample():
+    spec = importlib.util.spec_from_file_location("downsample", DOWNSAMPLE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_series(n, spikes):
+    rng = np.random.default_rng(42)
+    x = np.arange(n, dtype=np.float64) + 1.7e9  # timestamps a 1 muestra/s
+    y = np.clip(50 + np.cumsum(rng.normal(0, 0.2, n)), 0, 90)
+    peaks = rng.choice(n, spikes, replace=False)
+    y[peaks] = 100.0  # picos de una sola muestra
+    return x, y, np.sort(peaks)
+
+
+def lttb_python(x, y, n_out):
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    selected = [0]
+    for i in range(n_out - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        if end >= next_end:
+            cx, cy = x[n - 1], y[n - 1]
+        else:
+            cx = sum(x[end:next_end]) / (next_end - end)
+            cy = sum(y[end:next_end]) / (next_end - end)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def stride(x, y, n_out):
+    return np.arange(0, len(x), max(len(x) // n_out, 1))
+
+
+def bucket_mean(x, y, n_out):
+    edges = np.linspace(0, len(x), n_out + 1).astype(np.int64)[:-1]
+    return np.add.reduceat(y, edges) / np.diff(np.append(edges, len(x)))
+
+
+def timed(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--spikes", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    downsample = load_downsample()
+    x, y, peaks = make_series(args.size, args.spikes)
+    x_list, y_list = x.tolist(), y.tolist()
+    bucket = args.size / args.points
+
+    methods = {
+        "lttb-numpy": (lambda: downsample.lttb_indices(x, y, args.points), args.repeat),
+        "lttb-python": (lambda: lttb_python(x_list, y_list, args.points), 1),
+        "stride": (lambda: stride(x, y, args.points), args.repeat),
+        "mean": (lambda: bucket_mean(x, y, args.points), args.repeat),
+    }
+
+    print(f"{args.size} points -> {args.points}, {args.spikes} spikes of 100 over a baseline <= 90\n")
+    print(f"{'method':<12} {'ms':>9} {'points':>7} {'max':>7} {'spikes kept':>12}")
+    reference = None
+    for name, (func, repeat) in methods.items():
+        seconds, result = timed(func, repeat)
+        note = ""
+        if name == "mean":
+            values = result
+            # Un pico cuenta si su cubo supera claramente la línea base
+            kept = len({int(p // bucket) for p in peaks if values[min(int(p // bucket), len(values) - 1)] >= 95})
+        else:
+            indices = np.asarray(result)
+            values = y[indices]
+            kept = len(np.intersect1d(indices, peaks))
+            if name == "lttb-numpy":
+                reference = indices
+            elif name == "lttb-python" and len(indices) == len(reference):
+                note = f"  ({np.mean(indices == reference) * 100:.1f}% same points as lttb-numpy)"
+        print(
+            f"{name:<12} {seconds * 1000:>9.1f} {len(values):>7} {np.max(values):>7.1f} "
+            f"{kept:>6}/{args.spikes}{note}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark del formato de envío de métricas agente → servidor.
+
+Compara, para un lote de N muestras sintéticas (2 GPUs con procesos):
+- legacy-json: MetricCreate con columnas de texto JSON (formato anterior)
+- typed-json:  MetricSample tipadas en JSON ("samples")
+- binary:      trama de client/utils/metric_codec.py
+
+Mide tiempo de codificación/decodificación y bytes por muestra, con y sin gzip.
+Solo usa la librería estándar.
+
+Uso:
+    python scripts/benchmarks/metric_codec_bench.py [--samples 1000] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import importlib.util
+import json
+import random
+import time
+from pathlib import Path
+
+CODEC_PATH = Path(__file__).resolve().parents[2] / "client" / "utils" / "metric_codec.py"
+
+
+def load_codec():
+    spec = importlib.util.spec_from_file_location("metric_codec", CODEC_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_samples(n):
+    rnd = random.Random(42)
+    start = time.time() - n
+    samples = []
+    for i in range(n):
+        gpus = [
+            [g, rnd.uniform(0, 100), rnd.uniform(0, 100), rnd.randint(0, 80000), rnd.randint(30, 85),
+             [[rnd.randint(1000, 99999), rnd.randint(100, 40000)]]]
+            for g in range(2)
+        ]
+        samples.append({
+            "ts": start + i,
+            "cpu_percent": rnd.uniform(0, 100),
+            "load_1": rnd.uniform(0, 64),
+            "mem_percent": rnd.uniform(0, 100),
+            "mem_used": float(rnd.randint(1, 512) * 2**30),
+            "mem_total": float(512 * 2**30),
+            "swap_percent": rnd.uniform(0, 10),
+            "disk_percent": rnd.uniform(0, 100),
+            "disk_used": float(rnd.randint(1, 4000) * 2**30),
+            "disk_total": float(4000 * 2**30),
+            "disk_read_bps": rnd.uniform(0, 5e8),
+            "disk_write_bps": rnd.uniform(0, 5e8),
+            "net_rx_bps": rnd.uniform(0, 1.25e9),
+            "net_tx_bps": rnd.uniform(0, 1.25e9),
+            "gpu_percent": sum(g[1] for g in gpus) / len(gpus),
+            "gpu_mem_percent": sum(g[2] for g in gpus) / len(gpus),
+            "gpu_usage": json.dumps(gpus, separators=(",", ":")),
+        })
+    return samples
+
+
+def legacy_rows(samples):
+    return [
+        {
+            "server_id": 1,
+            "cpu_usage": json.dumps({"usage_percent": s["cpu_percent"], "cores_logical": 64, "cores_physical": 32}),
+            "memory_usage": json.dumps({"total": s["mem_total"], "available": s["mem_total"] - s["mem_used"],
+                                        "used": s["mem_used"], "percent": s["mem_percent"]}),
+            "disk_usage": json.dumps({"total": s["disk_total"], "used": s["disk_used"],
+                                      "free": s["disk_total"] - s["disk_used"], "percent": s["disk_percent"]}),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(s["ts"])) + "Z",
+            "gpu_usage": s["gpu_usage"],
+            "disk_io": json.dumps({"total": {"read_bps": s["disk_read_bps"], "write_bps": s["disk_write_bps"]}}),
+            "network_io": json.dumps({"total": {"rx_bps": s["net_rx_bps"], "tx_bps": s["net_tx_bps"]}}),
+        }
+        for s in samples
+    ]
+
+
+def timed(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    codec = load_codec()
+    samples = make_samples(args.samples)
+    legacy = legacy_rows(samples)
+    dumps = lambda payload: json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+    formats = {
+        "legacy-json": (lambda: dumps({"server_id": 1, "metrics": legacy}), json.loads),
+        "typed-json": (lambda: dumps({"server_id": 1, "samples": samples}), json.loads),
+        "binary": (lambda: codec.encode_samples(samples, 1), codec.decode_samples),
+    }
+
+    n = args.samples
+    print(f"{n} samples, best of {args.repeat}\n")
+    print(f"{'format':<12} {'B/sample':>9} {'gzip B/s':>9} {'enc µs/s':>9} {'dec µs/s':>9}")
+    for name, (encode, decode) in formats.items():
+        enc_time, body = timed(encode, args.repeat)
+        dec_time, _ = timed(lambda: decode(body), args.repeat)
+        zipped = gzip.compress(body)
+        print(
+            f"{name:<12} {len(body) / n:>9.1f} {len(zipped) / n:>9.1f} "
+            f"{enc_time / n * 1e6:>9.2f} {dec_time / n * 1e6:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env bash
+# nvidia-smi falso para probar el colector de GPU del cliente sin hardware NVIDIA.
+#
+# Uso:
+#   mkdir -p /tmp/fakegpu && ln -sf "$(pwd)/scripts/testing/fake_nvidia_smi.sh" /tmp/fakegpu/nvidia-smi
+#   PATH=/tmp/fakegpu:$PATH python -m client.utils.metrics
+#
+# Variables:
+#   FAKE_GPU_COUNT  número de GPUs simuladas (default 2)
+#   FAKE_GPU_PIDS   "pid:MB,pid:MB" procesos en la GPU 0 (default "4242:1024")
+
+GPU_COUNT="${FAKE_GPU_COUNT:-2}"
+PIDS="${FAKE_GPU_PIDS:-4242:1024}"
+
+QUERY=""
+LOOP_MS=""
+for arg in "$@"; do
+  case "$arg" in
+    --query-gpu=*) QUERY="gpu:${arg#--query-gpu=}" ;;
+    --query-compute-apps=*) QUERY="apps:${arg#--query-compute-apps=}" ;;
+    --loop-ms=*) LOOP_MS="${arg#--loop-ms=}" ;;
+  esac
+done
+
+print_gpus() {
+  local fields="$1"
+  for ((i = 0; i < GPU_COUNT; i++)); do
+    if [[ "$fields" == "index,uuid,name,memory.total" ]]; then
+      echo "$i, GPU-fake-$i, NVIDIA Fake $i, 24576"
+    else
+      echo "$i, GPU-fake-$i, NVIDIA Fake $i, $((RANDOM % 100)), $((RANDOM % 100)), 24576, $((RANDOM % 24576)), $((40 + RANDOM % 40)), [N/A]"
+    fi
+  done
+}
+
+print_apps() {
+  local ts
+  ts="$(date '+%Y/%m/%d %H:%M:%S.%N')"
+  IFS=',' read -ra entries <<< "$PIDS"
+  for entry in "${entries[@]}"; do
+    [[ -z "$entry" ]] && continue
+    echo "$ts, GPU-fake-0, ${entry%%:*}, python, ${entry##*:}"
+  done
+}
+
+run_once() {
+  case "$QUERY" in
+    gpu:*) print_gpus "${QUERY#gpu:}" ;;
+    apps:*) print_apps ;;
+    *) echo "Fake NVIDIA-SMI: $GPU_COUNT GPU(s)" ;;
+  esac
+}
+
+if [[ -n "$LOOP_MS" ]]; then
+  while true; do
+    run_once
+    sleep "$(awk "BEGIN { print $LOOP_MS / 1000 }")"
+  done
+else
+  run_once
+fi
@@ -0,0 +1,117 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..models.models import Metric
+
+
+# CREATE
+def insert_metrics_bulk(db: Session, rows: List[dict]) -> int:
+    """
+    Inserta muchas métricas con INSERT multi-fila.
+
+    Con SQLAlchemy 2.x + psycopg2, execute(insert(), lista) agrupa las filas en
+    sentencias INSERT ... VALUES (...), (...) de hasta 1000 filas, en lugar de
+    un objeto ORM (y un round trip) por muestra.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(Metric), rows)
+    db.commit()
+    return len(rows)
+
+
+# READ
+def get_server_metrics(
+    db: Session,
+    server_id: int,
+    limit: int = 10,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Metric]:
+    """
+    Métricas de un servidor, de la más reciente a la más antigua.
+
+    El filtro por server_id + rango de timestamp y el ORDER BY timestamp DESC
+    coinciden con el índice (server_id, timestamp DESC): PostgreSQL recorre
+    el rango del índice y se detiene tras `limit` filas, sin ordenar.
+    """
+    query = select(Metric).where(Metric.server_id == server_id)
+    if since is not None:
+        query = query.where(Metric.timestamp >= since)
+    if until is not None:
+        query = query.where(Metric.timestamp < until)
+    query = query.order_by(Metric.timestamp.desc()).limit(limit)
+    return list(db.scalars(query))
+
+
+def get_server_metric_series(
+    db: Session,
+    server_id: int,
+    since: datetime,
+    until: datetime,
+    max_rows: int,
+    field: Optional[str] = None,
+) -> list:
+    """
+    Filas de un servidor en [since, until) en orden cronológico, como Row
+    (sin objetos ORM: una serie de un día a 1 muestra/s son 86.400 filas).
+    Si hay más de `max_rows` se quedan las más recientes.
+
+    Con `field` solo se leen la clave (id, timestamp) y esa columna, lo
+    necesario para elegir los puntos de una reducción; las filas completas
+    de los elegidos se cargan después con get_metric_rows.
+    """
+    columns = (Metric.id, Metric.timestamp, getattr(Metric, field)) if field else (Metric.__table__,)
+    query = (
+        select(*columns)
+        .where(Metric.server_id == server_id, Metric.timestamp >= since, Metric.timestamp < until)
+        .order_by(Metric.timestamp.desc())
+        .limit(max_rows)
+    )
+    rows = list(db.execute(query))
+    rows.reverse()
+    return rows
+
+
+def get_metric_rows(db: Session, server_id: int, keys: List[tuple]) -> list:
+    """
+    Filas completas de un servidor por clave primaria (id, timestamp), en
+    orden cronológico. El rango de timestamps de las claves limita la
+    búsqueda a las particiones que las contienen.
+    """
+    if not keys:
+        return []
+    timestamps = [ts for _, ts in keys]
+    query = (
+        select(Metric.__table__)
+        .where(
+            Metric.server_id == server_id,
+            Metric.timestamp >= min(timestamps),
+            Metric.timestamp <= max(timestamps),
+            tuple_(Metric.id, Metric.timestamp).in_(keys),
+        )
+        .order_by(Metric.timestamp)
+    )
+    return list(db.execute(query))
+
+
+def get_latest_metric(db: Session, server_id: int) -> Optional[Metric]:
+    metrics = get_server_metrics(db, server_id, limit=1)
+    return metrics[0] if metrics else None
+
+
+def get_latest_metrics(db: Session, since: Optional[datetime] = None) -> List[Metric]:
+    """
+    Última métrica de cada servidor en una sola consulta (DISTINCT ON).
+
+    Con `since` solo se miran las muestras recientes, lo que basta para
+    refrescar una caché que ya conoce las anteriores.
+    """
+    query = select(Metric).distinct(Metric.server_id)
+    if since is not None:
+        query = query.where(Metric.timestamp >= since)
+    query = query.order_by(Metric.server_id, Metric.timestamp.desc())
+    return list(db.scalars(query))
@@ -1,10 +1,12 @@
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import case, insert, select, update
 from sqlalchemy.orm import Session
 
-from ..models.models import Server, ServerCreate
+from ..models.models import Heartbeat, Server, ServerCreate, ServerStatusTransition
 from ..utils.encryption import decrypt_password, encrypt_password
-from ..utils.server_status import get_server_status
+from ..utils.server_status import get_server_status, probe_hosts_sync
 from ..utils.ssh import deploy_ssh_key, generate_ssh_keypair
 
 
@@ -33,6 +35,19 @@ def create_server(db: Session, server: ServerCreate) -> Server:
         ssh_password_encrypted=encrypted_ssh_pwd,
     )
     db.add(db_server)
+    db.flush()
+    _log_transitions(
+        db,
+        [
+            {
+                "server_id": db_server.id,
+                "from_status": None,
+                "to_status": db_server.status,
+                "changed_at": datetime.now(timezone.utc),
+                "source": "created",
+            }
+        ],
+    )
     db.commit()
     db.refresh(db_server)
 
@@ -61,17 +76,21 @@ def create_server(db: Session, server: ServerCreate) -> Server:
 
 
 def get_server_by_id(
-    db: Session, server_id: int, check_status: bool = True
+    db: Session, server_id: int, check_status: bool = False
 ) -> Optional[Server]:
-    """Obtiene un servidor por su ID y actualiza su estado si check_status=True"""
+    """
+    Obtiene un servidor por su ID.
+
+    El estado lo mantiene el monitor de estado (utils/server_monitor.py);
+    check_status=True lo sondea además en el momento.
+    """
     server = db.query(Server).filter(Server.id == server_id).first()
 
     if server and check_status:
         # Actualizar el estado real del servidor
-        real_status = get_server_status(server.ip_address)
-        if server.status != real_status:
-            server.status = real_status  # type: ignore
-            db.commit()
+        record_status_checks(
+            db, {server.id: get_server_status(server.ip_address)}, source="probe"
+        )
 
     return server
 
@@ -87,18 +106,24 @@ def get_server_by_ip(db: Session, ip_address: str) -> Optional[Server]:
 
 
 def get_all_servers(
-    db: Session, skip: int = 0, limit: int = 100, check_status: bool = True
+    db: Session, skip: int = 0, limit: int = 100, check_status: bool = False
 ) -> List[Server]:
-    """Obtiene todos los servidores con paginación y actualiza su estado si check_status=True"""
+    """
+    Obtiene todos los servidores con paginación.
+
+    El estado lo mantiene el monitor de estado (utils/server_monitor.py);
+    check_status=True los sondea además en el momento.
+    """
     servers = db.query(Server).offset(skip).limit(limit).all()
 
-    if check_status:
-        # Actualizar el estado real de cada servidor
-        for server in servers:
-            real_status = get_server_status(server.ip_address)
-            if server.status != real_status:
-                server.status = real_status  # type: ignore
-        db.commit()
+    if check_status and servers:
+        # Actualizar el estado real de cada servidor (todos sondeados en paralelo)
+        results = probe_hosts_sync([server.ip_address for server in servers])
+        record_status_checks(
+            db,
+            {server.id: results[server.ip_address].status for server in servers},
+            source="probe",
+        )
 
     return servers
 
@@ -151,12 +176,175 @@ def update_server_status(db: Session, server_id: int, status: str) -> Optional[S
     if not db_server:
         return None
 
-    db_server.status = status  # type: ignore
-    db.commit()
+    record_status_checks(db, {server_id: status}, source="manual")
     db.refresh(db_server)
     return db_server
 
 
+def _log_transitions(db: Session, transitions: List[dict]) -> None:
+    """Añade cambios de estado al historial en un solo INSERT multi-fila (sin commit)."""
+    if transitions:
+        db.execute(insert(ServerStatusTransition), transitions)
+
+
+def record_status_checks(
+    db: Session,
+    statuses: Dict[int, str],
+    now: Optional[datetime] = None,
+    source: str = "monitor",
+) -> List[int]:
+    """
+    Guarda el resultado de comprobar el estado de varios servidores ({id: status}).
+
+    Solo se reescribe status (y status_changed_at) en los que cambian, con un
+    UPDATE por estado, y sus cambios se añaden al historial
+    (server_status_transitions); al resto solo se le actualiza
+    status_checked_at, todos en un único UPDATE. Devuelve los IDs que
+    cambiaron de estado.
+    """
+    if not statuses:
+        return []
+    now = now or datetime.now(timezone.utc)
+    current = dict(db.query(Server.id, Server.status).filter(Server.id.in_(list(statuses))))
+
+    changed: Dict[str, List[int]] = {}
+    unchanged = []
+    for server_id, status in statuses.items():
+        if server_id not in current:
+            continue
+        if current[server_id] != status:
+            changed.setdefault(status, []).append(server_id)
+        else:
+            unchanged.append(server_id)
+
+    for status, ids in changed.items():
+        db.execute(
+            update(Server)
+            .where(Server.id.in_(ids))
+            .values(status=status, status_changed_at=now, status_checked_at=now)
+        )
+    if unchanged:
+        db.execute(update(Server).where(Server.id.in_(unchanged)).values(status_checked_at=now))
+    _log_transitions(
+        db,
+        [
+            {
+                "server_id": server_id,
+                "from_status": current[server_id],
+                "to_status": status,
+                "changed_at": now,
+                "source": source,
+            }
+            for status, ids in changed.items()
+            for server_id in ids
+        ],
+    )
+    db.commit()
+    return [server_id for ids in changed.values() for server_id in ids]
+
+
+def record_heartbeat(
+    db: Session, server_id: int, heartbeat: Heartbeat, now: Optional[datetime] = None
+) -> bool:
+    """
+    Guarda el latido de un agente y marca el servidor como online, en un solo
+    UPDATE que devuelve también el estado anterior. Devuelve True si el
+    servidor estaba en otro estado (y lo añade al historial).
+    """
+    now = now or datetime.now(timezone.utc)
+    started_at = (
+        now - timedelta(seconds=heartbeat.uptime_seconds)
+        if heartbeat.uptime_seconds is not None
+        else None
+    )
+    previous = (
+        select(Server.id, Server.status)
+        .where(Server.id == server_id)
+        .with_for_update()
+        .subquery()
+    )
+    previous_status = db.execute(
+        update(Server)
+        .where(Server.id == previous.c.id)
+        .values(
+            status="online",
+            status_changed_at=case(
+                (Server.status != "online", now), else_=Server.status_changed_at
+            ),
+            status_checked_at=now,
+            last_heartbeat_at=now,
+            heartbeat_interval=heartbeat.interval,
+            agent_version=heartbeat.version,
+            agent_started_at=started_at,
+            agent_load_1=heartbeat.load_1,
+            agent_cpu_percent=heartbeat.cpu_percent,
+            agent_mem_percent=heartbeat.mem_percent,
+        )
+        .returning(previous.c.status)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    came_online = previous_status is not None and previous_status != "online"
+    if came_online:
+        _log_transitions(
+            db,
+            [
+                {
+                    "server_id": server_id,
+                    "from_status": previous_status,
+                    "to_status": "online",
+                    "changed_at": now,
+                    "source": "heartbeat",
+                }
+            ],
+        )
+    db.commit()
+    return came_online
+
+
+def expire_heartbeats(
+    db: Session, expired: List[Tuple[int, datetime]], now: Optional[datetime] = None
+) -> List[int]:
+    """
+    Marca como offline los servidores cuyo latido ha caducado.
+
+    `expired` son pares (server_id, instante del último latido visto). Solo
+    cambian los que siguen online y no han vuelto a latir desde entonces (el
+    latido pudo llegar a otro worker), así que es seguro llamarlo desde
+    varios procesos. Devuelve los IDs que pasaron a offline.
+    """
+    now = now or datetime.now(timezone.utc)
+    changed = []
+    for server_id, seen_at in expired:
+        changed.extend(
+            db.execute(
+                update(Server)
+                .where(
+                    Server.id == server_id,
+                    Server.status == "online",
+                    Server.last_heartbeat_at <= seen_at,
+                )
+                .values(status="offline", status_changed_at=now, status_checked_at=now)
+                .returning(Server.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+    _log_transitions(
+        db,
+        [
+            {
+                "server_id": server_id,
+                "from_status": "online",
+                "to_status": "offline",
+                "changed_at": now,
+                "source": "heartbeat",
+            }
+            for server_id in changed
+        ],
+    )
+    db.commit()
+    return changed
+
+
 def set_server_online(db: Session, server_id: int) -> Optional[Server]:
     """Marca un servidor como online"""
     return update_server_status(db, server_id, "online")
@@ -14,23 +14,16 @@ logger = logging.getLogger(__name__)
 
 def _trigger_user_sync(db: Session):
     """
-    Dispara la sincronización de usuarios con todos los clientes.
+    Pide la sincronización de usuarios con todos los clientes.
     Se ejecuta después de cualquier operación que modifique la tabla users.
+
+    No bloquea: el planificador en segundo plano (utils/sync_scheduler.py)
+    agrupa las peticiones seguidas y lanza una sola sincronización.
     """
-    logger.info("🔄 Triggering user synchronization to all clients...")
-    try:
-        from ..utils.user_sync import sync_users_to_all_clients_sync
-
-        # Ejecutar sincronización en segundo plano
-        result = sync_users_to_all_clients_sync(db)
-        logger.info(f"✅ User sync completed: {result.get('message', 'No message')}")
-        logger.debug(f"   Sync details: {result}")
-    except Exception as e:
-        # No fallar la operación principal si la sincronización falla
-        logger.error(f"❌ Warning: User sync failed: {type(e).__name__}: {str(e)}")
-        import traceback
-
-        logger.error(f"   Traceback: {traceback.format_exc()}")
+    from ..utils.sync_scheduler import user_sync_scheduler
+
+    logger.info("🔄 User synchronization requested")
+    user_sync_scheduler.request()
 
 
 # CREATE
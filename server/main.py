@@ -1,4 +1,7 @@
-from fastapi import Depends, FastAPI, Request
+import os
+import time
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
@@ -11,18 +14,51 @@ from .router.executions import router as executions_router
 from .router.servers import router as servers_router
 from .router.sync import router as sync_router
 from .router.users import router as users_router
+from .router.ws import router as ws_router
+from .utils.agent_client import agent_client
 from .utils.db import get_db
+from .utils.heartbeats import heartbeat_monitor
+from .utils.metric_hub import metric_hub
+from .utils.metric_ingest import metric_ingest
+from .utils.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
+from .utils.prometheus import render as render_prometheus
+from .utils.prometheus import request_stats
+from .utils.sync_scheduler import user_sync_scheduler
 
 app = FastAPI()
 
 
+@app.on_event("startup")
+def start_background_workers():
+    """Arranca el volcado periódico de métricas recibidas de los clientes"""
+    metric_ingest.refresh_cache()  # Caché de últimas métricas (DISTINCT ON)
+    metric_ingest.start()
+    metric_hub.start()  # LISTEN metrics_live para los WebSocket de este worker
+    heartbeat_monitor.start()  # Plazos de latido de los agentes
+    agent_client.start()  # Pool HTTP compartido hacia los agentes
+    user_sync_scheduler.start()  # Sincronización de usuarios agrupada
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    user_sync_scheduler.stop()
+    agent_client.stop()  # Cierra las conexiones keep-alive con los agentes
+    heartbeat_monitor.stop()
+    metric_hub.stop()
+    metric_ingest.stop()
+
+
 # Middleware para logging de requests (para debugging)
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     print(f"[REQUEST] {request.method} {request.url}")
     print(f"[HEADERS] Origin: {request.headers.get('origin')}")
+    started = time.perf_counter()
     response = await call_next(request)
     print(f"[RESPONSE] Status: {response.status_code}")
+    # Plantilla de la ruta (/servers/{server_id}) para no crear una serie por ID
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    request_stats.record(request.method, route, response.status_code, time.perf_counter() - started)
     return response
 
 
@@ -49,6 +85,15 @@ def read_root():
     return {"hello": "server"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(authorization: str | None = Header(default=None)):
+    """Métricas de la flota y de la API en formato Prometheus, desde memoria"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(content=render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 app.include_router(auth_router)
 app.include_router(client_api_router)
 app.include_router(ansible_router)
@@ -57,3 +102,4 @@ app.include_router(servers_router)
 app.include_router(users_router)
 app.include_router(sync_router)
 app.include_router(containers_router)
+app.include_router(ws_router)
@@ -0,0 +1,10 @@
+-- Migration: add disk and network rate columns to the metrics table
+-- disk_io:    JSON with disk throughput/IOPS rates computed by the client agent
+-- network_io: JSON with per-NIC throughput/packet/error rates computed by the client agent
+
+ALTER TABLE metrics
+    ADD COLUMN IF NOT EXISTS disk_io VARCHAR DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS network_io VARCHAR DEFAULT '{}';
+
+COMMENT ON COLUMN metrics.disk_io IS 'Disk rates: {"total": {read_bps, write_bps, read_iops, write_iops}, "disks": {name: [rbps, wbps, riops, wiops]}}';
+COMMENT ON COLUMN metrics.network_io IS 'Network rates: {"total": {rx_bps, tx_bps, rx_pps, tx_pps, err_ps, drop_ps}, "nics": {name: [...]}}';
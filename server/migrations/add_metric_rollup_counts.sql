@@ -0,0 +1,49 @@
+-- Migration: per-column non-null sample counts in metric_rollups
+-- <column>_count is the number of samples in the bucket where <column> was not
+-- NULL. The 5m and 1h tiers weight <column>_avg by it instead of by samples,
+-- which skewed the averages of often-NULL columns (gpu_*, load_1, legacy rows).
+--
+-- Existing buckets are backfilled with samples (or 0 where the average is NULL),
+-- and the 1m tier is marked dirty over its default 7-day retention so the next
+-- rollup_metrics passes recompute exact counts from the raw samples and
+-- propagate them to 5m and 1h. Buckets older than the raw retention keep the
+-- approximation.
+
+ALTER TABLE metric_rollups
+    ADD COLUMN IF NOT EXISTS cpu_percent_count INTEGER,
+    ADD COLUMN IF NOT EXISTS load_1_count INTEGER,
+    ADD COLUMN IF NOT EXISTS mem_percent_count INTEGER,
+    ADD COLUMN IF NOT EXISTS mem_used_count INTEGER,
+    ADD COLUMN IF NOT EXISTS mem_total_count INTEGER,
+    ADD COLUMN IF NOT EXISTS swap_percent_count INTEGER,
+    ADD COLUMN IF NOT EXISTS disk_percent_count INTEGER,
+    ADD COLUMN IF NOT EXISTS disk_used_count INTEGER,
+    ADD COLUMN IF NOT EXISTS disk_total_count INTEGER,
+    ADD COLUMN IF NOT EXISTS disk_read_bps_count INTEGER,
+    ADD COLUMN IF NOT EXISTS disk_write_bps_count INTEGER,
+    ADD COLUMN IF NOT EXISTS net_rx_bps_count INTEGER,
+    ADD COLUMN IF NOT EXISTS net_tx_bps_count INTEGER,
+    ADD COLUMN IF NOT EXISTS gpu_percent_count INTEGER,
+    ADD COLUMN IF NOT EXISTS gpu_mem_percent_count INTEGER;
+
+UPDATE metric_rollups SET
+    cpu_percent_count = CASE WHEN cpu_percent_avg IS NULL THEN 0 ELSE samples END,
+    load_1_count = CASE WHEN load_1_avg IS NULL THEN 0 ELSE samples END,
+    mem_percent_count = CASE WHEN mem_percent_avg IS NULL THEN 0 ELSE samples END,
+    mem_used_count = CASE WHEN mem_used_avg IS NULL THEN 0 ELSE samples END,
+    mem_total_count = CASE WHEN mem_total_avg IS NULL THEN 0 ELSE samples END,
+    swap_percent_count = CASE WHEN swap_percent_avg IS NULL THEN 0 ELSE samples END,
+    disk_percent_count = CASE WHEN disk_percent_avg IS NULL THEN 0 ELSE samples END,
+    disk_used_count = CASE WHEN disk_used_avg IS NULL THEN 0 ELSE samples END,
+    disk_total_count = CASE WHEN disk_total_avg IS NULL THEN 0 ELSE samples END,
+    disk_read_bps_count = CASE WHEN disk_read_bps_avg IS NULL THEN 0 ELSE samples END,
+    disk_write_bps_count = CASE WHEN disk_write_bps_avg IS NULL THEN 0 ELSE samples END,
+    net_rx_bps_count = CASE WHEN net_rx_bps_avg IS NULL THEN 0 ELSE samples END,
+    net_tx_bps_count = CASE WHEN net_tx_bps_avg IS NULL THEN 0 ELSE samples END,
+    gpu_percent_count = CASE WHEN gpu_percent_avg IS NULL THEN 0 ELSE samples END,
+    gpu_mem_percent_count = CASE WHEN gpu_mem_percent_avg IS NULL THEN 0 ELSE samples END
+WHERE cpu_percent_count IS NULL;
+
+UPDATE metric_rollup_state
+SET dirty_since = LEAST(COALESCE(dirty_since, watermark), watermark - INTERVAL '7 days')
+WHERE tier = '1m';
@@ -0,0 +1,12 @@
+-- Migration: agent heartbeat columns on the servers table
+-- Written by POST /client-api/heartbeat; last_heartbeat_at also decides whether
+-- the background status monitor probes the server.
+
+ALTER TABLE servers
+    ADD COLUMN IF NOT EXISTS last_heartbeat_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS heartbeat_interval REAL,
+    ADD COLUMN IF NOT EXISTS agent_version VARCHAR(50),
+    ADD COLUMN IF NOT EXISTS agent_started_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS agent_load_1 REAL,
+    ADD COLUMN IF NOT EXISTS agent_cpu_percent REAL,
+    ADD COLUMN IF NOT EXISTS agent_mem_percent REAL;
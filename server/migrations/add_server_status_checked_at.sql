@@ -0,0 +1,7 @@
+-- Migration: add status monitor timestamps to the servers table
+-- status_checked_at: last time the background status monitor probed the server
+-- status_changed_at: last time servers.status changed (drives the faster recheck interval)
+
+ALTER TABLE servers
+    ADD COLUMN IF NOT EXISTS status_checked_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,23 @@
+-- Migration: server status transition history
+-- One row per change of servers.status, written by the API and the status monitor.
+-- Existing servers get an initial row with their current status so uptime has a
+-- starting point.
+
+CREATE TABLE IF NOT EXISTS server_status_transitions (
+    id BIGSERIAL PRIMARY KEY,
+    server_id INTEGER NOT NULL REFERENCES servers(id) ON DELETE CASCADE,
+    from_status VARCHAR(20),
+    to_status VARCHAR(20) NOT NULL,
+    changed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    source VARCHAR(20) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_server_status_transitions_server_id_changed_at
+    ON server_status_transitions (server_id, changed_at);
+
+INSERT INTO server_status_transitions (server_id, from_status, to_status, changed_at, source)
+SELECT s.id, NULL, s.status, COALESCE(s.status_changed_at, NOW()), 'initial'
+FROM servers s
+WHERE NOT EXISTS (
+    SELECT 1 FROM server_status_transitions t WHERE t.server_id = s.id
+);
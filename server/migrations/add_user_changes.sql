@@ -0,0 +1,36 @@
+-- Migration: revisioned user change log for incremental user sync
+-- The trigger is also (re)installed by `python -m server.utils.start_db`.
+
+CREATE TABLE IF NOT EXISTS user_changes (
+    revision BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    op VARCHAR(10) NOT NULL,
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE servers ADD COLUMN IF NOT EXISTS user_sync_revision BIGINT;
+
+CREATE OR REPLACE FUNCTION users_changelog() RETURNS trigger AS $$
+BEGIN
+    -- Serialize writers of users until commit so revisions become visible in order
+    PERFORM pg_advisory_xact_lock(hashtext('user_changes'));
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO user_changes (user_id, op) VALUES (OLD.id, 'delete');
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.id <> NEW.id THEN
+        INSERT INTO user_changes (user_id, op) VALUES (OLD.id, 'delete');
+    END IF;
+    INSERT INTO user_changes (user_id, op) VALUES (NEW.id, 'upsert');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER users_changelog_insert_delete
+    AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION users_changelog();
+
+CREATE OR REPLACE TRIGGER users_changelog_update
+    AFTER UPDATE ON users
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION users_changelog();
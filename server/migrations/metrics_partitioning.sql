@@ -0,0 +1,75 @@
+-- Migration: range-partition the metrics table by "timestamp"
+--   * one partition per day named metrics_pYYYYMMDD (same naming as
+--     server/utils/metric_partitions.py, which maintains them afterwards)
+--   * primary key id -> (id, "timestamp"): a partitioned table's unique
+--     constraints must include the partition key
+--   * partitions are created from the oldest stored sample up to 7 days
+--     ahead; the hourly maintain_metric_partitions task then drops the
+--     ones past METRIC_RETENTION_DAYS
+--
+-- Run after metrics_timeseries.sql. Fresh installs get the partitioned
+-- layout from server/utils/start_db.py and do not need this script.
+-- If METRIC_PARTITION_INTERVAL=week, leave it at "day" until the daily
+-- partitions created here have expired.
+
+BEGIN;
+
+ALTER TABLE metrics RENAME TO metrics_unpartitioned;
+ALTER SEQUENCE metrics_id_seq RENAME TO metrics_unpartitioned_id_seq;
+ALTER INDEX IF EXISTS ix_metrics_server_id_timestamp RENAME TO ix_metrics_unpartitioned_server_id_timestamp;
+ALTER TABLE metrics_unpartitioned RENAME CONSTRAINT metrics_pkey TO metrics_unpartitioned_pkey;
+
+CREATE TABLE metrics (
+    id BIGSERIAL,
+    server_id INTEGER NOT NULL,
+    "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL,
+    cpu_percent REAL,
+    load_1 REAL,
+    mem_percent REAL,
+    mem_used DOUBLE PRECISION,
+    mem_total DOUBLE PRECISION,
+    swap_percent REAL,
+    disk_percent REAL,
+    disk_used DOUBLE PRECISION,
+    disk_total DOUBLE PRECISION,
+    disk_read_bps REAL,
+    disk_write_bps REAL,
+    net_rx_bps REAL,
+    net_tx_bps REAL,
+    gpu_percent REAL,
+    gpu_mem_percent REAL,
+    gpu_usage VARCHAR DEFAULT 'N/A',
+    disk_io VARCHAR DEFAULT '{}',
+    network_io VARCHAR DEFAULT '{}',
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+
+DO $$
+DECLARE
+    day TIMESTAMPTZ;
+BEGIN
+    day := date_trunc('day', COALESCE((SELECT MIN("timestamp") FROM metrics_unpartitioned), now()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    WHILE day < now() + INTERVAL '7 days' LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF metrics FOR VALUES FROM (%L) TO (%L)',
+            'metrics_p' || to_char(day AT TIME ZONE 'UTC', 'YYYYMMDD'),
+            day,
+            day + INTERVAL '1 day'
+        );
+        day := day + INTERVAL '1 day';
+    END LOOP;
+END
+$$;
+
+-- The index on the parent is created on every partition
+CREATE INDEX ix_metrics_server_id_timestamp ON metrics (server_id, "timestamp" DESC);
+
+INSERT INTO metrics SELECT * FROM metrics_unpartitioned WHERE "timestamp" < now() + INTERVAL '7 days';
+
+SELECT setval('metrics_id_seq', COALESCE((SELECT MAX(id) FROM metrics), 1), (SELECT COUNT(*) > 0 FROM metrics));
+
+DROP TABLE metrics_unpartitioned;
+
+COMMIT;
+
+ANALYZE metrics;
@@ -0,0 +1,148 @@
+-- Migration: convert the metrics table into a proper time series
+--   * timestamp VARCHAR        -> TIMESTAMP WITH TIME ZONE
+--   * cpu/memory/disk JSON text -> numeric columns (REAL / DOUBLE PRECISION)
+--   * id INTEGER               -> BIGINT (a fleet at 1 sample/s exhausts int4 within a year)
+--   * index on server_id       -> composite (server_id, timestamp DESC)
+--
+-- The table is rebuilt with a single INSERT ... SELECT instead of several
+-- ALTER/UPDATE passes, so existing rows are rewritten exactly once.
+-- gpu_usage, disk_io and network_io keep their JSON detail as text.
+--
+-- Legacy rows are not trusted: the casts go through pg_temp.safe_* helpers,
+-- so a value that is not JSON ("N/A", a truncated string...), a non-numeric
+-- field or an unparseable timestamp becomes NULL instead of aborting the
+-- migration. Rows whose timestamp cannot be parsed are skipped (the new
+-- column is NOT NULL).
+--
+-- Ordering: this migration reads disk_io and network_io from the old table,
+-- which add_metric_io_rates.sql introduced. Run that one first; if it has not
+-- run, the same columns are added below (ADD COLUMN IF NOT EXISTS) so this
+-- file also works on its own. Run metrics_partitioning.sql afterwards.
+
+BEGIN;
+
+-- JSON object or NULL. The regex keeps the common cases ("N/A", '') out of
+-- the exception block, which costs a subtransaction per call.
+CREATE FUNCTION pg_temp.safe_jsonb(value text) RETURNS jsonb AS $$
+DECLARE
+    parsed jsonb;
+BEGIN
+    IF value IS NULL OR value !~ '^\s*\{' THEN
+        RETURN NULL;
+    END IF;
+    BEGIN
+        parsed := value::jsonb;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    RETURN CASE WHEN jsonb_typeof(parsed) = 'object' THEN parsed END;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE FUNCTION pg_temp.safe_float(value text) RETURNS double precision AS $$
+BEGIN
+    IF value IS NULL OR value !~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$' THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::double precision;
+EXCEPTION WHEN others THEN  -- out of range (1e400)
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE FUNCTION pg_temp.safe_timestamptz(value text) RETURNS timestamptz AS $$
+BEGIN
+    IF value IS NULL OR value !~ '^\s*\d{4}-\d{2}-\d{2}' THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::timestamptz;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Same columns as add_metric_io_rates.sql, for databases that skipped it
+ALTER TABLE metrics
+    ADD COLUMN IF NOT EXISTS disk_io VARCHAR DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS network_io VARCHAR DEFAULT '{}';
+
+ALTER TABLE metrics RENAME TO metrics_legacy;
+ALTER SEQUENCE IF EXISTS metrics_id_seq RENAME TO metrics_legacy_id_seq;
+DROP INDEX IF EXISTS ix_metrics_id;
+DROP INDEX IF EXISTS ix_metrics_server_id;
+
+CREATE TABLE metrics (
+    id BIGSERIAL PRIMARY KEY,
+    server_id INTEGER NOT NULL,
+    "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL,
+    cpu_percent REAL,
+    load_1 REAL,
+    mem_percent REAL,
+    mem_used DOUBLE PRECISION,
+    mem_total DOUBLE PRECISION,
+    swap_percent REAL,
+    disk_percent REAL,
+    disk_used DOUBLE PRECISION,
+    disk_total DOUBLE PRECISION,
+    disk_read_bps REAL,
+    disk_write_bps REAL,
+    net_rx_bps REAL,
+    net_tx_bps REAL,
+    gpu_percent REAL,
+    gpu_mem_percent REAL,
+    gpu_usage VARCHAR DEFAULT 'N/A',
+    disk_io VARCHAR DEFAULT '{}',
+    network_io VARCHAR DEFAULT '{}'
+);
+
+INSERT INTO metrics (
+    id, server_id, "timestamp",
+    cpu_percent, mem_percent, mem_used, mem_total,
+    disk_percent, disk_used, disk_total,
+    disk_read_bps, disk_write_bps, net_rx_bps, net_tx_bps,
+    gpu_usage, disk_io, network_io
+)
+SELECT
+    id,
+    server_id,
+    ts,
+    pg_temp.safe_float(cpu ->> 'usage_percent'),
+    pg_temp.safe_float(memory ->> 'percent'),
+    pg_temp.safe_float(memory ->> 'used'),
+    pg_temp.safe_float(memory ->> 'total'),
+    pg_temp.safe_float(disk ->> 'percent'),
+    pg_temp.safe_float(disk ->> 'used'),
+    pg_temp.safe_float(disk ->> 'total'),
+    pg_temp.safe_float(dio #>> '{total,read_bps}'),
+    pg_temp.safe_float(dio #>> '{total,write_bps}'),
+    pg_temp.safe_float(nio #>> '{total,rx_bps}'),
+    pg_temp.safe_float(nio #>> '{total,tx_bps}'),
+    COALESCE(gpu_usage, 'N/A'),
+    COALESCE(disk_io, '{}'),
+    COALESCE(network_io, '{}')
+FROM (
+    SELECT
+        id,
+        server_id,
+        pg_temp.safe_timestamptz("timestamp") AS ts,
+        pg_temp.safe_jsonb(cpu_usage) AS cpu,
+        pg_temp.safe_jsonb(memory_usage) AS memory,
+        pg_temp.safe_jsonb(disk_usage) AS disk,
+        pg_temp.safe_jsonb(disk_io) AS dio,
+        pg_temp.safe_jsonb(network_io) AS nio,
+        gpu_usage,
+        disk_io,
+        network_io
+    FROM metrics_legacy
+) AS legacy
+WHERE ts IS NOT NULL;
+
+SELECT setval('metrics_id_seq', COALESCE((SELECT MAX(id) FROM metrics), 1), (SELECT COUNT(*) > 0 FROM metrics));
+
+DROP TABLE metrics_legacy;
+
+CREATE INDEX ix_metrics_server_id_timestamp ON metrics (server_id, "timestamp" DESC);
+
+COMMIT;
+
+ANALYZE metrics;
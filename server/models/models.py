@@ -1,9 +1,24 @@
-from datetime import datetime
+import json
+import math
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel
-from sqlalchemy import Boolean, CheckConstraint, DateTime, ForeignKey, Integer, String
+from pydantic import BaseModel, Field, computed_field, field_validator
+from sqlalchemy import (
+    REAL,
+    BigInteger,
+    Boolean,
+    CheckConstraint,
+    Column,
+    DateTime,
+    Double,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+)
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -43,6 +58,25 @@ class User(Base):
     )
 
 
+class UserChange(Base):
+    """
+    Registro de cambios de la tabla users para la sincronización incremental.
+
+    Lo escribe un trigger de PostgreSQL (utils/user_revisions.py) en cada
+    INSERT/UPDATE/DELETE de users; `revision` es el contador monótono que los
+    clientes usan para pedir solo lo cambiado desde la última que aplicaron.
+    """
+
+    __tablename__ = "user_changes"
+
+    revision: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer)
+    op: Mapped[str] = mapped_column(String(10))  # upsert, delete
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -90,6 +124,9 @@ class ServerResponse(BaseModel):
     has_ssh_password: bool = (
         False  # Indica si tiene contraseña guardada (usada para become/sudo)
     )
+    status_checked_at: datetime | None = None  # Última comprobación del monitor de estado
+    last_heartbeat_at: datetime | None = None  # Último latido del agente
+    agent_version: str | None = None
 
     class Config:
         from_attributes = True
@@ -110,42 +147,422 @@ class Server(Base):
     ssh_password_encrypted: Mapped[str | None] = mapped_column(
         String, nullable=True
     )  # Contraseña SSH encriptada (también usada para become/sudo)
+    status_checked_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )  # Última comprobación de estado (utils/server_monitor.py)
+    status_changed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )  # Último cambio de status
+    # Último latido del agente (POST /client-api/heartbeat, utils/heartbeats.py)
+    last_heartbeat_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    heartbeat_interval: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    agent_version: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    agent_started_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    agent_load_1: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    agent_cpu_percent: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    agent_mem_percent: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    # Última revisión de users confirmada por el cliente (utils/user_sync.py)
+    user_sync_revision: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+
+
+class ServerStatusTransition(Base):
+    """
+    Historial de cambios de servers.status (de from_status a to_status).
+
+    Lo escribe en lote quien cambia el estado (CRUD.servers: monitor, latidos,
+    cambios manuales) en la misma transacción que el UPDATE de servers.
+    """
+
+    __tablename__ = "server_status_transitions"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    server_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("servers.id", ondelete="CASCADE")
+    )
+    from_status: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    to_status: Mapped[str] = mapped_column(String(20))
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    source: Mapped[str] = mapped_column(String(20))  # monitor, heartbeat, manual, probe
+
+
+Index(
+    "ix_server_status_transitions_server_id_changed_at",
+    ServerStatusTransition.server_id,
+    ServerStatusTransition.changed_at,
+)
+
+
+class ServerStatusTransitionResponse(BaseModel):
+    server_id: int
+    from_status: str | None
+    to_status: str
+    changed_at: datetime
+    source: str
+
+    class Config:
+        from_attributes = True
+
+
+class ServerUptime(BaseModel):
+    """Disponibilidad de un servidor en [since, until) según su historial de estados"""
+
+    server_id: int
+    since: datetime
+    until: datetime
+    observed_seconds: float  # Tiempo con estado conocido dentro de la ventana
+    online_seconds: float
+    availability_percent: float | None  # None si no hay historial en la ventana
+    transitions: int
+    outages: int  # Pasos a offline dentro de la ventana
+    longest_outage_seconds: float
+    current_status: str | None
+    flapping: bool = False
+
+
+class Heartbeat(BaseModel):
+    """Latido de un agente cliente (POST /client-api/heartbeat)"""
+
+    server_id: int | None = None  # Si falta, se resuelve por la IP del cliente
+    version: str | None = Field(default=None, max_length=50)
+    uptime_seconds: float | None = Field(default=None, ge=0)
+    interval: float = Field(default=15.0, ge=1, le=3600)  # segundos hasta el próximo latido
+    load_1: float | None = None
+    cpu_percent: float | None = None
+    mem_percent: float | None = None
+
+
+# Columnas numéricas de una muestra: (nombre, tipo). Los porcentajes y tasas
+# caben en REAL; los tamaños en bytes necesitan DOUBLE PRECISION.
+METRIC_NUMERIC_FIELDS = [
+    ("cpu_percent", REAL),
+    ("load_1", REAL),
+    ("mem_percent", REAL),
+    ("mem_used", Double),
+    ("mem_total", Double),
+    ("swap_percent", REAL),
+    ("disk_percent", REAL),
+    ("disk_used", Double),
+    ("disk_total", Double),
+    ("disk_read_bps", REAL),
+    ("disk_write_bps", REAL),
+    ("net_rx_bps", REAL),
+    ("net_tx_bps", REAL),
+    ("gpu_percent", REAL),
+    ("gpu_mem_percent", REAL),
+]
 
 
 class Metric(Base):
-    __tablename__ = "metrics"
+    """
+    Serie temporal de métricas: una fila por muestra y servidor.
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    server_id: Mapped[int] = mapped_column(Integer, index=True)
-    cpu_usage: Mapped[str] = mapped_column(String)
-    memory_usage: Mapped[str] = mapped_column(String)
-    disk_usage: Mapped[str] = mapped_column(String)
-    timestamp: Mapped[str] = mapped_column(String)
-    gpu_usage: Mapped[str] = mapped_column(String, default="N/A")
+    Las consultas siempre filtran por servidor y rango de tiempo, así que el
+    único índice secundario es (server_id, timestamp DESC): "últimas N" y
+    "entre A y B" son un recorrido de rango de ese índice, sin ordenar.
+
+    La tabla está particionada por rango de timestamp (ver
+    utils/metric_partitions.py); la clave primaria debe incluir la columna
+    de partición.
+    """
+
+    __tablename__ = "metrics"
+    __table_args__ = {"postgresql_partition_by": 'RANGE ("timestamp")'}
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    server_id: Mapped[int] = mapped_column(Integer)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    cpu_percent: Mapped[float | None] = mapped_column(REAL)
+    load_1: Mapped[float | None] = mapped_column(REAL)
+    mem_percent: Mapped[float | None] = mapped_column(REAL)
+    mem_used: Mapped[float | None] = mapped_column(Double)  # bytes
+    mem_total: Mapped[float | None] = mapped_column(Double)  # bytes
+    swap_percent: Mapped[float | None] = mapped_column(REAL)
+    disk_percent: Mapped[float | None] = mapped_column(REAL)
+    disk_used: Mapped[float | None] = mapped_column(Double)  # bytes
+    disk_total: Mapped[float | None] = mapped_column(Double)  # bytes
+    disk_read_bps: Mapped[float | None] = mapped_column(REAL)
+    disk_write_bps: Mapped[float | None] = mapped_column(REAL)
+    net_rx_bps: Mapped[float | None] = mapped_column(REAL)
+    net_tx_bps: Mapped[float | None] = mapped_column(REAL)
+    gpu_percent: Mapped[float | None] = mapped_column(REAL)
+    gpu_mem_percent: Mapped[float | None] = mapped_column(REAL)
+    gpu_usage: Mapped[str] = mapped_column(String, default="N/A")  # Detalle por GPU
+    disk_io: Mapped[str] = mapped_column(String, default="{}")  # Tasas por disco
+    network_io: Mapped[str] = mapped_column(String, default="{}")  # Tasas por NIC
+
+
+Index("ix_metrics_server_id_timestamp", Metric.server_id, Metric.timestamp.desc())
+
+
+# Primer instante que datetime ya no representa (año 10000)
+_MAX_EPOCH = 253402300800.0
+
+# Rango de REAL (float4): PostgreSQL rechaza con error los valores que no caben
+_REAL_MAX = 3.4028234663852886e38
+_REAL_MIN_NORMAL = 1.1754943508222875e-38
+
+
+def _column_value(value: float | None, column_type) -> float | None:
+    """
+    Valor que cabe en su columna: None si no es finito o no cabe en REAL,
+    0 si es tan pequeño que REAL no lo representa. Un valor así en una sola
+    muestra haría fallar el INSERT de todo el lote.
+    """
+    if value is None or not math.isfinite(value):
+        return None
+    if column_type is REAL:
+        if abs(value) > _REAL_MAX:
+            return None
+        if abs(value) < _REAL_MIN_NORMAL:
+            return 0.0
+    return value
+
+
+def _numeric_row(values: dict) -> dict:
+    """Columnas numéricas de una fila de metrics, acotadas a su tipo."""
+    return {name: _column_value(values.get(name), column_type) for name, column_type in METRIC_NUMERIC_FIELDS}
+
+
+def _json_field(value: str, *keys: str) -> float | None:
+    try:
+        data = json.loads(value)
+        for key in keys:
+            data = data[key]
+        return float(data) if data is not None else None
+    except (ValueError, TypeError, KeyError, OverflowError):
+        return None
 
 
 class MetricCreate(BaseModel):
+    """Formato antiguo de los clientes: columnas de texto JSON"""
+
     server_id: int
     cpu_usage: str
     memory_usage: str
     disk_usage: str
-    timestamp: str
+    timestamp: datetime  # ISO 8601; sin zona se asume UTC
+    gpu_usage: str = "N/A"
+    disk_io: str = "{}"
+    network_io: str = "{}"
+
+    @field_validator("timestamp")
+    @classmethod
+    def _utc_timestamp(cls, value: datetime) -> datetime:
+        # Un timestamp inválido falla aquí, dentro de la validación del lote (422)
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+    def to_metric_row(self, server_id: int) -> dict:
+        """Fila numérica para la tabla metrics."""
+        row = _numeric_row({
+            "cpu_percent": _json_field(self.cpu_usage, "usage_percent"),
+            "mem_percent": _json_field(self.memory_usage, "percent"),
+            "mem_used": _json_field(self.memory_usage, "used"),
+            "mem_total": _json_field(self.memory_usage, "total"),
+            "disk_percent": _json_field(self.disk_usage, "percent"),
+            "disk_used": _json_field(self.disk_usage, "used"),
+            "disk_total": _json_field(self.disk_usage, "total"),
+            "disk_read_bps": _json_field(self.disk_io, "total", "read_bps"),
+            "disk_write_bps": _json_field(self.disk_io, "total", "write_bps"),
+            "net_rx_bps": _json_field(self.network_io, "total", "rx_bps"),
+            "net_tx_bps": _json_field(self.network_io, "total", "tx_bps"),
+        })
+        row.update({
+            "server_id": server_id,
+            "timestamp": self.timestamp,
+            "gpu_usage": self.gpu_usage or "N/A",
+            "disk_io": self.disk_io or "{}",
+            "network_io": self.network_io or "{}",
+        })
+        return row
+
+
+class MetricSample(BaseModel):
+    """Muestra tipada enviada por los clientes (ver utils/metric_codec.py)"""
+
+    ts: float  # epoch UTC en segundos
+    cpu_percent: float | None = None
+    load_1: float | None = None
+    mem_percent: float | None = None
+    mem_used: float | None = None  # bytes
+    mem_total: float | None = None  # bytes
+    swap_percent: float | None = None
+    disk_percent: float | None = None
+    disk_used: float | None = None  # bytes
+    disk_total: float | None = None  # bytes
+    disk_read_bps: float | None = None
+    disk_write_bps: float | None = None
+    net_rx_bps: float | None = None
+    net_tx_bps: float | None = None
+    gpu_percent: float | None = None
+    gpu_mem_percent: float | None = None
     gpu_usage: str = "N/A"
+    disk_io: str = "{}"  # Tasas por disco (JSON compacto)
+    network_io: str = "{}"  # Tasas por NIC (JSON compacto)
+
+    @field_validator("ts")
+    @classmethod
+    def _valid_ts(cls, value: float) -> float:
+        # Fuera de este rango datetime.fromtimestamp falla en to_metric_row (500 en vez de 422)
+        if not (math.isfinite(value) and 0 <= value < _MAX_EPOCH):
+            raise ValueError(f"ts must be a Unix timestamp between 0 and {_MAX_EPOCH:.0f}")
+        return value
+
+    def to_metric_row(self, server_id: int) -> dict:
+        """Fila para la tabla metrics."""
+        row = _numeric_row({name: getattr(self, name) for name, _ in METRIC_NUMERIC_FIELDS})
+        row.update(
+            server_id=server_id,
+            timestamp=datetime.fromtimestamp(self.ts, tz=timezone.utc),
+            gpu_usage=self.gpu_usage or "N/A",
+            disk_io=self.disk_io or "{}",
+            network_io=self.network_io or "{}",
+        )
+        return row
+
+
+class MetricBatch(BaseModel):
+    """Lote de métricas enviado por un cliente (POST /client-api/metrics/batch)"""
+
+    server_id: int | None = None  # Si falta, se resuelve por la IP del cliente
+    metrics: list[MetricCreate] = []  # Formato antiguo (columnas de texto)
+    samples: list[MetricSample] = []  # Muestras tipadas
 
 
 class MetricResponse(BaseModel):
-    id: int
+    id: int | None = None  # None si viene de la caché y aún no se ha leído de la BD
     server_id: int
-    cpu_usage: str
-    memory_usage: str
-    disk_usage: str
-    timestamp: str
-    gpu_usage: str
+    timestamp: datetime
+    cpu_percent: float | None = None
+    load_1: float | None = None
+    mem_percent: float | None = None
+    mem_used: float | None = None
+    mem_total: float | None = None
+    swap_percent: float | None = None
+    disk_percent: float | None = None
+    disk_used: float | None = None
+    disk_total: float | None = None
+    disk_read_bps: float | None = None
+    disk_write_bps: float | None = None
+    net_rx_bps: float | None = None
+    net_tx_bps: float | None = None
+    gpu_percent: float | None = None
+    gpu_mem_percent: float | None = None
+    gpu_usage: str = "N/A"
+    disk_io: str | None = "{}"
+    network_io: str | None = "{}"
+
+    # Campos de texto JSON del formato anterior, derivados de las columnas numéricas
+    @computed_field
+    @property
+    def cpu_usage(self) -> str:
+        return json.dumps({"usage_percent": self.cpu_percent, "load_1": self.load_1})
+
+    @computed_field
+    @property
+    def memory_usage(self) -> str:
+        return json.dumps(
+            {"total": self.mem_total, "used": self.mem_used, "percent": self.mem_percent}
+        )
+
+    @computed_field
+    @property
+    def disk_usage(self) -> str:
+        return json.dumps(
+            {"total": self.disk_total, "used": self.disk_used, "percent": self.disk_percent}
+        )
 
     class Config:
         from_attributes = True
 
 
+# count = muestras con la columna no nula: peso de avg al combinar cubos
+ROLLUP_AGGREGATES = ["min", "avg", "max", "last", "count"]
+
+
+class MetricRollup(Base):
+    """
+    Agregados de métricas por cubo de tiempo (niveles 1m, 5m, 1h).
+
+    Una fila por (nivel, servidor, cubo) con min/avg/max/last de cada columna
+    numérica de Metric (p.ej. cpu_percent_avg). La clave primaria sirve de
+    índice para leer un rango de cubos de un servidor.
+    """
+
+    __table__ = Table(
+        "metric_rollups",
+        Base.metadata,
+        Column("tier", String, primary_key=True),
+        Column("server_id", Integer, primary_key=True),
+        Column("bucket", DateTime(timezone=True), primary_key=True),
+        Column("samples", Integer, nullable=False),
+        *[
+            Column(f"{name}_{aggregate}", Integer if aggregate == "count" else type_)
+            for name, type_ in METRIC_NUMERIC_FIELDS
+            for aggregate in ROLLUP_AGGREGATES
+        ],
+    )
+
+
+class MetricRollupState(Base):
+    """Progreso del job de rollups por nivel"""
+
+    __tablename__ = "metric_rollup_state"
+
+    tier: Mapped[str] = mapped_column(String, primary_key=True)
+    # Todo lo anterior a watermark está agregado
+    watermark: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # Llegaron datos anteriores a watermark (reenvío de un spool): recalcular desde aquí
+    dirty_since: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+class MetricHistoryResponse(BaseModel):
+    """Serie para gráficas: cubos de un nivel de rollup (o muestras en bruto)"""
+
+    server_id: int
+    tier: str  # raw, 1m, 5m, 1h
+    bucket_seconds: int | None  # None para raw
+    since: datetime
+    until: datetime
+    # {"bucket": ..., "samples": n, "cpu_percent": {"min", "avg", "max", "last", "count"}, ...}
+    points: list[dict]
+
+
+class MetricQuery(BaseModel):
+    """Consulta agregada de métricas de varios servidores por cubos de tiempo"""
+
+    server_ids: list[int] = []  # Vacío = todos los servidores
+    since: datetime | None = None  # Por defecto, 24 h antes de until
+    until: datetime | None = None  # Por defecto, ahora
+    bucket_seconds: int = 300
+    fields: list[str] = ["cpu_percent"]  # Columnas numéricas de Metric
+    aggregates: list[str] = ["avg"]  # min, avg, max, p50, p95, p99
+    fleet: bool = False  # True = una sola serie agregando todos los servidores
+
+
+class MetricQuerySeries(BaseModel):
+    server_id: int | None  # None en consultas fleet
+    # "<campo>_<agregado>" -> un valor por cubo, alineado con `buckets`
+    columns: dict[str, list[float | None]]
+    samples: list[int]
+
+
+class MetricQueryResponse(BaseModel):
+    """Resultado en columnas: un array de cubos y un array de valores por serie y columna"""
+
+    source: str  # raw, 1m, 5m, 1h
+    bucket_seconds: int
+    since: datetime
+    until: datetime
+    buckets: list[datetime]
+    series: list[MetricQuerySeries]
+
+
 class AnsibleTaskCreate(BaseModel):
     name: str
     playbook: str
@@ -6,18 +6,36 @@ Instead, they use a pre-shared CLIENT_SECRET to verify that the request
 is coming from an authorized client machine (e.g., via PAM scripts).
 """
 
+import json
 import os
+import zlib
+from datetime import datetime, timezone
 from typing import Optional
 
 import bcrypt
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
+from ..CRUD.servers import (
+    get_server_by_id,
+    get_server_by_ip,
+    get_server_by_name,
+    record_heartbeat,
+)
 from ..CRUD.users import _trigger_user_sync, get_user_by_username
+from ..models.models import Heartbeat, MetricBatch, MetricSample
 from ..models.password_models import PasswordChangeFromClient
 from ..utils.db import get_db
+from ..utils.heartbeats import heartbeat_monitor
+from ..utils.metric_codec import CONTENT_TYPE as BINARY_CONTENT_TYPE, UnsupportedFrame, decode_samples
+from ..utils.metric_ingest import BufferFull, metric_ingest
 
 CLIENT_SECRET = os.getenv("CLIENT_SECRET", "")
+# Tamaño máximo de un lote de métricas, tanto recibido como descomprimido
+METRIC_MAX_BODY_BYTES = int(os.getenv("METRIC_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+# Segundos que se pide esperar a un cliente cuando el buffer de ingesta está lleno
+METRIC_RETRY_AFTER = int(os.getenv("METRIC_RETRY_AFTER", "10"))
 
 router = APIRouter(prefix="/client-api", tags=["Client API"])
 
@@ -95,3 +113,164 @@ def change_password_from_client(
         "source_client": x_client_host,
         "must_change_password": False,
     }
+
+
+def _resolve_client_server_id(
+    db: Session, request: Request, batch_server_id: Optional[int], client_host: Optional[str]
+) -> int:
+    """
+    Determina a qué servidor pertenecen las métricas: el server_id del lote si
+    existe, o el servidor registrado con la IP de origen (o con el hostname
+    enviado en X-Client-Host).
+    """
+    if batch_server_id:
+        server = get_server_by_id(db, batch_server_id, check_status=False)
+    else:
+        server = get_server_by_ip(db, request.client.host) if request.client else None
+        if not server and client_host:
+            server = get_server_by_name(db, client_host)
+
+    if not server:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown server for this client. Set SERVER_ID on the client "
+            "or register the server with the client's IP address.",
+        )
+    return server.id
+
+
+def _gunzip(body: bytes) -> bytes:
+    """Descomprime un cuerpo gzip sin pasar de METRIC_MAX_BODY_BYTES."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, METRIC_MAX_BODY_BYTES + 1)
+    except zlib.error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid gzip body")
+    if len(data) > METRIC_MAX_BODY_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Decompressed metrics batch larger than {METRIC_MAX_BODY_BYTES} bytes",
+        )
+    if not decompressor.eof:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid gzip body")
+    return data
+
+
+async def _metrics_body(request: Request) -> bytes:
+    """
+    Lee el cuerpo del lote en el event loop, para que el handler pueda ser
+    síncrono y hacer la descompresión, el decodificado y las consultas en el
+    threadpool, como el resto de rutas.
+    """
+    body = await request.body()
+    if len(body) > METRIC_MAX_BODY_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Metrics batch larger than {METRIC_MAX_BODY_BYTES} bytes",
+        )
+    return body
+
+
+@router.post("/metrics/batch", status_code=status.HTTP_202_ACCEPTED)
+def ingest_metrics_batch(
+    request: Request,
+    x_client_host: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    _secret: None = Depends(verify_client_secret),
+    body: bytes = Depends(_metrics_body),
+):
+    """
+    Recibe un lote de métricas de un cliente, opcionalmente gzip.
+
+    Formatos aceptados según Content-Type:
+    - application/x-pp-metrics: trama binaria de muestras tipadas (metric_codec)
+    - application/json: MetricBatch con "samples" tipadas y/o "metrics" en el
+      formato antiguo de columnas de texto
+
+    Cualquier otro Content-Type, o una trama binaria de versión desconocida,
+    recibe 415, que el cliente usa para volver a JSON. Un lote de más de
+    METRIC_MAX_BODY_BYTES (comprimido o descomprimido) recibe 413, y uno que
+    no cabe en el buffer de ingesta, 503 con Retry-After.
+
+    Las filas se encolan en el buffer de ingesta, que las escribe en la tabla
+    metrics con INSERT multi-fila en segundo plano.
+    """
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        body = _gunzip(body)
+
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    try:
+        if content_type == BINARY_CONTENT_TYPE:
+            batch_server_id, samples = decode_samples(body)
+            batch = MetricBatch(
+                server_id=batch_server_id,
+                samples=[MetricSample.model_validate(s) for s in samples],
+            )
+        elif content_type == "application/json":
+            batch = MetricBatch.model_validate(json.loads(body))
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported content type '{content_type}'. "
+                f"Use application/json or {BINARY_CONTENT_TYPE}.",
+            )
+    except UnsupportedFrame as e:
+        # Versión de trama desconocida: el cliente vuelve a JSON
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e)
+        )
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid metrics batch: {str(e)}",
+        )
+
+    server_id = _resolve_client_server_id(db, request, batch.server_id, x_client_host)
+    rows = [m.to_metric_row(server_id) for m in batch.metrics]
+    rows.extend(sample.to_metric_row(server_id) for sample in batch.samples)
+    try:
+        accepted = metric_ingest.add(rows)
+    except BufferFull as e:
+        # El cliente conserva el lote en su spool y lo reenvía tras Retry-After
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(METRIC_RETRY_AFTER)},
+        )
+
+    return {
+        "success": True,
+        "server_id": server_id,
+        "received": len(rows),
+        "accepted": accepted,
+    }
+
+
+@router.post("/heartbeat")
+def receive_heartbeat(
+    heartbeat: Heartbeat,
+    request: Request,
+    x_client_host: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    _secret: None = Depends(verify_client_secret),
+):
+    """
+    Recibe el latido de un agente cliente (utils/heartbeat.py del cliente).
+
+    Guarda versión, uptime y carga, deja el servidor online y renueva su plazo
+    en el monitor de latidos: si no llega otro en HEARTBEAT_MISSED intervalos,
+    el servidor pasa a offline (ver utils/heartbeats.py).
+    """
+    server_id = _resolve_client_server_id(db, request, heartbeat.server_id, x_client_host)
+    now = datetime.now(timezone.utc)
+    came_online = record_heartbeat(db, server_id, heartbeat, now)
+    heartbeat_monitor.track(server_id, now, heartbeat.interval)
+    if came_online:
+        print(f"🟢 Server {server_id} is online (heartbeat from agent {heartbeat.version})")
+
+    return {
+        "success": True,
+        "server_id": server_id,
+        "status": "online",
+        "deadline": heartbeat_monitor.deadline(now, heartbeat.interval),
+    }
@@ -1,10 +1,13 @@
 import os
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+from ..CRUD.metrics import get_metric_rows, get_server_metric_series
+from ..CRUD.metrics import get_server_metrics as crud_get_server_metrics
 from ..CRUD.servers import (
     count_servers,
     count_servers_by_status,
@@ -26,10 +29,27 @@ from ..CRUD.servers import (
     update_server_name,
     update_server_status,
 )
-from ..CRUD.users import get_all_users
-from ..models.models import MetricResponse, Server, ServerCreate, ServerResponse
+from ..models.models import (
+    MetricHistoryResponse,
+    MetricQuery,
+    MetricQueryResponse,
+    MetricResponse,
+    Server,
+    ServerCreate,
+    ServerResponse,
+    ServerStatusTransition,
+    ServerStatusTransitionResponse,
+    ServerUptime,
+)
 from ..utils.db import get_db
-from ..utils.user_sync import sync_users_to_client
+from ..utils.downsample import downsample_rows
+from ..utils.metric_cache import latest_metrics
+from ..utils.metric_query import FIELD_NAMES as METRIC_FIELD_NAMES
+from ..utils.metric_query import MAX_BUCKETS, QUERY_AGGREGATES, query_metrics
+from ..utils.metric_rollups import read_history
+from ..utils.status_history import server_uptime
+from ..utils.user_revisions import current_revision
+from ..utils.user_sync import sync_users_to_server
 
 
 def server_to_response(server: Server) -> ServerResponse:
@@ -43,6 +63,9 @@ def server_to_response(server: Server) -> ServerResponse:
         ssh_private_key_path=server.ssh_private_key_path,
         ssh_status=server.ssh_status,
         has_ssh_password=bool(server.ssh_password_encrypted),
+        status_checked_at=server.status_checked_at,
+        last_heartbeat_at=server.last_heartbeat_at,
+        agent_version=server.agent_version,
     )
 
 
@@ -78,6 +101,9 @@ router = APIRouter(prefix="/servers", tags=["servers"])
 # URL del cliente desde variable de entorno
 CLIENT_URL = os.getenv("CLIENT_URL", "http://client:8100")
 
+# Máximo de puntos (timestamp y valor) leídos para reducir con LTTB (max_points)
+MAX_DOWNSAMPLE_ROWS = int(os.getenv("MAX_DOWNSAMPLE_ROWS", "200000"))
+
 
 class RetrySSHDeployRequest(BaseModel):
     """Request model for retrying SSH key deployment"""
@@ -94,30 +120,11 @@ class SaveSSHPasswordRequest(BaseModel):
 
 async def sync_users_to_new_server(server: Server, db: Session):
     """Tarea en background para sincronizar usuarios al servidor recién creado"""
-    # Sincronizar todos los usuarios al cliente
-    users = get_all_users(db)
-    users_data = [
-        {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "password_hash": user.password_hash,
-            "is_admin": user.is_admin,
-            "is_active": user.is_active,
-            "must_change_password": user.must_change_password,
-            "system_uid": user.system_uid,
-            "system_gid": user.system_gid,
-            "ssh_public_key": user.ssh_public_key,
-            "password_max_age_days": user.password_max_age_days,
-            "password_changed_at": user.password_changed_at.isoformat() if user.password_changed_at else None,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-        }
-        for user in users
-    ]
-
-    # Sincronizar usuarios con el cliente
-    client_url = f"http://{server.ip_address}:8100"
-    await sync_users_to_client(client_url, users_data, server.name)
+    # Snapshot completo de todos los usuarios; el cliente queda en la revisión actual
+    result = await sync_users_to_server(db, server, current_revision(db), force_snapshot=True)
+    if result.get("success"):
+        server.user_sync_revision = result["revision"]  # type: ignore
+        db.commit()
 
 
 @router.post("/", response_model=ServerResponse)
@@ -174,6 +181,31 @@ def count_servers_by_status_filter(
     return {"count": count}
 
 
+def _uptime_window(since: Optional[datetime], until: Optional[datetime]) -> tuple:
+    until = _as_utc(until) if until else datetime.now(timezone.utc)
+    since = _as_utc(since) if since else until - timedelta(days=30)
+    if since >= until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="'since' must be before 'until'"
+        )
+    return since, until
+
+
+@router.get("/uptime", response_model=List[ServerUptime])
+def get_servers_uptime(
+    since: Optional[datetime] = Query(None, description="Inicio de la ventana (por defecto, 30 días antes de until)"),
+    until: Optional[datetime] = Query(None, description="Fin de la ventana (por defecto, ahora)"),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Disponibilidad de todos los servidores en la ventana, a partir del
+    historial de cambios de estado (tiempo online / tiempo observado).
+    """
+    since, until = _uptime_window(since, until)
+    return server_uptime(db, since, until)
+
+
 @router.get("/{server_id}", response_model=ServerResponse)
 def read_server(
     server_id: int, user=Depends(get_current_user), db: Session = Depends(get_db)
@@ -534,40 +566,209 @@ def bulk_create_servers(
 @router.get("/{server_id}/metrics", response_model=List[MetricResponse])
 def get_server_metrics(
     server_id: int,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=10000),
+    since: Optional[datetime] = Query(None, description="Solo métricas desde este instante"),
+    until: Optional[datetime] = Query(None, description="Solo métricas anteriores a este instante"),
+    max_points: Optional[int] = Query(
+        None, ge=3, le=10000, description="Reduce la serie del rango a este número de puntos (LTTB)"
+    ),
+    downsample_by: str = Query("cpu_percent", description="Columna numérica que guía la reducción"),
     user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Obtiene las últimas métricas de un servidor específico"""
-    from ..models.models import Metric
+    """
+    Obtiene las últimas métricas de un servidor específico (opcionalmente en un rango).
 
+    Con `max_points` se lee todo el rango (por defecto, las últimas 24 h) y se
+    reduce con LTTB sobre `downsample_by`, conservando los picos; `limit` se ignora.
+    """
+    if not get_server_by_id(db, server_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Server not found"
+        )
+    if max_points is None:
+        return crud_get_server_metrics(db, server_id, limit=limit, since=since, until=until)
+
+    if downsample_by not in METRIC_FIELD_NAMES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid downsample_by, use one of {METRIC_FIELD_NAMES}",
+        )
+    until = _as_utc(until) if until else datetime.now(timezone.utc)
+    since = _as_utc(since) if since else until - timedelta(hours=24)
+    # LTTB solo necesita (timestamp, valor): las filas completas se leen
+    # después, únicamente para los puntos elegidos
+    points = get_server_metric_series(
+        db, server_id, since, until, MAX_DOWNSAMPLE_ROWS, field=downsample_by
+    )
+    selected = downsample_rows(points, downsample_by, max_points)
+    rows = get_metric_rows(db, server_id, [(p.id, p.timestamp) for p in selected])
+    # Más recientes primero, como sin max_points
+    return rows[::-1]
+
+
+@router.get("/{server_id}/metrics/history", response_model=MetricHistoryResponse)
+def get_server_metrics_history(
+    server_id: int,
+    since: Optional[datetime] = Query(None, description="Inicio del rango (por defecto, 24 h antes de until)"),
+    until: Optional[datetime] = Query(None, description="Fin del rango (por defecto, ahora)"),
+    points: int = Query(300, ge=10, le=5000, description="Número aproximado de puntos"),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Serie de métricas para gráficas (min/avg/max/last por cubo).
+
+    Usa el nivel de rollup más grueso (1m, 5m, 1h) que cubre el rango y da al
+    menos `points` puntos; en rangos cortos agrega las muestras en bruto.
+    """
+    if not get_server_by_id(db, server_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Server not found"
+        )
+    until = _as_utc(until) if until else datetime.now(timezone.utc)
+    since = _as_utc(since) if since else until - timedelta(hours=24)
+    if since >= until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="'since' must be before 'until'"
+        )
+
+    tier, bucket_seconds, series = read_history(db, server_id, since, until, points)
+    return MetricHistoryResponse(
+        server_id=server_id,
+        tier=tier,
+        bucket_seconds=bucket_seconds,
+        since=since,
+        until=until,
+        points=series,
+    )
+
+
+@router.get("/{server_id}/uptime", response_model=ServerUptime)
+def get_server_uptime(
+    server_id: int,
+    since: Optional[datetime] = Query(None, description="Inicio de la ventana (por defecto, 30 días antes de until)"),
+    until: Optional[datetime] = Query(None, description="Fin de la ventana (por defecto, ahora)"),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Disponibilidad de un servidor en la ventana (ver GET /servers/uptime)."""
+    server = get_server_by_id(db, server_id)
+    if not server:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Server not found"
+        )
+    since, until = _uptime_window(since, until)
+    rows = server_uptime(db, since, until, server_id)
+    if rows:
+        return rows[0]
+    # Sin historial en la ventana
+    return ServerUptime(
+        server_id=server_id,
+        since=since,
+        until=min(until, datetime.now(timezone.utc)),
+        observed_seconds=0,
+        online_seconds=0,
+        availability_percent=None,
+        transitions=0,
+        outages=0,
+        longest_outage_seconds=0,
+        current_status=server.status,
+    )
+
+
+@router.get("/{server_id}/status-history", response_model=List[ServerStatusTransitionResponse])
+def get_server_status_history(
+    server_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Últimos cambios de estado de un servidor, del más reciente al más antiguo."""
     if not get_server_by_id(db, server_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Server not found"
         )
     return (
-        db.query(Metric)
-        .filter(Metric.server_id == server_id)
-        .order_by(Metric.timestamp.desc())
+        db.query(ServerStatusTransition)
+        .filter(ServerStatusTransition.server_id == server_id)
+        .order_by(ServerStatusTransition.changed_at.desc())
         .limit(limit)
         .all()
     )
 
 
+@router.post("/metrics/query", response_model=MetricQueryResponse)
+def query_servers_metrics(
+    query: MetricQuery,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Agregados por cubo de tiempo de varios servidores en una sola consulta.
+
+    Devuelve columnas alineadas con `buckets` para cada servidor o, con
+    `fleet=true`, una sola serie con todos los servidores agregados
+    (p.ej. máximo de GPU de todo el laboratorio en el último día).
+    """
+    until = _as_utc(query.until) if query.until else datetime.now(timezone.utc)
+    since = _as_utc(query.since) if query.since else until - timedelta(hours=24)
+    if since >= until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="'since' must be before 'until'"
+        )
+    if query.bucket_seconds < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="'bucket_seconds' must be positive"
+        )
+    if (until - since).total_seconds() / query.bucket_seconds > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many buckets (max {MAX_BUCKETS}), use a larger 'bucket_seconds'",
+        )
+    unknown_fields = [f for f in query.fields if f not in METRIC_FIELD_NAMES]
+    unknown_aggregates = [a for a in query.aggregates if a not in QUERY_AGGREGATES]
+    if unknown_fields or unknown_aggregates or not query.fields or not query.aggregates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid fields {unknown_fields} or aggregates {unknown_aggregates}; "
+            f"fields: {METRIC_FIELD_NAMES}, aggregates: {QUERY_AGGREGATES}",
+        )
+
+    fields = list(dict.fromkeys(query.fields))
+    aggregates = list(dict.fromkeys(query.aggregates))
+    source, buckets, series = query_metrics(
+        db, query.server_ids, since, until, query.bucket_seconds, fields, aggregates, query.fleet
+    )
+    return MetricQueryResponse(
+        source=source,
+        bucket_seconds=query.bucket_seconds,
+        since=since,
+        until=until,
+        buckets=buckets,
+        series=series,
+    )
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 @router.get("/metrics/all")
 def get_all_metrics(user=Depends(get_current_user), db: Session = Depends(get_db)):
-    """Obtiene la última métrica de todos los servidores"""
-    from ..models.models import Metric
+    """
+    Obtiene la última métrica de todos los servidores desde la caché en memoria.
 
-    servers = get_all_servers(db)
+    `stale_seconds` es la antigüedad de la muestra y `cached_at` cuándo llegó
+    a la caché. El estado de cada servidor es el guardado en la BD (sin ping).
+    """
+    if not latest_metrics.warm:
+        latest_metrics.refresh(db)
+    servers = get_all_servers(db, check_status=False)
+    now = datetime.now(timezone.utc)
     result = {}
     for server in servers:
-        latest = (
-            db.query(Metric)
-            .filter(Metric.server_id == server.id)
-            .order_by(Metric.timestamp.desc())
-            .first()
-        )
+        latest, cached_at = latest_metrics.get(server.id)
         result[server.id] = {
             "server": {
                 "id": server.id,
@@ -575,6 +776,8 @@ def get_all_metrics(user=Depends(get_current_user), db: Session = Depends(get_db
                 "ip_address": server.ip_address,
                 "status": server.status,
             },
-            "latest_metric": latest,
+            "latest_metric": MetricResponse.model_validate(latest) if latest else None,
+            "cached_at": cached_at,
+            "stale_seconds": round((now - latest["timestamp"]).total_seconds(), 1) if latest else None,
         }
     return result
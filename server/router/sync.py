@@ -1,23 +1,56 @@
 """
 Router para operaciones de sincronización manual
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
+from ..models.models import Server
 from ..utils.db import get_db
-from ..utils.user_sync import sync_users_to_all_clients_sync
+from ..utils.sync_scheduler import user_sync_scheduler
+from ..utils.user_revisions import current_revision
 from .auth import get_current_staff_user
 
 
 router = APIRouter(prefix="/sync", tags=["Synchronization"], dependencies=[Depends(get_current_staff_user)])
 
 
-@router.post("/users/manual")
-async def manual_sync_users(db: Session = Depends(get_db)):
+@router.post("/users/manual", status_code=status.HTTP_202_ACCEPTED)
+async def manual_sync_users():
     """
     Sincronización manual de usuarios con todos los clientes.
     
     Este endpoint permite forzar una sincronización manual en caso de que
-    la sincronización automática falle o para verificar el estado.
+    la sincronización automática falle o para verificar el estado. Envía a
+    cada cliente online la lista completa (snapshot), no solo los cambios.
+    Se encola en el planificador y responde al instante; el resultado se
+    consulta en GET /sync/users/status.
     """
-    result = sync_users_to_all_clients_sync(db)
-    return result
+    user_sync_scheduler.request("manual", force_snapshot=True)
+    return {"success": True, "message": "User sync scheduled", "scheduler": user_sync_scheduler.status()}
+
+
+@router.get("/users/status")
+def user_sync_status(db: Session = Depends(get_db)):
+    """
+    Estado de la sincronización de usuarios.
+
+    - revision: revisión actual de users
+    - clients: revisión confirmada por cada servidor y si va atrasado
+    - scheduler: estado del planificador del worker que atiende la petición
+      (pendiente, en curso, última ejecución)
+    """
+    revision = current_revision(db)
+    servers = db.query(Server).order_by(Server.id).all()
+    return {
+        "revision": revision,
+        "clients": [
+            {
+                "server_id": server.id,
+                "name": server.name,
+                "status": server.status,
+                "user_sync_revision": server.user_sync_revision,
+                "up_to_date": server.user_sync_revision == revision,
+            }
+            for server in servers
+        ],
+        "scheduler": user_sync_scheduler.status(),
+    }
@@ -0,0 +1,107 @@
+import asyncio
+from typing import Optional, Set
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from starlette.concurrency import run_in_threadpool
+
+from ..utils.auth import get_user_from_token
+from ..utils.db import SessionLocal
+from ..utils.metric_cache import latest_metrics
+from ..utils.metric_hub import Subscriber, live_sample, metric_hub
+
+router = APIRouter(prefix="/ws", tags=["ws"])
+
+
+def _authenticate(token: Optional[str]) -> bool:
+    """Los navegadores no pueden poner cabeceras en un WebSocket: el JWT va en ?token="""
+    if not token:
+        return False
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(db, token)
+        return bool(user) and getattr(user, "is_active", 0) != 0
+    finally:
+        db.close()
+
+
+def _parse_ids(value) -> Optional[Set[int]]:
+    """'1,2,3' o [1, 2, 3] -> {1, 2, 3}; vacío o None -> None (todos los servidores)"""
+    if value is None:
+        return None
+    items = value.split(",") if isinstance(value, str) else value
+    ids = {int(item) for item in items if str(item).strip()}
+    return ids or None
+
+
+async def _send_updates(websocket: WebSocket, subscriber: Subscriber) -> None:
+    while True:
+        await subscriber.ready.wait()
+        samples = subscriber.drain()
+        if samples:
+            # Mientras este envío espera a un cliente lento, offer() sigue
+            # acumulando (y recortando) las muestras pendientes por servidor
+            await websocket.send_json({"type": "metrics", "samples": samples})
+
+
+async def _receive_subscriptions(websocket: WebSocket, subscriber: Subscriber) -> None:
+    """Mensajes {"server_ids": [...]} cambian la suscripción sin reconectar."""
+    while True:
+        message = await websocket.receive_json()
+        if isinstance(message, dict) and "server_ids" in message:
+            try:
+                subscriber.server_ids = _parse_ids(message["server_ids"])
+            except (TypeError, ValueError):
+                await websocket.send_json({"type": "error", "detail": "Invalid server_ids"})
+                continue
+            await websocket.send_json(
+                {"type": "snapshot", "samples": [live_sample(row) for row in latest_metrics.rows(subscriber.server_ids)]}
+            )
+
+
+async def _serve(websocket: WebSocket, token: Optional[str], server_ids: Optional[Set[int]]) -> None:
+    if not await run_in_threadpool(_authenticate, token):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    subscriber = metric_hub.subscribe(server_ids)
+    tasks = []
+    try:
+        # Estado inicial desde la caché de últimas métricas; luego, solo cambios
+        await websocket.send_json(
+            {"type": "snapshot", "samples": [live_sample(row) for row in latest_metrics.rows(server_ids)]}
+        )
+        tasks = [
+            asyncio.create_task(_send_updates(websocket, subscriber)),
+            asyncio.create_task(_receive_subscriptions(websocket, subscriber)),
+        ]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        metric_hub.unsubscribe(subscriber)
+
+
+@router.websocket("/metrics")
+async def live_metrics(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    server_ids: Optional[str] = Query(None, description="IDs separados por comas (vacío = todos)"),
+):
+    """Métricas en vivo de varios servidores"""
+    try:
+        ids = _parse_ids(server_ids)
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await _serve(websocket, token, ids)
+
+
+@router.websocket("/metrics/{server_id}")
+async def live_server_metrics(websocket: WebSocket, server_id: int, token: Optional[str] = Query(None)):
+    """Métricas en vivo de un servidor"""
+    await _serve(websocket, token, {server_id})
@@ -0,0 +1,102 @@
+"""
+Pruebas de utils/server_status.py contra sockets locales.
+"""
+
+import asyncio
+import socket
+import time
+
+from server.utils import server_status
+from server.utils.server_status import probe_host, probe_hosts
+
+# TEST-NET-1 (RFC 5737): no se enruta, la conexión no llega a ningún sitio
+NON_ROUTABLE = "192.0.2.1"
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_listening_port_is_online():
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        result = asyncio.run(probe_host("127.0.0.1", ports=[port], agent_port=0, timeout=2))
+    assert result.status == "online"
+    assert result.method == f"tcp:{port}"
+    assert result.latency_ms is not None
+
+
+def test_closed_port_is_offline():
+    started = time.monotonic()
+    result = asyncio.run(probe_host("127.0.0.1", ports=[_closed_port()], agent_port=0, timeout=2))
+    assert result.status == "offline"
+    assert result.method is None
+    # Conexión rechazada: no hace falta esperar al timeout
+    assert time.monotonic() - started < 1
+
+
+def test_agent_health_any_status_is_online():
+    async def run():
+        async def respond(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(respond, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await probe_host("127.0.0.1", ports=[_closed_port()], agent_port=port, timeout=2)
+
+    result = asyncio.run(run())
+    assert result.status == "online"
+    assert result.method == "agent"
+
+
+def test_non_routable_host_respects_timeout():
+    started = time.monotonic()
+    result = asyncio.run(probe_host(NON_ROUTABLE, ports=[22], agent_port=8100, timeout=0.5))
+    assert result.status == "offline"
+    assert time.monotonic() - started < 1.5
+
+
+def test_probe_hosts_bounds_concurrency_and_time(monkeypatch):
+    """Agentes que aceptan la conexión y nunca responden: cada sondeo agota su timeout."""
+    timeout, concurrency, hosts = 0.3, 2, [f"127.0.0.{i}" for i in range(1, 7)]
+    in_flight = 0
+    peak = 0
+    original = server_status.probe_host
+
+    async def counting_probe(*args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(server_status, "probe_host", counting_probe)
+
+    async def run():
+        async def hang(reader, writer):
+            await asyncio.sleep(10)
+
+        server = await asyncio.start_server(hang, "0.0.0.0", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            started = time.monotonic()
+            results = await probe_hosts(hosts, ports=[], agent_port=port, timeout=timeout, concurrency=concurrency)
+            return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(run())
+    assert {result.status for result in results.values()} == {"offline"}
+    assert list(results) == hosts
+    assert peak == concurrency
+    # 6 hosts de 2 en 2: tres tandas de un timeout, no seis
+    rounds = len(hosts) / concurrency
+    assert rounds * timeout <= elapsed < rounds * timeout + 1
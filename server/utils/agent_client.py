@@ -0,0 +1,280 @@
+"""
+Cliente HTTP compartido para hablar con los agentes (client/, puerto 8100).
+
+Todo el tráfico servidor → agente (sincronización de usuarios, informe de
+contenedores) pasa por agent_client en lugar de crear un httpx.AsyncClient
+por llamada:
+
+- Un único httpx.AsyncClient por worker, con conexiones keep-alive por host
+  (AGENT_HTTP_KEEPALIVE s, AGENT_HTTP_KEEPALIVE_CONNECTIONS conexiones), así
+  que las sincronizaciones seguidas reutilizan la conexión TCP
+- Vive en un event loop propio en un hilo: las corrutinas de cualquier otro
+  loop (rutas de FastAPI, asyncio.run del planificador de sincronización)
+  se ejecutan allí y esperan el resultado, de modo que el pool y los límites
+  son realmente compartidos
+- Como mucho AGENT_HTTP_CONCURRENCY peticiones a la vez en total y
+  AGENT_HTTP_PER_HOST por agente
+- Los cuerpos de más de AGENT_HTTP_COMPRESS_MIN bytes se comprimen según
+  AGENT_HTTP_COMPRESSION (gzip por defecto; zstd si está instalado
+  zstandard; none). Si un agente no entiende la codificación (415, o
+  400/422 sin la cabecera X-Content-Decoded con la que el agente confirma
+  que descomprimió el cuerpo), se reintenta con la siguiente más simple; solo
+  se recuerda para ese host si el reintento no falla igual (si falla igual,
+  el problema era el contenido)
+- Timeouts: AGENT_HTTP_CONNECT_TIMEOUT (3 s) para conectar y
+  AGENT_HTTP_TIMEOUT (10 s) para el resto; cada llamada puede dar el suyo
+
+Los errores son los de httpx (ConnectError, TimeoutException...), igual que
+antes, para que quien llama los trate como siempre.
+"""
+
+import asyncio
+import gzip
+import json as jsonlib
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sin él se usa gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CLIENT_PORT = int(os.getenv("CLIENT_PORT", "8100"))
+CONNECT_TIMEOUT = float(os.getenv("AGENT_HTTP_CONNECT_TIMEOUT", "3"))
+TIMEOUT = float(os.getenv("AGENT_HTTP_TIMEOUT", "10"))
+CONCURRENCY = int(os.getenv("AGENT_HTTP_CONCURRENCY", "32"))
+PER_HOST = int(os.getenv("AGENT_HTTP_PER_HOST", "4"))
+KEEPALIVE = float(os.getenv("AGENT_HTTP_KEEPALIVE", "60"))
+KEEPALIVE_CONNECTIONS = int(os.getenv("AGENT_HTTP_KEEPALIVE_CONNECTIONS", "64"))
+COMPRESSION = os.getenv("AGENT_HTTP_COMPRESSION", "gzip").lower()
+COMPRESS_MIN = int(os.getenv("AGENT_HTTP_COMPRESS_MIN", "1024"))
+
+# De más a menos eficiente; un host que rechaza una pasa a la siguiente
+_ENCODINGS = ["zstd", "gzip", "identity"]
+# 415 siempre es rechazo de la codificación; 400/422 solo si el agente no
+# confirma con DECODED_HEADER que descomprimió el cuerpo (agentes antiguos)
+_UNSUPPORTED_ENCODING = 415
+_MAYBE_REJECTED_ENCODING = {400, 422}
+DECODED_HEADER = "X-Content-Decoded"
+
+
+def agent_url(ip_address: str, port: Optional[int] = None) -> str:
+    """URL base del agente de un servidor (ej: http://192.168.1.100:8100)."""
+    return f"http://{ip_address}:{port or CLIENT_PORT}"
+
+
+def _preferred_encoding(compression: str) -> str:
+    if compression == "zstd" and zstandard is not None:
+        return "zstd"
+    if compression in ("zstd", "gzip"):
+        return "gzip"
+    return "identity"
+
+
+def _encoding_rejected(response: httpx.Response) -> bool:
+    """Si la respuesta indica que el agente no entendió la codificación del cuerpo."""
+    if response.status_code == _UNSUPPORTED_ENCODING:
+        return True
+    return response.status_code in _MAYBE_REJECTED_ENCODING and DECODED_HEADER not in response.headers
+
+
+def _encode(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+class AgentClient:
+    """Pool HTTP hacia los agentes con límites de concurrencia y compresión."""
+
+    def __init__(
+        self,
+        concurrency: int = CONCURRENCY,
+        per_host: int = PER_HOST,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        timeout: float = TIMEOUT,
+        compression: str = COMPRESSION,
+        compress_min: int = COMPRESS_MIN,
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.per_host = max(per_host, 1)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.encoding = _preferred_encoding(compression)
+        self.compress_min = compress_min
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._host_encoding: Dict[str, str] = {}
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run() -> None:
+                asyncio.set_event_loop(loop)
+                # El cliente y los semáforos se crean dentro de su loop
+                self._client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.concurrency,
+                        max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE,
+                    ),
+                )
+                self._global = asyncio.Semaphore(self.concurrency)
+                self._hosts = {}
+                ready.set()
+                loop.run_forever()
+                loop.close()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run, name="agent-http", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def stop(self) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if not thread or not thread.is_alive():
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"⚠️  Could not close agent HTTP client cleanly: {type(e).__name__}: {str(e)}")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            self._loop = self._thread = self._client = None
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        # Arranque perezoso para quien lo use fuera de la API (Celery, scripts)
+        if not (self._thread and self._thread.is_alive()):
+            self.start()
+        return self._loop
+
+    async def request(
+        self,
+        method: str,
+        ip_address: str,
+        path: str,
+        *,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        port: Optional[int] = None,
+    ) -> httpx.Response:
+        """
+        Petición a un agente. Se puede esperar desde cualquier event loop; la
+        respuesta llega ya leída entera.
+        """
+        loop = self._ensure_started()
+        coro = self._request(method, ip_address, path, json, headers, timeout, port)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def get(self, ip_address: str, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", ip_address, path, **kwargs)
+
+    async def post(self, ip_address: str, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", ip_address, path, **kwargs)
+
+    async def _request(
+        self,
+        method: str,
+        ip_address: str,
+        path: str,
+        json: Any,
+        extra_headers: Optional[Dict[str, str]],
+        timeout: Optional[float],
+        port: Optional[int],
+    ) -> httpx.Response:
+        url = f"{agent_url(ip_address, port)}{path}"
+        body = None
+        if json is not None:
+            body = jsonlib.dumps(json, separators=(",", ":"), default=str).encode("utf-8")
+        request_timeout = self.timeout if timeout is None else httpx.Timeout(timeout, connect=self.timeout.connect)
+
+        host = self._hosts.get(ip_address)
+        if host is None:
+            host = self._hosts[ip_address] = asyncio.Semaphore(self.per_host)
+
+        async with self._global, host:
+            self.in_flight += 1
+            try:
+                encoding = self._encoding_for(ip_address, body)
+                rejected = None  # estado del intento rechazado por la codificación
+                while True:
+                    headers = dict(extra_headers or {})
+                    content = None
+                    if body is not None:
+                        content = _encode(body, encoding)
+                        headers["Content-Type"] = "application/json"
+                        if encoding != "identity":
+                            headers["Content-Encoding"] = encoding
+                        self.bytes_raw += len(body)
+                        self.bytes_sent += len(content)
+                    self.requests += 1
+                    response = await self._client.request(
+                        method, url, content=content, headers=headers, timeout=request_timeout
+                    )
+                    if encoding != "identity" and _encoding_rejected(response):
+                        # Agente sin descompresión (o sin zstd): probar la siguiente codificación
+                        downgraded = _ENCODINGS[_ENCODINGS.index(encoding) + 1]
+                        logger.info(f"ℹ️  Agent {ip_address} rejected {encoding} body, retrying with {downgraded}")
+                        rejected = rejected or response.status_code
+                        encoding = downgraded
+                        continue
+                    if rejected and response.status_code != rejected:
+                        # El reintento pasó: el agente no admite la codificación anterior
+                        self._host_encoding[ip_address] = encoding
+                    return response
+            except httpx.HTTPError:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+    def _encoding_for(self, ip_address: str, body: Optional[bytes]) -> str:
+        if body is None or len(body) < self.compress_min:
+            return "identity"
+        host_encoding = self._host_encoding.get(ip_address, self.encoding)
+        # La más eficiente que admiten tanto la configuración como el host
+        return max(host_encoding, self.encoding, key=_ENCODINGS.index)
+
+    def stats(self) -> dict:
+        return {
+            "alive": bool(self._thread and self._thread.is_alive()),
+            "encoding": self.encoding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "hosts": len(self._hosts),
+            "bytes_raw": self.bytes_raw,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+agent_client = AgentClient()
@@ -25,5 +25,27 @@ celery_app.conf.update(
     broker_connection_retry_on_startup=True,
 )
 
-# Auto-discover tasks from ansible_tasks module
+# Tareas periódicas (el worker se lanza con -B, beat embebido)
+celery_app.conf.beat_schedule = {
+    "rollup-metrics": {
+        "task": "server.utils.metric_tasks.rollup_metrics",
+        "schedule": float(os.getenv("ROLLUP_INTERVAL", "60")),
+    },
+    "prune-metric-rollups": {
+        "task": "server.utils.metric_tasks.prune_metric_rollups",
+        "schedule": 3600.0,
+    },
+    "maintain-metric-partitions": {
+        "task": "server.utils.metric_tasks.maintain_metric_partitions",
+        "schedule": 3600.0,
+    },
+    "monitor-server-status": {
+        "task": "server.utils.status_tasks.monitor_server_status",
+        "schedule": float(os.getenv("STATUS_MONITOR_TICK", "10")),
+    },
+}
+
+# Auto-discover tasks from ansible_tasks, metric_tasks and status_tasks modules
 celery_app.autodiscover_tasks(['server.utils'], related_name='ansible_tasks', force=True)
+celery_app.autodiscover_tasks(['server.utils'], related_name='metric_tasks', force=True)
+celery_app.autodiscover_tasks(['server.utils'], related_name='status_tasks', force=True)
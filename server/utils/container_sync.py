@@ -4,15 +4,18 @@ Utilidad para consultar el estado de contenedores en clientes remotos.
 Este módulo proporciona funciones para:
 - Obtener el estado actual de contenedores desde un cliente (consultando Docker directamente)
 - Actualizar el estado en la BD central basado en el reporte del cliente
+
+Las consultas a los clientes usan el cliente HTTP compartido
+(utils/agent_client.py).
 """
 
-import os
 from typing import List, Optional
 
 import httpx
 from sqlalchemy.orm import Session
 
 from server.models.models import Container, Server, User
+from server.utils.agent_client import agent_client, agent_url
 
 
 def get_client_url(server: Server) -> str:
@@ -25,9 +28,8 @@ def get_client_url(server: Server) -> str:
     Returns:
         URL completa del cliente (ej: http://192.168.1.100:8100)
     """
-    # Por defecto el cliente escucha en el puerto 8100
-    client_port = os.getenv("CLIENT_PORT", "8100")
-    return f"http://{server.ip_address}:{client_port}"
+    # Por defecto el cliente escucha en el puerto 8100 (CLIENT_PORT)
+    return agent_url(server.ip_address)
 
 
 async def get_containers_status_from_client(server: Server, timeout: int = 10) -> dict:
@@ -48,12 +50,9 @@ async def get_containers_status_from_client(server: Server, timeout: int = 10) -
         Exception: Si hay error en la comunicación
     """
     try:
-        client_url = get_client_url(server)
-
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(f"{client_url}/api/containers/report")
-            response.raise_for_status()
-            result = response.json()
+        response = await agent_client.get(server.ip_address, "/api/containers/report", timeout=timeout)
+        response.raise_for_status()
+        result = response.json()
 
         print(
             f"✅ Retrieved {result.get('containers_count', 0)} containers from {server.name}"
@@ -0,0 +1,164 @@
+"""
+Vida de los servidores a partir del latido de sus agentes.
+
+Cada agente envía un latido a POST /client-api/heartbeat cada `interval`
+segundos (15 por defecto). El latido se guarda en servers (last_heartbeat_at,
+versión, uptime y carga) y deja el servidor online. Si faltan
+HEARTBEAT_MISSED latidos seguidos, el servidor pasa a offline.
+
+Los plazos se llevan en memoria en un heap ordenado por vencimiento: cada
+latido empuja (vencimiento, server_id, instante del latido) y el hilo del
+monitor duerme hasta el primer vencimiento, así que detectar una caída no
+recorre la tabla ni hace ninguna conexión saliente. Las entradas antiguas de
+un servidor que sigue latiendo se descartan al salir del heap.
+
+Con varios workers de gunicorn cada uno solo ve los latidos que recibe. Da
+igual: expire_heartbeats() solo marca offline si last_heartbeat_at no ha
+avanzado desde el latido que fijó el plazo, de modo que el worker que recibió
+el último latido es el único cuyo plazo acaba contando.
+"""
+
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from ..CRUD.servers import expire_heartbeats
+from ..models.models import Server
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MISSED = max(int(os.getenv("HEARTBEAT_MISSED", "3")), 1)
+DEFAULT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "15"))
+_IDLE_WAIT = 60.0  # Espera máxima con el heap vacío
+
+
+class HeartbeatMonitor:
+    """Plazos de latido en un heap y un hilo que marca offline los vencidos."""
+
+    def __init__(self, missed: int = MISSED):
+        self.missed = missed
+        self._heap: List[Tuple[datetime, int, datetime]] = []  # (vence, server_id, latido)
+        self._latest: Dict[int, datetime] = {}  # server_id -> último latido visto
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.expired_total = 0
+
+    def deadline(self, seen_at: datetime, interval: float) -> datetime:
+        return seen_at + timedelta(seconds=interval * self.missed)
+
+    def track(
+        self,
+        server_id: int,
+        seen_at: datetime,
+        interval: float = DEFAULT_INTERVAL,
+        due: Optional[datetime] = None,
+    ) -> None:
+        """Registra un latido; el servidor vence si no hay otro antes de `missed` intervalos."""
+        entry = (due or self.deadline(seen_at, interval), server_id, seen_at)
+        with self._cond:
+            previous = self._latest.get(server_id)
+            if previous is not None and previous > seen_at:
+                return
+            self._latest[server_id] = seen_at
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()  # Nuevo primer vencimiento: despertar al hilo
+
+    def pop_expired(self, now: datetime) -> List[Tuple[int, datetime]]:
+        """Saca del heap los plazos vencidos que siguen vigentes: [(server_id, latido)]."""
+        expired = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, server_id, seen_at = heapq.heappop(self._heap)
+                if self._latest.get(server_id) == seen_at:
+                    del self._latest[server_id]
+                    expired.append((server_id, seen_at))
+        return expired
+
+    def next_wait(self, now: datetime) -> float:
+        with self._cond:
+            if not self._heap:
+                return _IDLE_WAIT
+            return min(max((self._heap[0][0] - now).total_seconds(), 0.0), _IDLE_WAIT)
+
+    def warm(self, db) -> int:
+        """
+        Carga los plazos de los servidores online con latido, para detectar
+        también las caídas ocurridas mientras la API estaba parada.
+        """
+        rows = (
+            db.query(Server.id, Server.last_heartbeat_at, Server.heartbeat_interval)
+            .filter(Server.status == "online", Server.last_heartbeat_at.isnot(None))
+            .all()
+        )
+        for server_id, seen_at, interval in rows:
+            self.track(server_id, seen_at, interval or DEFAULT_INTERVAL)
+        return len(rows)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        db = SessionLocal()
+        try:
+            self.warm(db)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️  Could not load heartbeat deadlines: {type(e).__name__}: {str(e)}")
+        finally:
+            db.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="heartbeat-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait(self.next_wait(datetime.now(timezone.utc)))
+            if self._stop.is_set():
+                break
+            expired = self.pop_expired(datetime.now(timezone.utc))
+            if expired:
+                self.expire(expired)
+
+    def expire(self, expired: List[Tuple[int, datetime]]) -> List[int]:
+        db = SessionLocal()
+        try:
+            changed = expire_heartbeats(db, expired)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️  Could not expire heartbeats: {type(e).__name__}: {str(e)}")
+            # Reintentar en unos segundos
+            retry = datetime.now(timezone.utc) + timedelta(seconds=5)
+            for server_id, seen_at in expired:
+                self.track(server_id, seen_at, due=retry)
+            return []
+        finally:
+            db.close()
+        self.expired_total += len(changed)
+        for server_id in changed:
+            print(f"🔴 Server {server_id} missed {self.missed} heartbeats, marked offline")
+        return changed
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "tracked": len(self._latest),
+                "heap": len(self._heap),
+                "expired": self.expired_total,
+            }
+
+
+heartbeat_monitor = HeartbeatMonitor()
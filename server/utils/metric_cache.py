@@ -0,0 +1,91 @@
+"""
+Caché en memoria de la última métrica de cada servidor.
+
+/servers/metrics/all la consulta en lugar de lanzar una consulta por
+servidor. Se llena al arrancar con un DISTINCT ON sobre metrics y la
+actualiza el buffer de ingesta con cada lote recibido. Como cada worker de
+gunicorn tiene su propia caché y los lotes llegan a uno solo, el hilo de
+ingesta la refresca además cada METRIC_CACHE_REFRESH segundos con las
+muestras recientes de todos los workers (y con el nombre y estado de cada
+servidor, para las etiquetas de /metrics).
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..CRUD.metrics import get_latest_metrics
+from ..models.models import Metric, Server
+
+_COLUMNS = [column.key for column in Metric.__table__.columns]
+
+
+class LatestMetricCache:
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[int, dict] = {}
+        self._updated: Dict[int, datetime] = {}
+        self._servers: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._synced_at: Optional[datetime] = None
+
+    @property
+    def warm(self) -> bool:
+        return self._synced_at is not None
+
+    def update(self, rows: Iterable[dict]) -> None:
+        """Guarda las filas más recientes que las que ya hay en caché."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for row in rows:
+                current = self._entries.get(row["server_id"])
+                if current is None or row["timestamp"] > current["timestamp"]:
+                    self._entries[row["server_id"]] = {column: row.get(column) for column in _COLUMNS}
+                    self._updated[row["server_id"]] = now
+
+    def refresh(self, db: Session) -> int:
+        """Lee de la base de datos la última métrica por servidor (solo las recientes si ya está llena)."""
+        now = datetime.now(timezone.utc)
+        # Margen para relojes de cliente algo atrasados respecto al servidor
+        margin = timedelta(seconds=max(self.refresh_interval * 2, 60))
+        since = self._synced_at - margin if self._synced_at else None
+        metrics = get_latest_metrics(db, since=since)
+        self.update({column: getattr(metric, column) for column in _COLUMNS} for metric in metrics)
+        servers = {
+            server_id: {"name": name, "status": status}
+            for server_id, name, status in db.query(Server.id, Server.name, Server.status)
+        }
+        with self._lock:
+            self._servers = servers
+        self._synced_at = now
+        return len(metrics)
+
+    def refresh_due(self) -> bool:
+        if self._synced_at is None:
+            return True
+        return (datetime.now(timezone.utc) - self._synced_at).total_seconds() >= self.refresh_interval
+
+    def rows(self, server_ids: Optional[Iterable[int]] = None) -> List[dict]:
+        """Últimas filas de los servidores pedidos (todos si server_ids es None)."""
+        with self._lock:
+            if server_ids is None:
+                return list(self._entries.values())
+            return [self._entries[sid] for sid in server_ids if sid in self._entries]
+
+    def servers(self) -> Dict[int, dict]:
+        """{server_id: {"name", "status"}} según el último refresco."""
+        with self._lock:
+            return dict(self._servers)
+
+    def get(self, server_id: int) -> Tuple[Optional[dict], Optional[datetime]]:
+        """(última fila del servidor, cuándo se actualizó en caché)"""
+        with self._lock:
+            return self._entries.get(server_id), self._updated.get(server_id)
+
+
+latest_metrics = LatestMetricCache(
+    refresh_interval=float(os.getenv("METRIC_CACHE_REFRESH", "5")),
+)
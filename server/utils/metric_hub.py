@@ -0,0 +1,182 @@
+"""
+Hub de métricas en vivo para los dashboards (WebSocket /ws/metrics).
+
+Cada muestra ingerida se publica con NOTIFY en el canal metrics_live de
+PostgreSQL al volcarse a la tabla metrics. Cada worker de gunicorn escucha el
+canal (LISTEN) en un hilo y reparte las muestras a sus suscriptores locales,
+así que da igual qué worker recibió el lote del cliente.
+
+Cada suscriptor (una pestaña del dashboard) elige un conjunto de servidores.
+Sus muestras pendientes se guardan por servidor; si no da abasto y acumula
+más de LIVE_MAX_BACKLOG muestras de un servidor, se quedan solo las más
+recientes de ese servidor en lugar de crecer una cola sin límite.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models.models import METRIC_NUMERIC_FIELDS
+from .db import engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "metrics_live"
+MAX_BACKLOG = int(os.getenv("LIVE_MAX_BACKLOG", "10"))
+_MAX_PAYLOAD = 7500  # NOTIFY admite hasta 8000 bytes por mensaje
+_FIELDS = [name for name, _ in METRIC_NUMERIC_FIELDS]
+
+
+def live_sample(row: dict) -> dict:
+    """Muestra reducida que viaja por NOTIFY y WebSocket (sin el detalle JSON)."""
+    sample = {"server_id": row["server_id"], "timestamp": row["timestamp"].isoformat()}
+    for name in _FIELDS:
+        if row.get(name) is not None:
+            sample[name] = row[name]
+    return sample
+
+
+def notify_samples(db: Session, rows: List[dict]) -> int:
+    """Publica las filas en el canal en mensajes de menos de 8000 bytes. Devuelve cuántos."""
+    payloads, chunk, size = [], [], 2
+    for row in rows:
+        encoded = json.dumps(live_sample(row), separators=(",", ":"))
+        if chunk and size + len(encoded) + 1 > _MAX_PAYLOAD:
+            payloads.append("[" + ",".join(chunk) + "]")
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        payloads.append("[" + ",".join(chunk) + "]")
+
+    for payload in payloads:
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+    db.commit()
+    return len(payloads)
+
+
+class Subscriber:
+    """Estado de un WebSocket: servidores suscritos y muestras pendientes de enviar."""
+
+    def __init__(self, server_ids: Optional[Set[int]], loop: asyncio.AbstractEventLoop):
+        self.server_ids = server_ids  # None = todos
+        self.loop = loop
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self._pending: Dict[int, List[dict]] = {}
+
+    def wants(self, server_id: int) -> bool:
+        return self.server_ids is None or server_id in self.server_ids
+
+    def offer(self, samples: List[dict]) -> None:
+        """Encola muestras (se llama en el event loop del suscriptor)."""
+        for sample in samples:
+            if not self.wants(sample["server_id"]):
+                continue
+            queue = self._pending.setdefault(sample["server_id"], [])
+            queue.append(sample)
+            if len(queue) > MAX_BACKLOG:
+                # Suscriptor lento: solo interesan las más recientes
+                self.coalesced += len(queue) - MAX_BACKLOG
+                del queue[: len(queue) - MAX_BACKLOG]
+        if self._pending:
+            self.ready.set()
+
+    def drain(self) -> List[dict]:
+        pending, self._pending = self._pending, {}
+        self.ready.clear()
+        return [sample for queue in pending.values() for sample in queue]
+
+
+class MetricHub:
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.notifications = 0
+
+    def subscribe(self, server_ids: Optional[Iterable[int]]) -> Subscriber:
+        subscriber = Subscriber(
+            set(server_ids) if server_ids is not None else None, asyncio.get_running_loop()
+        )
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, samples: List[dict]) -> None:
+        """Reparte muestras a los suscriptores locales (desde cualquier hilo)."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if any(subscriber.wants(sample["server_id"]) for sample in samples):
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.offer, samples)
+                except RuntimeError:
+                    self.unsubscribe(subscriber)  # Event loop cerrado
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="metric-hub", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _listen(self) -> None:
+        """LISTEN en el canal; reconecta con espera creciente si se pierde la conexión."""
+        delay = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                delay = 1.0
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.notifications += 1
+                        self.publish(json.loads(notify.payload))
+            except Exception as e:
+                logger.warning(f"⚠️  Live metrics listener error: {type(e).__name__}: {str(e)}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()  # No devolver al pool una conexión en LISTEN
+                    except Exception:
+                        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "notifications": self.notifications,
+            "coalesced": sum(subscriber.coalesced for subscriber in subscribers),
+        }
+
+
+metric_hub = MetricHub()
@@ -0,0 +1,260 @@
+"""
+Buffer de ingesta de métricas enviadas por los clientes.
+
+Los lotes que llegan a /client-api/metrics/batch no se escriben uno a uno:
+se acumulan en memoria y un hilo los vuelca a la tabla metrics cada
+METRIC_FLUSH_INTERVAL segundos (o antes si se superan METRIC_FLUSH_MAX_ROWS
+filas) con un único INSERT multi-fila. Así, cientos de clientes enviando cada
+1-5 s cuestan unos pocos round trips por segundo a PostgreSQL.
+
+Las filas fuera de la ventana de particiones (más antiguas que la retención o
+con el reloj del cliente adelantado) se descartan al encolarlas: no tienen
+partición donde insertarse y harían fallar el lote completo.
+
+Si el INSERT falla por los datos (no por la conexión), el lote se inserta por
+mitades hasta aislar las filas que fallan solas, que se descartan
+(rows_failed); el resto se escribe. Los fallos de conexión devuelven el lote
+al buffer, como mucho METRIC_FLUSH_MAX_RETRIES volcados seguidos.
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from ..CRUD.metrics import insert_metrics_bulk
+from .db import SessionLocal
+from .metric_cache import latest_metrics
+from .metric_hub import notify_samples
+from .metric_partitions import accepts_timestamp, ensure_partitions
+from .metric_rollups import mark_dirty
+
+logger = logging.getLogger(__name__)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Fallo de la conexión o del servidor de BD, no de las filas del lote."""
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+class BufferFull(Exception):
+    """No cabe el lote: el cliente debe reintentarlo más tarde (503)."""
+
+
+class MetricIngestBuffer:
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        max_rows: int = 5000,
+        max_buffered: int = 200000,
+        max_retries: int = 300,
+    ):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_buffered = max_buffered
+        self.max_retries = max_retries
+        self._retries = 0
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_rejected = 0
+        self.rows_failed = 0
+        self.batches_refused = 0
+        self.flushes = 0
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="metric-ingest", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 10)
+            self._thread = None
+        self.flush()
+
+    def add(self, rows: List[dict]) -> int:
+        """
+        Encola filas para el próximo volcado. Devuelve cuántas se aceptaron
+        (las de fuera de la ventana de particiones se descartan).
+
+        El lote entra entero o no entra: si no cabe en el buffer (la BD no
+        da abasto o está caída) lanza BufferFull, para que el cliente lo
+        conserve en su spool en lugar de darlo por entregado.
+        """
+        valid = [row for row in rows if accepts_timestamp(row["timestamp"])]
+        rejected = len(rows) - len(valid)
+        with self._lock:
+            self.rows_rejected += rejected
+            if len(valid) > self.max_buffered - len(self._rows):
+                self.batches_refused += 1
+                raise BufferFull(f"Metric ingest buffer full ({len(self._rows)} rows pending)")
+            self._rows.extend(valid)
+            pending = len(self._rows)
+        latest_metrics.update(valid)
+        if pending >= self.max_rows:
+            self._wakeup.set()
+        return len(valid)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if latest_metrics.refresh_due():
+                self.refresh_cache()
+
+    def refresh_cache(self) -> None:
+        """Recoge en la caché de últimas métricas lo ingerido por otros workers."""
+        db = SessionLocal()
+        try:
+            latest_metrics.refresh(db)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️  Could not refresh latest metrics cache: {type(e).__name__}: {str(e)}")
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            try:
+                written = self._insert(db, rows)
+            except Exception as e:
+                db.rollback()
+                if _is_transient(e):
+                    self._retry(rows, e)
+                    return 0
+                logger.error(
+                    f"❌ Failed to flush {len(rows)} metrics, isolating bad rows: {type(e).__name__}: {str(e)}"
+                )
+                rows = self._insert_split(db, rows)
+                written = len(rows)
+                if not rows:
+                    return 0
+            self._retries = 0
+            self.rows_written += written
+            self.flushes += 1
+
+            try:
+                # Muestras anteriores a lo ya agregado (reenvío de un spool): recalcular rollups
+                mark_dirty(db, "1m", min(row["timestamp"] for row in rows))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"⚠️  Could not mark metric rollups dirty: {type(e).__name__}: {str(e)}")
+
+            try:
+                # Dashboards en vivo de todos los workers (LISTEN metrics_live)
+                notify_samples(db, rows)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"⚠️  Could not publish live metrics: {type(e).__name__}: {str(e)}")
+            return written
+        finally:
+            db.close()
+
+    def _insert_split(self, db, rows: List[dict]) -> List[dict]:
+        """
+        Inserta `rows` por mitades y descarta solo las filas que fallan solas
+        (p.ej. un valor que la columna no admite). Devuelve las escritas; si la
+        conexión falla a medias, lo que falta vuelve al buffer.
+        """
+        written: List[dict] = []
+        pending = [rows]
+        while pending:
+            chunk = pending.pop()
+            try:
+                self._insert(db, chunk)
+            except Exception as e:
+                db.rollback()
+                if _is_transient(e):
+                    self._retry([row for part in [chunk] + pending[::-1] for row in part], e)
+                    break
+                if len(chunk) == 1:
+                    self.rows_failed += 1
+                    row = chunk[0]
+                    logger.warning(
+                        f"⚠️  Dropping metric row of server {row.get('server_id')} at {row.get('timestamp')}: "
+                        f"{type(e).__name__}: {str(e)}"
+                    )
+                    continue
+                middle = len(chunk) // 2
+                pending += [chunk[middle:], chunk[:middle]]
+                continue
+            written.extend(chunk)
+        return written
+
+    def _insert(self, db, rows: List[dict]) -> int:
+        try:
+            return insert_metrics_bulk(db, rows)
+        except Exception as e:
+            if "no partition of relation" not in str(e):
+                raise
+            # El mantenimiento aún no ha creado la partición (p.ej. cambio de día
+            # con el worker parado): crearla y reintentar una vez
+            db.rollback()
+            logger.warning("⚠️  Missing metrics partition, creating upcoming partitions")
+            ensure_partitions(db)
+            return insert_metrics_bulk(db, rows)
+
+    def _retry(self, rows: List[dict], error: Exception) -> None:
+        """Devuelve al buffer un lote que falló por la conexión, hasta max_retries veces seguidas."""
+        self._retries += 1
+        if self._retries > self.max_retries:
+            logger.error(
+                f"❌ Dropping {len(rows)} metrics after {self.max_retries} failed flushes: "
+                f"{type(error).__name__}: {str(error)}"
+            )
+            self._retries = 0
+            with self._lock:
+                self.rows_dropped += len(rows)
+            return
+        logger.error(f"❌ Failed to flush {len(rows)} metrics: {type(error).__name__}: {str(error)}")
+        self._requeue(rows)
+
+    def _requeue(self, rows: List[dict]) -> None:
+        """Devuelve filas al buffer para el siguiente intento (respetando el límite)."""
+        with self._lock:
+            room = self.max_buffered - len(self._rows)
+            self._rows[:0] = rows[-room:] if room > 0 else []
+            self.rows_dropped += len(rows) - max(min(room, len(rows)), 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._rows)
+        return {
+            "buffered": buffered,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "rows_rejected": self.rows_rejected,
+            "rows_failed": self.rows_failed,
+            "batches_refused": self.batches_refused,
+            "flushes": self.flushes,
+        }
+
+
+metric_ingest = MetricIngestBuffer(
+    flush_interval=float(os.getenv("METRIC_FLUSH_INTERVAL", "1")),
+    max_rows=int(os.getenv("METRIC_FLUSH_MAX_ROWS", "5000")),
+    max_retries=int(os.getenv("METRIC_FLUSH_MAX_RETRIES", "300")),
+)
@@ -0,0 +1,134 @@
+"""
+Particionado por tiempo de la tabla metrics y retención.
+
+metrics está particionada por RANGE ("timestamp") en particiones diarias o
+semanales (METRIC_PARTITION_INTERVAL=day|week) llamadas metrics_pYYYYMMDD.
+La tarea Celery maintain_metric_partitions (cada hora):
+
+- crea por adelantado las particiones de los próximos METRIC_PARTITIONS_AHEAD_DAYS
+- borra con DROP TABLE las particiones que terminan antes de la retención
+  (METRIC_RETENTION_DAYS): expirar un día de datos es O(1), sin DELETE masivo
+  ni vacuum posterior
+
+start_db crea las particiones iniciales en instalaciones nuevas; las
+existentes se convierten con migrations/metrics_partitioning.sql.
+"""
+
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+PARTITION_INTERVAL = os.getenv("METRIC_PARTITION_INTERVAL", "day")
+RETENTION = timedelta(days=float(os.getenv("METRIC_RETENTION_DAYS", "30")))
+AHEAD = timedelta(days=float(os.getenv("METRIC_PARTITIONS_AHEAD_DAYS", "7")))
+
+_PARENT = "metrics"
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def _period_start(value: datetime) -> datetime:
+    """Inicio (UTC) del periodo de partición que contiene `value`."""
+    day = value.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if PARTITION_INTERVAL == "week":
+        day -= timedelta(days=day.weekday())  # semanas de lunes a lunes
+    return day
+
+
+def _period_length() -> timedelta:
+    return timedelta(weeks=1) if PARTITION_INTERVAL == "week" else timedelta(days=1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{_PARENT}_p{start:%Y%m%d}"
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now(timezone.utc)) - RETENTION
+
+
+def accepts_timestamp(value: datetime, now: Optional[datetime] = None) -> bool:
+    """True si existe (o existirá) partición para `value`: dentro de la retención y no muy en el futuro."""
+    now = now or datetime.now(timezone.utc)
+    return retention_cutoff(now) <= value < now + AHEAD
+
+
+def is_partitioned(db: Session) -> bool:
+    return bool(
+        db.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = :parent AND c.relnamespace = 'public'::regnamespace"
+            ),
+            {"parent": _PARENT},
+        ).scalar()
+    )
+
+
+def list_partitions(db: Session) -> List[Tuple[str, datetime, datetime]]:
+    """[(nombre, desde, hasta)] de las particiones existentes."""
+    rows = db.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": _PARENT},
+    )
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound or "")
+        if not match:
+            continue  # partición DEFAULT u otra no creada por este módulo
+        partitions.append(
+            (name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2)))
+        )
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(db: Session, now: Optional[datetime] = None) -> List[str]:
+    """Crea las particiones que faltan entre el corte de retención y now + AHEAD."""
+    now = now or datetime.now(timezone.utc)
+    existing = list_partitions(db)
+    created = []
+    start = _period_start(retention_cutoff(now))
+    while start < now + AHEAD:
+        end = start + _period_length()
+        # Si cambió el intervalo, no crear periodos que solapen particiones existentes
+        if not any(p_start < end and start < p_end for _, p_start, p_end in existing):
+            name = partition_name(start)
+            db.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {_PARENT} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+            )
+            created.append(name)
+        start = end
+    db.commit()
+    return created
+
+
+def drop_expired_partitions(db: Session, now: Optional[datetime] = None) -> List[str]:
+    """Borra las particiones cuyo rango termina antes del corte de retención."""
+    cutoff = retention_cutoff(now)
+    dropped = []
+    for name, _, end in list_partitions(db):
+        if end <= cutoff:
+            db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    db.commit()
+    return dropped
+
+
+def maintain_partitions(db: Session, now: Optional[datetime] = None) -> dict:
+    if not is_partitioned(db):
+        return {"partitioned": False, "created": [], "dropped": []}
+    return {
+        "partitioned": True,
+        "created": ensure_partitions(db, now),
+        "dropped": drop_expired_partitions(db, now),
+    }
@@ -0,0 +1,143 @@
+"""
+Consultas agregadas de métricas de varios servidores.
+
+Un único SELECT con date_bin agrupa las muestras de los servidores pedidos
+por (servidor, cubo), o solo por cubo en modo fleet, y PostgreSQL calcula
+los agregados. El resultado se devuelve en columnas: un array común de cubos
+y, por serie, un array de valores por "<campo>_<agregado>", listo para
+pintar sin más procesado en el navegador.
+
+Si no se piden percentiles y el cubo es múltiplo de un nivel de rollup que
+cubre el rango, se lee de metric_rollups en lugar de las muestras en bruto.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models.models import METRIC_NUMERIC_FIELDS
+from .metric_rollups import BUCKET_ORIGIN, ROLLUP_TIERS, RollupTier
+
+FIELD_NAMES = [name for name, _ in METRIC_NUMERIC_FIELDS]
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+QUERY_AGGREGATES = ["min", "avg", "max"] + list(PERCENTILES)
+MAX_BUCKETS = 5000
+
+_ORIGIN = datetime.fromisoformat(BUCKET_ORIGIN)
+
+
+def bucket_start(value: datetime, seconds: int) -> datetime:
+    """Inicio del cubo que contiene `value`, con el mismo origen que date_bin."""
+    offset = (value - _ORIGIN).total_seconds()
+    return _ORIGIN + timedelta(seconds=offset - offset % seconds)
+
+
+def choose_source(
+    aggregates: List[str], bucket_seconds: int, since: datetime, now: Optional[datetime] = None
+) -> Optional[RollupTier]:
+    """Nivel de rollup más grueso utilizable, o None para leer las muestras en bruto."""
+    if any(aggregate in PERCENTILES for aggregate in aggregates):
+        return None  # Los rollups no guardan la distribución
+    now = now or datetime.now(timezone.utc)
+    chosen = None
+    for tier in ROLLUP_TIERS:
+        if bucket_seconds % tier.seconds == 0 and since >= now - tier.retention:
+            chosen = tier
+    return chosen
+
+
+def _expression(field: str, aggregate: str, tier: Optional[RollupTier]) -> str:
+    if tier is None:
+        if aggregate in PERCENTILES:
+            return f"percentile_cont({PERCENTILES[aggregate]}) WITHIN GROUP (ORDER BY {field})"
+        return f"{aggregate}({field})"
+    if aggregate == "avg":
+        # Ponderado por las muestras en que la columna no era nula (ver metric_rollups)
+        return f"sum({field}_avg * {field}_count) / NULLIF(sum({field}_count), 0)"
+    return f"{aggregate}({field}_{aggregate})"
+
+
+def build_query(
+    fields: List[str], aggregates: List[str], bucket_seconds: int, tier: Optional[RollupTier], fleet: bool
+) -> str:
+    """
+    SELECT server_id, bucket, samples, <campo>_<agregado>... para
+    :since <= tiempo < :until y los servidores de :server_ids (vacío = todos).
+    `fields` y `aggregates` deben venir ya validados: se interpolan en el SQL.
+    """
+    interval = f"'{int(bucket_seconds)} seconds'::interval"
+    if tier is None:
+        time_col, table, samples, tier_filter = '"timestamp"', "metrics", "count(*)", ""
+    else:
+        time_col, table, samples, tier_filter = "bucket", "metric_rollups", "sum(samples)", f"tier = '{tier.name}' AND "
+
+    columns = [
+        f"{_expression(field, aggregate, tier)} AS {field}_{aggregate}"
+        for field in fields
+        for aggregate in aggregates
+    ]
+    return (
+        f"SELECT {'NULL::integer' if fleet else 'server_id'} AS server_id, "
+        f"date_bin({interval}, {time_col}, TIMESTAMPTZ '{BUCKET_ORIGIN}') AS bucket, "
+        f"{samples} AS samples, "
+        + ", ".join(columns)
+        + f" FROM {table} WHERE {tier_filter}{time_col} >= :since AND {time_col} < :until"
+        + " AND (cardinality(CAST(:server_ids AS INTEGER[])) = 0 OR server_id = ANY(CAST(:server_ids AS INTEGER[])))"
+        + " GROUP BY 1, 2 ORDER BY 1, 2"
+    )
+
+
+def query_metrics(
+    db: Session,
+    server_ids: List[int],
+    since: datetime,
+    until: datetime,
+    bucket_seconds: int,
+    fields: List[str],
+    aggregates: List[str],
+    fleet: bool = False,
+) -> Tuple[str, List[datetime], List[dict]]:
+    """
+    Devuelve (origen de los datos, cubos, series). Cada serie es
+    {"server_id", "samples": [...], "columns": {"<campo>_<agregado>": [...]}}
+    con un valor por cubo (None donde no hay muestras).
+    """
+    tier = choose_source(aggregates, bucket_seconds, since)
+    rows = db.execute(
+        text(build_query(fields, aggregates, bucket_seconds, tier, fleet)),
+        {
+            # Un cubo de rollup que empieza antes de `since` también tiene muestras del rango
+            "since": bucket_start(since, tier.seconds) if tier else since,
+            "until": until,
+            "server_ids": list(server_ids),
+        },
+    )
+
+    buckets = []
+    current = bucket_start(since, bucket_seconds)
+    while current < until:
+        buckets.append(current)
+        current += timedelta(seconds=bucket_seconds)
+    index = {bucket: i for i, bucket in enumerate(buckets)}
+    names = [f"{field}_{aggregate}" for field in fields for aggregate in aggregates]
+
+    series = {}
+    for row in rows:
+        entry = series.get(row.server_id)
+        if entry is None:
+            entry = series[row.server_id] = {
+                "server_id": row.server_id,
+                "samples": [0] * len(buckets),
+                "columns": {name: [None] * len(buckets) for name in names},
+            }
+        i = index.get(row.bucket)
+        if i is None:
+            continue
+        entry["samples"][i] = int(row.samples)
+        for name in names:
+            value = getattr(row, name)
+            entry["columns"][name][i] = float(value) if value is not None else None
+
+    return (tier.name if tier else "raw"), buckets, list(series.values())
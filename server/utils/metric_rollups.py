@@ -0,0 +1,244 @@
+"""
+Rollups de métricas: agregados por cubos de 1 minuto, 5 minutos y 1 hora.
+
+Cada nivel se calcula a partir del anterior (raw → 1m → 5m → 1h) y guarda
+min/avg/max/last de cada columna numérica por servidor y cubo en la tabla
+metric_rollups. El job (tarea Celery rollup_metrics, cada minuto) es
+incremental: cada nivel recuerda en metric_rollup_state hasta dónde ha
+agregado (watermark) y en cada pasada recalcula desde ahí hasta el cubo en
+curso, con un UPSERT idempotente.
+
+Las muestras que llegan tarde (un cliente que vacía su spool tras una caída)
+marcan el nivel 1m como sucio desde su timestamp más antiguo; el recálculo se
+propaga luego a 5m y 1h.
+
+Cada nivel tiene su propia retención (ROLLUP_RETENTION_<NIVEL>_DAYS).
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models.models import METRIC_NUMERIC_FIELDS, ROLLUP_AGGREGATES, MetricRollupState
+from .metric_partitions import retention_cutoff
+
+# Origen fijo para date_bin: los cubos de todos los niveles quedan alineados
+BUCKET_ORIGIN = "2000-01-01T00:00:00+00:00"
+
+
+@dataclass(frozen=True)
+class RollupTier:
+    name: str
+    seconds: int
+    retention: timedelta
+    source: Optional[str]  # None = tabla metrics (muestras en bruto)
+    max_span: timedelta  # Máximo rango recalculado por pasada (acota el backfill)
+
+
+ROLLUP_TIERS: List[RollupTier] = [
+    RollupTier("1m", 60, timedelta(days=float(os.getenv("ROLLUP_RETENTION_1M_DAYS", "7"))), None, timedelta(hours=6)),
+    RollupTier("5m", 300, timedelta(days=float(os.getenv("ROLLUP_RETENTION_5M_DAYS", "30"))), "1m", timedelta(days=2)),
+    RollupTier("1h", 3600, timedelta(days=float(os.getenv("ROLLUP_RETENTION_1H_DAYS", "365"))), "5m", timedelta(days=30)),
+]
+TIERS_BY_NAME = {tier.name: tier for tier in ROLLUP_TIERS}
+
+_FIELDS = [name for name, _ in METRIC_NUMERIC_FIELDS]
+ROLLUP_COLUMNS = [f"{name}_{aggregate}" for name in _FIELDS for aggregate in ROLLUP_AGGREGATES]
+
+
+def align(value: datetime, seconds: int) -> datetime:
+    """Inicio del cubo de `seconds` que contiene `value` (UTC)."""
+    epoch = int(value.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc)
+
+
+def aggregate_select(source: Optional[str], bucket_seconds: int) -> str:
+    """
+    SELECT server_id, bucket, samples, <ROLLUP_COLUMNS> agrupado en cubos de
+    `bucket_seconds`, para :start <= tiempo < :end.
+
+    Sobre muestras en bruto (source=None) agrega cada columna; sobre otro
+    nivel combina sus agregados (avg ponderado por <columna>_count, las
+    muestras en que la columna no era nula).
+    Admite :server_id opcional para leer un solo servidor.
+    """
+    interval = f"'{int(bucket_seconds)} seconds'::interval"
+    exprs = []
+    if source is None:
+        time_col = '"timestamp"'
+        samples = "count(*)"
+        for name in _FIELDS:
+            exprs += [
+                f"min({name})",
+                f"avg({name})",
+                f"max({name})",
+                f'(array_agg({name} ORDER BY "timestamp" DESC))[1]',
+                f"count({name})",
+            ]
+        table = "metrics"
+        tier_filter = ""
+    else:
+        time_col = "bucket"
+        samples = "sum(samples)"
+        for name in _FIELDS:
+            exprs += [
+                f"min({name}_min)",
+                # Ponderado por las muestras no nulas de la columna, no por samples:
+                # avg() del nivel 1m ya ignora los NULL (gpu_*, load_1, filas antiguas)
+                f"sum({name}_avg * {name}_count) / NULLIF(sum({name}_count), 0)",
+                f"max({name}_max)",
+                f"(array_agg({name}_last ORDER BY bucket DESC))[1]",
+                f"sum({name}_count)",
+            ]
+        table = "metric_rollups"
+        tier_filter = f"tier = '{source}' AND "
+
+    return (
+        f"SELECT server_id, date_bin({interval}, {time_col}, TIMESTAMPTZ '{BUCKET_ORIGIN}') AS bucket, "
+        f"{samples} AS samples, "
+        + ", ".join(f"{expr} AS {col}" for expr, col in zip(exprs, ROLLUP_COLUMNS))
+        + f" FROM {table} WHERE {tier_filter}{time_col} >= :start AND {time_col} < :end"
+        + " AND (CAST(:server_id AS INTEGER) IS NULL OR server_id = :server_id)"
+        # Posicional: en GROUP BY "bucket" se resolvería a la columna de entrada
+        + " GROUP BY 1, 2"
+    )
+
+
+def _upsert_sql(tier: RollupTier) -> str:
+    columns = ["samples"] + ROLLUP_COLUMNS
+    return (
+        f"INSERT INTO metric_rollups (tier, server_id, bucket, {', '.join(columns)}) "
+        f"SELECT '{tier.name}', agg.* FROM ({aggregate_select(tier.source, tier.seconds)}) AS agg "
+        "ON CONFLICT (tier, server_id, bucket) DO UPDATE SET "
+        + ", ".join(f"{col} = EXCLUDED.{col}" for col in columns)
+    )
+
+
+def mark_dirty(db: Session, tier_name: str, since: datetime) -> None:
+    """Fuerza a recalcular un nivel desde `since` (si ya lo había agregado)."""
+    db.execute(
+        text(
+            "UPDATE metric_rollup_state "
+            "SET dirty_since = LEAST(COALESCE(dirty_since, :since), :since) "
+            "WHERE tier = :tier AND watermark > :since"
+        ),
+        {"tier": tier_name, "since": since},
+    )
+
+
+def rollup_tier(db: Session, tier: RollupTier, now: Optional[datetime] = None) -> dict:
+    """Agrega una pasada de un nivel y devuelve el rango procesado."""
+    now = now or datetime.now(timezone.utc)
+    current_bucket = align(now, tier.seconds)
+
+    state = db.get(MetricRollupState, tier.name)
+    if state is None:
+        # Primera ejecución: empezar por lo que cubre la retención
+        state = MetricRollupState(tier=tier.name, watermark=align(now - tier.retention, tier.seconds))
+        db.add(state)
+        db.flush()
+
+    seen_dirty = state.dirty_since
+    start = align(min(state.watermark, seen_dirty or state.watermark), tier.seconds)
+    # Incluye el cubo en curso (parcial); se recalcula en la siguiente pasada
+    end = min(current_bucket + timedelta(seconds=tier.seconds), start + tier.max_span)
+
+    result = db.execute(
+        text(_upsert_sql(tier)), {"start": start, "end": end, "server_id": None}
+    )
+
+    db.execute(
+        text(
+            "UPDATE metric_rollup_state SET watermark = :watermark, "
+            "dirty_since = CASE WHEN dirty_since IS NOT DISTINCT FROM :seen THEN NULL ELSE dirty_since END "
+            "WHERE tier = :tier"
+        ),
+        {"tier": tier.name, "watermark": min(end, current_bucket), "seen": seen_dirty},
+    )
+
+    # El nivel siguiente debe recoger los cubos recién recalculados
+    for upper in ROLLUP_TIERS:
+        if upper.source == tier.name:
+            mark_dirty(db, upper.name, start)
+
+    db.commit()
+    return {"tier": tier.name, "start": start.isoformat(), "end": end.isoformat(), "buckets": result.rowcount}
+
+
+def run_rollups(db: Session, now: Optional[datetime] = None) -> List[dict]:
+    """Una pasada de todos los niveles, del más fino al más grueso."""
+    return [rollup_tier(db, tier, now) for tier in ROLLUP_TIERS]
+
+
+def prune_rollups(db: Session, now: Optional[datetime] = None) -> dict:
+    """Borra los cubos que exceden la retención de cada nivel."""
+    now = now or datetime.now(timezone.utc)
+    deleted = {}
+    for tier in ROLLUP_TIERS:
+        result = db.execute(
+            text("DELETE FROM metric_rollups WHERE tier = :tier AND bucket < :cutoff"),
+            {"tier": tier.name, "cutoff": now - tier.retention},
+        )
+        deleted[tier.name] = result.rowcount
+    db.commit()
+    return deleted
+
+
+def choose_tier(since: datetime, until: datetime, points: int, now: Optional[datetime] = None) -> Optional[RollupTier]:
+    """
+    Nivel más grueso que cubre `since` con su retención y aún da al menos
+    `points` puntos en el rango. None = agregar las muestras en bruto al vuelo
+    (rangos cortos, donde ni los cubos de 1 minuto dan suficientes puntos).
+    """
+    now = now or datetime.now(timezone.utc)
+    step = (until - since).total_seconds() / max(points, 1)
+    chosen = None
+    for tier in ROLLUP_TIERS:
+        if tier.seconds <= step and since >= now - tier.retention:
+            chosen = tier
+    if chosen is None and (step >= ROLLUP_TIERS[0].seconds or since < retention_cutoff(now)):
+        # Ninguno cubre un rango tan antiguo (o las muestras en bruto ya
+        # expiraron con su partición): el más fino que sí lo cubra
+        chosen = next((t for t in ROLLUP_TIERS if since >= now - t.retention), ROLLUP_TIERS[-1])
+    return chosen
+
+
+def _to_point(row) -> dict:
+    point = {"bucket": row.bucket, "samples": row.samples}
+    for name in _FIELDS:
+        point[name] = {aggregate: getattr(row, f"{name}_{aggregate}") for aggregate in ROLLUP_AGGREGATES}
+    return point
+
+
+def read_history(
+    db: Session, server_id: int, since: datetime, until: datetime, points: int
+) -> tuple:
+    """
+    Serie de un servidor entre since y until con ~`points` puntos.
+
+    Devuelve (nivel, segundos por cubo, puntos en orden cronológico). Si no
+    hay nivel adecuado se agregan las muestras en bruto en cubos de
+    (until - since) / points segundos, recorriendo el índice
+    (server_id, timestamp DESC).
+    """
+    tier = choose_tier(since, until, points)
+    if tier is not None:
+        rows = db.execute(
+            text(
+                "SELECT * FROM metric_rollups WHERE tier = :tier AND server_id = :server_id "
+                "AND bucket >= :start AND bucket < :end ORDER BY bucket"
+            ),
+            {"tier": tier.name, "server_id": server_id, "start": align(since, tier.seconds), "end": until},
+        )
+        return tier.name, tier.seconds, [_to_point(row) for row in rows]
+
+    step = max(int((until - since).total_seconds() // max(points, 1)), 1)
+    rows = db.execute(
+        text(f"{aggregate_select(None, step)} ORDER BY bucket"),
+        {"start": since, "end": until, "server_id": server_id},
+    )
+    return "raw", step, [_to_point(row) for row in rows]
@@ -0,0 +1,50 @@
+"""
+Tareas periódicas de métricas para el worker de Celery.
+
+El worker arranca con beat embebido (-B) y ejecuta las tareas programadas en
+celery_config.beat_schedule.
+"""
+
+from .celery_config import celery_app
+from .db import SessionLocal
+from .metric_partitions import maintain_partitions
+from .metric_rollups import prune_rollups, run_rollups
+
+
+@celery_app.task
+def rollup_metrics():
+    """Agrega las muestras nuevas (o llegadas tarde) en los niveles 1m, 5m y 1h."""
+    db = SessionLocal()
+    try:
+        return run_rollups(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task
+def prune_metric_rollups():
+    """Aplica la retención de cada nivel de rollup."""
+    db = SessionLocal()
+    try:
+        return prune_rollups(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task
+def maintain_metric_partitions():
+    """Crea las particiones próximas de metrics y borra las que exceden la retención."""
+    db = SessionLocal()
+    try:
+        return maintain_partitions(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
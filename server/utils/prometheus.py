@@ -0,0 +1,180 @@
+"""
+Exposición de métricas en formato de texto de Prometheus (GET /metrics).
+
+Todo se genera desde memoria, sin consultas a la base de datos por scrape:
+
+- Gauges por servidor desde la caché de últimas métricas (metric_cache), con
+  etiquetas server_id y server
+- Métricas propias de la API: peticiones y su duración por ruta (registradas
+  por el middleware de main.py), buffer de ingesta, caché y hub de WebSocket
+
+Cada worker de gunicorn tiene sus propios contadores; la etiqueta `pid` los
+distingue para poder sumarlos en Prometheus.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from ..models.models import METRIC_NUMERIC_FIELDS
+from .agent_client import agent_client
+from .heartbeats import heartbeat_monitor
+from .metric_cache import latest_metrics
+from .metric_hub import metric_hub
+from .metric_ingest import metric_ingest
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "pp"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    "cpu_percent": "CPU usage percent",
+    "load_1": "1 minute load average",
+    "mem_percent": "Memory usage percent",
+    "mem_used": "Memory used in bytes",
+    "mem_total": "Total memory in bytes",
+    "swap_percent": "Swap usage percent",
+    "disk_percent": "Disk usage percent",
+    "disk_used": "Disk used in bytes",
+    "disk_total": "Total disk in bytes",
+    "disk_read_bps": "Disk read bytes per second",
+    "disk_write_bps": "Disk write bytes per second",
+    "net_rx_bps": "Network received bytes per second",
+    "net_tx_bps": "Network transmitted bytes per second",
+    "gpu_percent": "Mean GPU utilization percent",
+    "gpu_mem_percent": "Mean GPU memory usage percent",
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class RequestStats:
+    """Contadores e histograma de duración de las peticiones HTTP por (método, ruta, estado)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str, int], int] = {}
+        self._durations: Dict[Tuple[str, str], List[float]] = {}  # buckets..., suma, total
+
+    def record(self, method: str, route: str, status_code: int, seconds: float) -> None:
+        with self._lock:
+            key = (method, route, status_code)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            histogram = self._durations.setdefault((method, route), [0.0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return dict(self._counts), {key: list(value) for key, value in self._durations.items()}
+
+
+request_stats = RequestStats()
+_STARTED = time.time()
+
+
+def render() -> str:
+    """Texto de exposición con las métricas de todos los servidores y de la API."""
+    lines: List[str] = []
+    pid = {"pid": os.getpid()}
+
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, object], float]]) -> None:
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{PREFIX}_{name}{_labels(labels)} {_format(value)}")
+
+    # --- Flota ---
+    now = datetime.now(timezone.utc)
+    servers = latest_metrics.servers()
+    rows = {row["server_id"]: row for row in latest_metrics.rows()}
+
+    def server_labels(server_id: int) -> Dict[str, object]:
+        return {"server_id": server_id, "server": servers.get(server_id, {}).get("name", "")}
+
+    metric(
+        "server_up", "gauge", "1 if the server is online",
+        [(server_labels(sid), 1 if info["status"] == "online" else 0) for sid, info in sorted(servers.items())],
+    )
+    metric(
+        "server_metric_age_seconds", "gauge", "Seconds since the latest received sample",
+        [(server_labels(sid), max((now - row["timestamp"]).total_seconds(), 0)) for sid, row in sorted(rows.items())],
+    )
+    for name, _ in METRIC_NUMERIC_FIELDS:
+        metric(
+            f"server_{name}", "gauge", _HELP.get(name, name),
+            [
+                (server_labels(sid), row[name])
+                for sid, row in sorted(rows.items())
+                if row.get(name) is not None
+            ],
+        )
+
+    # --- API ---
+    counts, durations = request_stats.snapshot()
+    metric(
+        "http_requests_total", "counter", "HTTP requests by method, route and status",
+        [
+            ({**pid, "method": method, "route": route, "status": code}, value)
+            for (method, route, code), value in sorted(counts.items())
+        ],
+    )
+    lines.append(f"# HELP {PREFIX}_http_request_duration_seconds HTTP request duration")
+    lines.append(f"# TYPE {PREFIX}_http_request_duration_seconds histogram")
+    for (method, route), histogram in sorted(durations.items()):
+        labels = {**pid, "method": method, "route": route}
+        for bound, value in zip(DURATION_BUCKETS + (float("inf"),), histogram[:-2] + [histogram[-1]]):
+            lines.append(
+                f"{PREFIX}_http_request_duration_seconds_bucket{_labels({**labels, 'le': _format(bound)})} {_format(value)}"
+            )
+        lines.append(f"{PREFIX}_http_request_duration_seconds_sum{_labels(labels)} {_format(histogram[-2])}")
+        lines.append(f"{PREFIX}_http_request_duration_seconds_count{_labels(labels)} {_format(histogram[-1])}")
+
+    ingest = metric_ingest.stats()
+    metric("ingest_buffered_rows", "gauge", "Metric rows waiting to be flushed", [(pid, ingest["buffered"])])
+    metric("ingest_rows_written_total", "counter", "Metric rows written to the database", [(pid, ingest["rows_written"])])
+    metric("ingest_rows_dropped_total", "counter", "Metric rows dropped after failed flushes", [(pid, ingest["rows_dropped"])])
+    metric("ingest_rows_rejected_total", "counter", "Metric rows outside the partition window", [(pid, ingest["rows_rejected"])])
+    metric("ingest_rows_failed_total", "counter", "Metric rows the database refused to insert", [(pid, ingest["rows_failed"])])
+    metric("ingest_batches_refused_total", "counter", "Metric batches refused with 503 because the buffer was full", [(pid, ingest["batches_refused"])])
+    metric("ingest_flushes_total", "counter", "Successful ingest flushes", [(pid, ingest["flushes"])])
+
+    hub = metric_hub.stats()
+    metric("live_subscribers", "gauge", "Open live metrics WebSockets", [(pid, hub["subscribers"])])
+    metric("live_notifications_total", "counter", "metrics_live notifications received", [(pid, hub["notifications"])])
+    metric("live_coalesced_samples", "gauge", "Samples discarded for slow WebSocket subscribers", [(pid, hub["coalesced"])])
+
+    heartbeats = heartbeat_monitor.stats()
+    metric("heartbeat_tracked_servers", "gauge", "Servers with a pending heartbeat deadline", [(pid, heartbeats["tracked"])])
+    metric("heartbeat_expired_total", "counter", "Servers marked offline after missed heartbeats", [(pid, heartbeats["expired"])])
+
+    agent = agent_client.stats()
+    metric("agent_http_requests_total", "counter", "HTTP requests sent to agents", [(pid, agent["requests"])])
+    metric("agent_http_errors_total", "counter", "HTTP requests to agents that failed", [(pid, agent["errors"])])
+    metric("agent_http_in_flight", "gauge", "HTTP requests to agents in progress", [(pid, agent["in_flight"])])
+    metric("agent_http_body_bytes_total", "counter", "Request body bytes before compression", [(pid, agent["bytes_raw"])])
+    metric("agent_http_sent_bytes_total", "counter", "Request body bytes sent after compression", [(pid, agent["bytes_sent"])])
+
+    metric("metric_cache_servers", "gauge", "Servers with a cached latest sample", [(pid, len(rows))])
+    metric("process_start_time_seconds", "gauge", "Start time of the API process", [(pid, _STARTED)])
+
+    return "\n".join(lines) + "\n"
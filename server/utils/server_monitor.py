@@ -0,0 +1,86 @@
+"""
+Monitor de estado de los servidores (tarea Celery monitor_server_status).
+
+Las lecturas (listado y detalle de servidores, contenedores, playbooks,
+sincronización) no sondean la red: sirven servers.status junto con
+status_checked_at. Este monitor lo mantiene al día:
+
+- Cada STATUS_MONITOR_TICK s (beat) elige los servidores cuya comprobación
+  ha vencido
+- Intervalo normal STATUS_CHECK_INTERVAL (60 s); STATUS_FAST_INTERVAL (15 s)
+  para los que cambiaron de estado hace menos de STATUS_FLAP_WINDOW s, para
+  confirmar cuanto antes si vuelven o siguen caídos
+- Amortiguación de flapping: si un servidor acumula STATUS_FLAP_THRESHOLD
+  cambios en STATUS_FLAP_HISTORY s (status_history.flap_counts), su intervalo
+  se duplica por cada cambio extra, hasta STATUS_FLAP_MAX_INTERVAL (900 s)
+- Sondea todos los vencidos a la vez (server_status.probe_hosts)
+- Solo reescribe el estado de los que cambian (CRUD.servers.record_status_checks)
+
+Los servidores cuyo agente envía latidos (utils/heartbeats.py) no se sondean:
+su estado lo deciden los latidos. Si un agente deja de latir durante más de
+HEARTBEAT_PROBE_FALLBACK s (1 h), el servidor vuelve a sondearse.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..CRUD.servers import record_status_checks
+from ..models.models import Server
+from .server_status import probe_hosts_sync
+from .status_history import FLAP_THRESHOLD, flap_counts
+
+CHECK_INTERVAL = timedelta(seconds=float(os.getenv("STATUS_CHECK_INTERVAL", "60")))
+FAST_INTERVAL = timedelta(seconds=float(os.getenv("STATUS_FAST_INTERVAL", "15")))
+FLAP_WINDOW = timedelta(seconds=float(os.getenv("STATUS_FLAP_WINDOW", "600")))
+FLAP_MAX_INTERVAL = timedelta(seconds=float(os.getenv("STATUS_FLAP_MAX_INTERVAL", "900")))
+PROBE_FALLBACK = timedelta(seconds=float(os.getenv("HEARTBEAT_PROBE_FALLBACK", "3600")))
+
+
+def check_interval(server: Server, now: datetime, flaps: int = 0) -> timedelta:
+    """
+    Cada cuánto comprobar un servidor según lo reciente de su último cambio y
+    cuántos cambios ha tenido últimamente (`flaps`).
+    """
+    if flaps >= FLAP_THRESHOLD:
+        return min(CHECK_INTERVAL * 2 ** (flaps - FLAP_THRESHOLD + 1), FLAP_MAX_INTERVAL)
+    if server.status_changed_at is not None and now - server.status_changed_at < FLAP_WINDOW:
+        return FAST_INTERVAL
+    return CHECK_INTERVAL
+
+
+def heartbeat_managed(server: Server, now: datetime) -> bool:
+    return server.last_heartbeat_at is not None and now - server.last_heartbeat_at < PROBE_FALLBACK
+
+
+def due_servers(db: Session, now: datetime) -> List[Server]:
+    flaps = flap_counts(db, now)
+    return [
+        server
+        for server in db.query(Server).all()
+        if not heartbeat_managed(server, now)
+        and (
+            server.status_checked_at is None
+            or server.status_checked_at + check_interval(server, now, flaps.get(server.id, 0)) <= now
+        )
+    ]
+
+
+def run_status_checks(db: Session, now: Optional[datetime] = None) -> dict:
+    """Sondea los servidores vencidos y guarda el resultado."""
+    now = now or datetime.now(timezone.utc)
+    servers = due_servers(db, now)
+    if not servers:
+        return {"checked": 0, "changed": []}
+
+    results = probe_hosts_sync([server.ip_address for server in servers])
+    changed = record_status_checks(
+        db, {server.id: results[server.ip_address].status for server in servers}, now
+    )
+    by_id = {server.id: server for server in servers}
+    for server_id in changed:
+        server = by_id[server_id]
+        print(f"🔄 Server {server.name} ({server.ip_address}) is now {results[server.ip_address].status}")
+    return {"checked": len(servers), "changed": changed}
@@ -1,67 +1,154 @@
-import subprocess
+"""
+Comprobación de si los servidores están vivos, sin lanzar procesos.
+
+Cada host se sondea con asyncio: conexión TCP a los puertos de PROBE_PORTS
+(por defecto 22, SSH) y GET al /health del agente (AGENT_PORT, 8100) a la
+vez; basta con que uno responda. probe_hosts() sondea muchos hosts en
+paralelo con como mucho PROBE_CONCURRENCY sondeos simultáneos y
+PROBE_TIMEOUT segundos por host, así que 40 servidores con varios caídos
+cuestan del orden de un timeout en lugar de la suma de todos.
+
+Puertos y timeouts son parámetros, lo que permite probarlo contra sockets
+locales (127.0.0.1 y un puerto en escucha o cerrado).
+"""
+
+import asyncio
+import os
 import socket
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence
 
-def check_server_online(ip_address: str, timeout: int = 3) -> bool:
-    """
-    Verifica si un servidor está online usando ping.
-    
-    Args:
-        ip_address: Dirección IP del servidor
-        timeout: Timeout en segundos
-        
-    Returns:
-        True si el servidor responde, False en caso contrario
-    """
+import httpx
+
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "2"))
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "64"))
+PROBE_PORTS = [int(port) for port in os.getenv("PROBE_PORTS", "22").split(",") if port.strip()]
+AGENT_PORT = int(os.getenv("AGENT_PORT", "8100"))  # 0 = no sondear el agente
+
+
+@dataclass
+class ProbeResult:
+    status: str  # online / offline
+    method: Optional[str] = None  # "tcp:<puerto>" o "agent": lo que respondió primero
+    latency_ms: Optional[float] = None
+
+
+async def _tcp_connect(host: str, port: int) -> str:
+    _, writer = await asyncio.open_connection(host, port)
+    writer.close()
     try:
-        # Intentar ping
-        result = subprocess.run(
-            ['ping', '-n', '1', '-w', str(timeout * 1000), ip_address],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=timeout
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return f"tcp:{port}"
+
+
+async def _agent_health(host: str, port: int, client: httpx.AsyncClient) -> str:
+    # Cualquier respuesta HTTP (incluso 503 si su BD falla) indica que el host está vivo
+    await client.get(f"http://{host}:{port}/health")
+    return "agent"
+
+
+async def probe_host(
+    host: str,
+    ports: Optional[Sequence[int]] = None,
+    agent_port: Optional[int] = None,
+    timeout: float = PROBE_TIMEOUT,
+    client: Optional[httpx.AsyncClient] = None,
+) -> ProbeResult:
+    """Sondea un host por todos los métodos a la vez; online en cuanto responde uno."""
+    ports = PROBE_PORTS if ports is None else ports
+    agent_port = AGENT_PORT if agent_port is None else agent_port
+    own_client = client is None and bool(agent_port)
+    if own_client:
+        client = httpx.AsyncClient(timeout=timeout)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    attempts = [asyncio.create_task(_tcp_connect(host, port)) for port in ports]
+    if agent_port:
+        attempts.append(asyncio.create_task(_agent_health(host, agent_port, client)))
+    try:
+        for attempt in asyncio.as_completed(attempts, timeout=timeout):
+            try:
+                method = await attempt
+            except (OSError, httpx.HTTPError):
+                continue
+            return ProbeResult("online", method, round((loop.time() - started) * 1000, 1))
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+        await asyncio.gather(*attempts, return_exceptions=True)
+        if own_client:
+            await client.aclose()
+    return ProbeResult("offline")
+
+
+async def probe_hosts(
+    hosts: Iterable[str],
+    ports: Optional[Sequence[int]] = None,
+    agent_port: Optional[int] = None,
+    timeout: float = PROBE_TIMEOUT,
+    concurrency: int = PROBE_CONCURRENCY,
+) -> Dict[str, ProbeResult]:
+    """Sondea todos los hosts en paralelo (como mucho `concurrency` a la vez)."""
+    unique = list(dict.fromkeys(hosts))
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+
+        async def bounded(host: str) -> ProbeResult:
+            async with semaphore:
+                return await probe_host(host, ports, agent_port, timeout, client)
+
+        results = await asyncio.gather(*(bounded(host) for host in unique))
+    return dict(zip(unique, results))
+
+
+def _run(coro):
+    """Ejecuta una corrutina desde código síncrono, aunque el hilo ya tenga un event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def probe_hosts_sync(hosts: Iterable[str], **kwargs) -> Dict[str, ProbeResult]:
+    return _run(probe_hosts(hosts, **kwargs))
+
 
 def check_port_open(ip_address: str, port: int = 22, timeout: int = 3) -> bool:
     """
     Verifica si un puerto está abierto en el servidor.
-    
+
     Args:
         ip_address: Dirección IP del servidor
         port: Puerto a verificar (default 22 para SSH)
         timeout: Timeout en segundos
-        
+
     Returns:
         True si el puerto está abierto, False en caso contrario
     """
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        result = sock.connect_ex((ip_address, port))
-        sock.close()
-        return result == 0
-    except Exception:
+        with socket.create_connection((ip_address, port), timeout=timeout):
+            return True
+    except OSError:
         return False
 
+
 def get_server_status(ip_address: str) -> str:
     """
     Determina el estado real del servidor.
-    
+
     Args:
         ip_address: Dirección IP del servidor
-        
+
     Returns:
         "online" si el servidor responde, "offline" en caso contrario
     """
-    # Primero intentar ping
-    if check_server_online(ip_address):
-        return "online"
-    
-    # Si ping falla, intentar conexión SSH
-    if check_port_open(ip_address, 22):
-        return "online"
-    
-    return "offline"
+    return _run(probe_host(ip_address)).status
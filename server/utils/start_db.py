@@ -10,11 +10,16 @@ from ..models.models import (
     Container,
     ExecutedPlaybook,
     Metric,
+    MetricRollup,
+    MetricRollupState,
     Server,
     User,
+    UserChange,
     UserCreate,
 )
 from .db import Base, SessionLocal, engine
+from .metric_partitions import ensure_partitions, is_partitioned
+from .user_revisions import install_changelog
 
 
 def init_db() -> None:
@@ -22,6 +27,35 @@ def init_db() -> None:
     Base.metadata.create_all(bind=engine)
 
 
+def init_metric_partitions() -> None:
+    """Crea las particiones de metrics desde el corte de retención hasta los próximos días"""
+    db = SessionLocal()
+    try:
+        if not is_partitioned(db):
+            print("  ⚠ La tabla metrics no está particionada: aplica migrations/metrics_partitioning.sql")
+            return
+        created = ensure_partitions(db)
+        print(f"✓ Particiones de métricas listas ({len(created)} creadas)")
+    except Exception as e:
+        print(f"✗ Error al crear particiones de métricas: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def init_user_changelog() -> None:
+    """Instala el trigger que registra los cambios de users (sincronización incremental)"""
+    db = SessionLocal()
+    try:
+        install_changelog(db)
+        print("✓ Registro de cambios de usuarios listo")
+    except Exception as e:
+        print(f"✗ Error al instalar el registro de cambios de usuarios: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
 def reset_sequences() -> None:
     """Resetea las secuencias de IDs de PostgreSQL para evitar conflictos"""
     db = SessionLocal()
@@ -110,6 +144,10 @@ if __name__ == "__main__":
     print("Inicializando base de datos...")
     init_db()
     print("✓ Tablas de base de datos creadas (si no existían)")
+    print("\nCreando particiones de métricas...")
+    init_metric_partitions()
+    print("\nInstalando registro de cambios de usuarios...")
+    init_user_changelog()
     print("\nSincronizando secuencias de IDs...")
     reset_sequences()
     print("\nCreando usuario administrador por defecto...")
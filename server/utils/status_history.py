@@ -0,0 +1,123 @@
+"""
+Historial de estados de los servidores: disponibilidad y detección de flapping.
+
+Cada cambio de servers.status queda en server_status_transitions (lo escribe
+CRUD.servers en la misma transacción). A partir de ahí:
+
+- server_uptime(): tiempo online / tiempo observado en una ventana, calculado
+  en SQL con funciones ventana. Cada transición abre un tramo que termina en
+  la siguiente (LEAD) o al final de la ventana; la última transición anterior
+  a la ventana da el estado con el que empieza.
+- flap_counts(): cambios de estado por servidor en las últimas
+  STATUS_FLAP_HISTORY s. Con STATUS_FLAP_THRESHOLD o más se considera que el
+  servidor "flapea" y el monitor de estado lo comprueba cada vez menos
+  (ver server_monitor.check_interval).
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+FLAP_HISTORY = timedelta(seconds=float(os.getenv("STATUS_FLAP_HISTORY", "3600")))
+FLAP_THRESHOLD = int(os.getenv("STATUS_FLAP_THRESHOLD", "4"))
+
+_UPTIME_SQL = """
+WITH history AS (
+    SELECT server_id, to_status, changed_at
+    FROM server_status_transitions
+    WHERE changed_at >= :since AND changed_at < :until
+      AND (CAST(:server_id AS INTEGER) IS NULL OR server_id = :server_id)
+    UNION ALL
+    (
+        SELECT DISTINCT ON (server_id) server_id, to_status, changed_at
+        FROM server_status_transitions
+        WHERE changed_at < :since
+          AND (CAST(:server_id AS INTEGER) IS NULL OR server_id = :server_id)
+        ORDER BY server_id, changed_at DESC
+    )
+),
+spans AS (
+    SELECT
+        server_id,
+        to_status,
+        changed_at,
+        EXTRACT(EPOCH FROM
+            COALESCE(LEAD(changed_at) OVER w, :until) - GREATEST(changed_at, :since)
+        ) AS seconds,
+        LAST_VALUE(to_status) OVER (
+            w ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+        ) AS current_status
+    FROM history
+    WINDOW w AS (PARTITION BY server_id ORDER BY changed_at)
+)
+SELECT
+    server_id,
+    SUM(seconds) AS observed_seconds,
+    COALESCE(SUM(seconds) FILTER (WHERE to_status = 'online'), 0) AS online_seconds,
+    COUNT(*) FILTER (WHERE changed_at >= :since) AS transitions,
+    COUNT(*) FILTER (WHERE changed_at >= :since AND to_status = 'offline') AS outages,
+    COALESCE(MAX(seconds) FILTER (WHERE to_status = 'offline'), 0) AS longest_outage_seconds,
+    MIN(current_status) AS current_status
+FROM spans
+GROUP BY server_id
+ORDER BY server_id
+"""
+
+
+def server_uptime(
+    db: Session, since: datetime, until: datetime, server_id: Optional[int] = None
+) -> List[dict]:
+    """
+    Disponibilidad de cada servidor con historial en [since, until) (o solo
+    de `server_id`). `until` se recorta a ahora: el futuro no cuenta.
+    """
+    until = min(until, datetime.now(timezone.utc))
+    rows = db.execute(
+        text(_UPTIME_SQL), {"since": since, "until": until, "server_id": server_id}
+    ).mappings()
+    flaps = flap_counts(db, server_id=server_id)
+
+    result = []
+    for row in rows:
+        observed = float(row["observed_seconds"] or 0)
+        online = float(row["online_seconds"] or 0)
+        result.append(
+            {
+                "server_id": row["server_id"],
+                "since": since,
+                "until": until,
+                "observed_seconds": observed,
+                "online_seconds": online,
+                "availability_percent": round(online / observed * 100, 3) if observed > 0 else None,
+                "transitions": row["transitions"],
+                "outages": row["outages"],
+                "longest_outage_seconds": float(row["longest_outage_seconds"]),
+                "current_status": row["current_status"],
+                "flapping": is_flapping(flaps.get(row["server_id"], 0)),
+            }
+        )
+    return result
+
+
+def flap_counts(
+    db: Session, now: Optional[datetime] = None, server_id: Optional[int] = None
+) -> Dict[int, int]:
+    """{server_id: cambios de estado en las últimas STATUS_FLAP_HISTORY s} (solo los que tienen alguno)."""
+    now = now or datetime.now(timezone.utc)
+    rows = db.execute(
+        text(
+            "SELECT server_id, COUNT(*) FROM server_status_transitions "
+            "WHERE changed_at >= :since "
+            "AND (CAST(:server_id AS INTEGER) IS NULL OR server_id = :server_id) "
+            "GROUP BY server_id"
+        ),
+        {"since": now - FLAP_HISTORY, "server_id": server_id},
+    )
+    return {sid: count for sid, count in rows}
+
+
+def is_flapping(transitions: int) -> bool:
+    return transitions >= FLAP_THRESHOLD
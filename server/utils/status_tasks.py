@@ -0,0 +1,22 @@
+"""
+Tareas periódicas de estado de los servidores para el worker de Celery.
+
+Programadas en celery_config.beat_schedule (el worker arranca con -B).
+"""
+
+from .celery_config import celery_app
+from .db import SessionLocal
+from .server_monitor import run_status_checks
+
+
+@celery_app.task
+def monitor_server_status():
+    """Comprueba los servidores cuya comprobación de estado ha vencido."""
+    db = SessionLocal()
+    try:
+        return run_status_checks(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
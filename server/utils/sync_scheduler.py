@@ -0,0 +1,203 @@
+"""
+Planificador en segundo plano de la sincronización de usuarios con los clientes.
+
+Las modificaciones de users solo llaman a request() (vía
+CRUD.users._trigger_user_sync), que marca "usuarios pendientes" y vuelve al
+instante. Un hilo por worker agrupa las peticiones:
+
+- Espera USER_SYNC_DEBOUNCE s (2) sin nuevas peticiones antes de sincronizar,
+  así diez ediciones seguidas producen una sola sincronización
+- Una ráfaga continua no la retrasa más de USER_SYNC_MAX_DELAY s (10)
+- Cada USER_SYNC_RECONCILE s (300; 0 lo desactiva) sincroniza aunque no haya
+  peticiones, para poner al día a los clientes que estaban offline o cambios
+  hechos desde otro proceso. Como la sincronización es por revisiones, los
+  clientes al día no reciben nada
+
+Con varios workers, un advisory lock de PostgreSQL evita dos sincronizaciones
+a la vez; si otro worker está sincronizando, la petición se reintenta después.
+status() describe el estado del planificador de este worker (GET
+/sync/users/status).
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from .db import SessionLocal, engine
+from .user_sync import sync_users_to_all_clients_sync
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = float(os.getenv("USER_SYNC_DEBOUNCE", "2"))
+MAX_DELAY = float(os.getenv("USER_SYNC_MAX_DELAY", "10"))
+RECONCILE = float(os.getenv("USER_SYNC_RECONCILE", "300"))
+_LOCK_KEY = "user_sync"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class UserSyncScheduler:
+    """Hilo que agrupa las peticiones de sincronización y lanza una por lote."""
+
+    def __init__(self, debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY, reconcile: float = RECONCILE):
+        self.debounce = max(debounce, 0.0)
+        self.max_delay = max(max_delay, self.debounce)
+        self.reconcile = reconcile
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._first_request: Optional[float] = None  # monotonic; None = nada pendiente
+        self._last_request: Optional[float] = None
+        self._pending_requests = 0
+        self._pending_reasons: set = set()
+        self._force_snapshot = False
+        self._last_run_at = time.monotonic()
+        self.requested_at: Optional[datetime] = None
+        self.running = False
+        self.requests = 0
+        self.runs = 0
+        self.last_run: Optional[dict] = None
+
+    def request(self, reason: str = "users changed", force_snapshot: bool = False) -> None:
+        """Marca los usuarios como pendientes de sincronizar (no bloquea)."""
+        now = time.monotonic()
+        with self._cond:
+            if self._first_request is None:
+                self._first_request = now
+                self.requested_at = _utcnow()
+            self._last_request = now
+            self._pending_requests += 1
+            self._pending_reasons.add(reason)
+            self._force_snapshot = self._force_snapshot or force_snapshot
+            self.requests += 1
+            self._cond.notify()
+
+    def _due_in(self, now: float) -> Optional[float]:
+        """Segundos hasta la próxima sincronización (0 = ya), o None si no hay nada que esperar."""
+        waits = []
+        if self._first_request is not None:
+            waits.append(min(self._last_request + self.debounce, self._first_request + self.max_delay) - now)
+        if self.reconcile > 0:
+            waits.append(self._last_run_at + self.reconcile - now)
+        return max(min(waits), 0.0) if waits else None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="user-sync-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=15)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                wait = self._due_in(time.monotonic())
+                if wait is None or wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                batch = {
+                    "requests": self._pending_requests,
+                    "reasons": sorted(self._pending_reasons) or ["reconcile"],
+                    "requested_at": self.requested_at,
+                    "force_snapshot": self._force_snapshot,
+                }
+                self._first_request = self._last_request = self.requested_at = None
+                self._pending_requests = 0
+                self._pending_reasons = set()
+                self._force_snapshot = False
+                self._last_run_at = time.monotonic()
+            self.run_batch(batch)
+
+    def run_batch(self, batch: dict) -> Optional[dict]:
+        """Sincroniza una vez para todo el lote, si ningún otro worker lo está haciendo."""
+        self.running = True
+        started = _utcnow()
+        try:
+            with engine.connect() as lock_conn:
+                locked = lock_conn.execute(
+                    text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": _LOCK_KEY}
+                ).scalar()
+                if not locked:
+                    # Otro worker está sincronizando: reintentar cuando termine
+                    logger.info("ℹ️  User sync already running in another worker, retrying later")
+                    if batch["requests"]:
+                        for reason in batch["reasons"]:
+                            self.request(reason, batch["force_snapshot"])
+                    return None
+                try:
+                    db = SessionLocal()
+                    try:
+                        result = sync_users_to_all_clients_sync(db, batch["force_snapshot"])
+                    finally:
+                        db.close()
+                finally:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": _LOCK_KEY})
+                    lock_conn.commit()
+
+            self.runs += 1
+            self.last_run = {
+                "started_at": started,
+                "finished_at": _utcnow(),
+                "requests": batch["requests"],
+                "reasons": batch["reasons"],
+                "force_snapshot": batch["force_snapshot"],
+                "success": True,
+                "message": result.get("message"),
+                "revision": result.get("revision"),
+                "clients_synced": result.get("clients_synced", 0),
+                "clients_failed": result.get("clients_failed", 0),
+                "failed_servers": result.get("failed_servers", []),
+            }
+            if batch["requests"] > 1:
+                logger.info(f"✅ {batch['requests']} user sync requests coalesced into one run")
+            return self.last_run
+        except Exception as e:
+            logger.error(f"❌ User sync run failed: {type(e).__name__}: {str(e)}")
+            self.runs += 1
+            self.last_run = {
+                "started_at": started,
+                "finished_at": _utcnow(),
+                "requests": batch["requests"],
+                "reasons": batch["reasons"],
+                "force_snapshot": batch["force_snapshot"],
+                "success": False,
+                "message": f"{type(e).__name__}: {str(e)}",
+            }
+            return self.last_run
+        finally:
+            self.running = False
+
+    def status(self) -> dict:
+        with self._cond:
+            wait = self._due_in(time.monotonic())
+            return {
+                "pid": os.getpid(),
+                "alive": bool(self._thread and self._thread.is_alive()),
+                "running": self.running,
+                "pending": self._first_request is not None,
+                "pending_requests": self._pending_requests,
+                "pending_since": self.requested_at,
+                "next_run_in_seconds": round(wait, 1) if wait is not None else None,
+                "debounce_seconds": self.debounce,
+                "requests_total": self.requests,
+                "runs_total": self.runs,
+                "last_run": self.last_run,
+            }
+
+
+user_sync_scheduler = UserSyncScheduler()
@@ -0,0 +1,115 @@
+"""
+Revisiones de la tabla users para la sincronización incremental con los clientes.
+
+Un trigger de PostgreSQL añade una fila a user_changes en cada INSERT, UPDATE
+(que cambie algo) o DELETE de users, así que da igual qué código modifique el
+usuario (CRUD, cambio de contraseña desde un cliente, /auth...). La revisión
+es un BIGSERIAL; el trigger toma además un advisory lock de transacción, con
+lo que las transacciones que tocan users se confirman en orden de revisión y
+un cliente nunca ve la revisión N+1 antes que la N.
+
+- current_revision(): última revisión registrada
+- changes_since(): usuarios cambiados y IDs borrados en (since, upto], o
+  None si faltan revisiones (se podaron) y hace falta un snapshot completo
+- prune_changes(): borra el registro antiguo (conserva siempre la última fila)
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models.models import User
+
+RETENTION = timedelta(days=float(os.getenv("USER_CHANGELOG_RETENTION_DAYS", "30")))
+
+CHANGELOG_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION users_changelog() RETURNS trigger AS $$
+    BEGIN
+        -- Serializa hasta el commit a quien modifica users: las revisiones se confirman en orden
+        PERFORM pg_advisory_xact_lock(hashtext('user_changes'));
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO user_changes (user_id, op) VALUES (OLD.id, 'delete');
+            RETURN OLD;
+        END IF;
+        IF TG_OP = 'UPDATE' AND OLD.id <> NEW.id THEN
+            INSERT INTO user_changes (user_id, op) VALUES (OLD.id, 'delete');
+        END IF;
+        INSERT INTO user_changes (user_id, op) VALUES (NEW.id, 'upsert');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER users_changelog_insert_delete
+        AFTER INSERT OR DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION users_changelog()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER users_changelog_update
+        AFTER UPDATE ON users
+        FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+        EXECUTE FUNCTION users_changelog()
+    """,
+]
+
+
+def install_changelog(db: Session) -> None:
+    """Crea (o reemplaza) la función y los triggers del registro de cambios."""
+    for statement in CHANGELOG_DDL:
+        db.execute(text(statement))
+    db.commit()
+
+
+def current_revision(db: Session) -> int:
+    return db.execute(text("SELECT COALESCE(MAX(revision), 0) FROM user_changes")).scalar()
+
+
+def changes_since(
+    db: Session, since: int, upto: int
+) -> Optional[Tuple[List[User], List[int]]]:
+    """
+    Cambios en (since, upto]: (usuarios a crear/actualizar, IDs borrados).
+
+    Devuelve None si `since` no se puede continuar con el registro: revisiones
+    ya podadas o una revisión mayor que la actual (base de datos restaurada).
+    """
+    if since > upto:
+        return None
+    oldest = db.execute(text("SELECT MIN(revision) FROM user_changes")).scalar()
+    if since < upto and (oldest is None or since < oldest - 1):
+        return None
+
+    latest = db.execute(
+        text(
+            "SELECT DISTINCT ON (user_id) user_id, op FROM user_changes "
+            "WHERE revision > :since AND revision <= :upto "
+            "ORDER BY user_id, revision DESC"
+        ),
+        {"since": since, "upto": upto},
+    ).all()
+    upserted = [user_id for user_id, op in latest if op == "upsert"]
+    deleted = [user_id for user_id, op in latest if op == "delete"]
+
+    users = db.query(User).filter(User.id.in_(upserted)).order_by(User.id).all() if upserted else []
+    # Actualizado y borrado después de `upto`: el borrado llegará en la próxima revisión
+    found = {user.id for user in users}
+    deleted.extend(user_id for user_id in upserted if user_id not in found)
+    return users, sorted(deleted)
+
+
+def prune_changes(db: Session, now: Optional[datetime] = None) -> int:
+    """Borra las filas de más de USER_CHANGELOG_RETENTION_DAYS, salvo la última."""
+    cutoff = (now or datetime.now(timezone.utc)) - RETENTION
+    result = db.execute(
+        text(
+            "DELETE FROM user_changes WHERE changed_at < :cutoff "
+            "AND revision < (SELECT MAX(revision) FROM user_changes)"
+        ),
+        {"cutoff": cutoff},
+    )
+    db.commit()
+    return result.rowcount
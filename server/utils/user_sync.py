@@ -1,66 +1,175 @@
 """
 Utilidades para sincronizar usuarios con todos los clientes registrados
+
+La sincronización es incremental por revisiones (ver utils/user_revisions.py):
+
+- servers.user_sync_revision guarda la última revisión de users que confirmó
+  cada cliente; los clientes al día no reciben nada
+- Al resto se le envía a /api/sync/users/delta solo lo cambiado desde su
+  revisión: usuarios creados/modificados y IDs borrados
+- Snapshot completo a /api/sync/users solo para clientes nuevos, si se pide
+  explícitamente, si el registro ya no cubre su revisión o si el cliente
+  responde 409 (su revisión local no coincide y tampoco se puede continuar)
+- Los clientes antiguos sin /api/sync/users/delta (404) reciben el snapshot
+- Los snapshots llevan el digest de su contenido (users_digest) en el cuerpo
+  y en If-None-Match; si el cliente ya aplicó ese mismo contenido responde
+  304 sin tocar su base de datos ni sus ficheros NSS
+
+Las peticiones van por el cliente HTTP compartido (utils/agent_client.py):
+conexiones keep-alive, cuerpo comprimido y límite de envíos simultáneos.
 """
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
 import httpx
 import asyncio
+import hashlib
+import json
 import logging
 import os
 from ..models.models import User, Server
 from ..CRUD.servers import get_all_servers
-from ..CRUD.users import get_all_users
+from .agent_client import agent_client, agent_url
+from .user_revisions import changes_since, current_revision, prune_changes
 
 logger = logging.getLogger(__name__)
 
 
-async def sync_users_to_client(client_url: str, users_data: List[dict], server_name: str = "Unknown", server_url: str = None) -> dict:
+def serialize_user(user: User) -> dict:
+    """Usuario en el formato que espera el cliente (UserSync)"""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "password_hash": user.password_hash,
+        "is_admin": user.is_admin,
+        "is_active": user.is_active,
+        "must_change_password": user.must_change_password,
+        "system_uid": user.system_uid,
+        "system_gid": user.system_gid,
+        "ssh_public_key": user.ssh_public_key,
+        "password_max_age_days": user.password_max_age_days,
+        "password_changed_at": user.password_changed_at.isoformat() if user.password_changed_at else None,
+        "created_at": user.created_at.isoformat() if user.created_at else None
+    }
+
+
+def users_digest(users: List[dict]) -> str:
+    """Digest del contenido de un snapshot (usuarios serializados, ordenados por id)"""
+    canonical = json.dumps(users, sort_keys=True, separators=(",", ":"), default=str)
+    return "sha256:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_sync_payload(db: Session, since: Optional[int], revision: int) -> dict:
     """
-    Envía la lista de usuarios a un cliente específico
+    Payload para llevar a un cliente de la revisión `since` a `revision`.
+
+    Delta si el registro de cambios cubre `since`; snapshot completo si
+    `since` es None o no se puede continuar.
+    """
+    changes = changes_since(db, since, revision) if since is not None else None
+    if changes is None:
+        users = [serialize_user(user) for user in db.query(User).order_by(User.id).all()]
+        return {
+            "mode": "snapshot",
+            "revision": revision,
+            "digest": users_digest(users),
+            "users": users,
+        }
+    users, deleted_ids = changes
+    return {
+        "mode": "delta",
+        "base_revision": since,
+        "revision": revision,
+        "users": [serialize_user(user) for user in users],
+        "deleted_ids": deleted_ids,
+    }
+
+
+async def sync_users_to_client(ip_address: str, payload: dict, server_name: str = "Unknown", server_url: str = None) -> dict:
+    """
+    Envía un payload de usuarios (delta o snapshot, ver build_sync_payload) a un cliente
 
     Args:
-        client_url: URL base del cliente (http://ip:puerto)
-        users_data: Lista de usuarios serializados
+        ip_address: IP del servidor cuyo agente recibe los usuarios
+        payload: Payload de build_sync_payload
         server_name: Nombre del servidor para logging
         server_url: URL del servidor central para que el cliente la guarde automáticamente
 
     Returns:
-        dict con el resultado de la sincronización
+        dict con el resultado de la sincronización. Si el cliente rechaza un
+        delta (409) incluye "client_revision"; si no conoce los deltas (404),
+        "delta_unsupported".
     """
+    delta = payload.get("mode") == "delta"
+    client_url = agent_url(ip_address)
     try:
         # Preparar payload con metadatos
-        payload = {
-            "users": users_data
-        }
+        body = {key: value for key, value in payload.items() if key != "mode"}
         if server_url:
-            payload["server_url"] = server_url
+            body["server_url"] = server_url
 
-        logger.info(f"🔄 Syncing {len(users_data)} users to '{server_name}' ({client_url})")
+        users_data = payload["users"]
+        if delta:
+            logger.info(
+                f"🔄 Syncing delta r{payload['base_revision']}→r{payload['revision']} to '{server_name}' ({client_url}): "
+                f"{len(users_data)} changed, {len(payload['deleted_ids'])} deleted"
+            )
+        else:
+            logger.info(f"🔄 Syncing {len(users_data)} users (snapshot r{payload['revision']}) to '{server_name}' ({client_url})")
         logger.debug(f"📦 Payload structure: users_count={len(users_data)}, server_url={server_url}")
 
-        # Log primer usuario como ejemplo de estructura
-        if users_data:
-            logger.debug(f"📝 Sample user data: {users_data[0]}")
+        headers = {"If-None-Match": f'"{payload["digest"]}"'} if payload.get("digest") else None
+        response = await agent_client.post(
+            ip_address, "/api/sync/users/delta" if delta else "/api/sync/users", json=body, headers=headers
+        )
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{client_url}/api/sync/users",
-                json=payload
-            )
+        # Log detalles de la respuesta
+        logger.debug(f"📡 Response status: {response.status_code}")
+        logger.debug(f"📡 Response headers: {dict(response.headers)}")
 
-            # Log detalles de la respuesta
-            logger.debug(f"📡 Response status: {response.status_code}")
-            logger.debug(f"📡 Response headers: {dict(response.headers)}")
+        if delta and response.status_code == 409:
+            detail = response.json().get("detail") or {}
+            client_revision = detail.get("revision") if isinstance(detail, dict) else None
+            logger.info(f"ℹ️  '{server_name}' is at revision {client_revision}, not r{payload['base_revision']}")
+            return {
+                "success": False,
+                "client": client_url,
+                "server_name": server_name,
+                "error": "Revision mismatch",
+                "status_code": 409,
+                "client_revision": client_revision,
+            }
+        if delta and response.status_code == 404:
+            return {
+                "success": False,
+                "client": client_url,
+                "server_name": server_name,
+                "error": "Client does not support delta sync",
+                "status_code": 404,
+                "delta_unsupported": True,
+            }
 
-            response.raise_for_status()
-            result = response.json()
-            logger.info(f"✅ Users synced to '{server_name}' ({client_url}): {result.get('users_synced', 0)} users")
+        if not delta and response.status_code == 304:
+            # El cliente ya tiene exactamente estos usuarios: solo ha guardado la revisión
+            logger.info(f"✅ '{server_name}' ({client_url}) already has snapshot r{payload['revision']}, nothing to apply")
             return {
                 "success": True,
                 "client": client_url,
                 "server_name": server_name,
-                "response": result
+                "revision": payload["revision"],
+                "response": {"users_synced": 0, "not_modified": True},
             }
+
+        response.raise_for_status()
+        result = response.json()
+        logger.info(f"✅ Users synced to '{server_name}' ({client_url}): {result.get('users_synced', 0)} users")
+        return {
+            "success": True,
+            "client": client_url,
+            "server_name": server_name,
+            "revision": payload["revision"],
+            "response": result
+        }
     except httpx.HTTPStatusError as e:
         error_detail = f"HTTP {e.response.status_code}"
         try:
@@ -110,68 +219,106 @@ async def sync_users_to_client(client_url: str, users_data: List[dict], server_n
         }
 
 
-async def sync_users_to_all_clients(db: Session) -> dict:
+async def sync_users_to_server(
+    db: Session,
+    server: Server,
+    revision: int,
+    server_url: Optional[str] = None,
+    force_snapshot: bool = False,
+    payloads: Optional[Dict[Optional[int], dict]] = None,
+) -> dict:
     """
-    Sincroniza todos los usuarios con todos los clientes registrados
+    Lleva un cliente a `revision`: delta desde servers.user_sync_revision o
+    snapshot. Si el cliente rechaza el delta, reintenta una vez desde la
+    revisión que informa (o con snapshot).
+
+    `payloads` cachea los payloads por revisión de origen para no
+    recalcularlos para cada cliente.
+    """
+    payloads = {} if payloads is None else payloads
+
+    def payload_from(since: Optional[int]) -> dict:
+        if since not in payloads:
+            payloads[since] = build_sync_payload(db, since, revision)
+        return payloads[since]
+
+    since = None if force_snapshot else server.user_sync_revision
+    result = await sync_users_to_client(server.ip_address, payload_from(since), server.name, server_url)
+    if result.get("status_code") == 409:
+        result = await sync_users_to_client(
+            server.ip_address, payload_from(result.get("client_revision")), server.name, server_url
+        )
+    elif result.get("delta_unsupported"):
+        result = await sync_users_to_client(server.ip_address, payload_from(None), server.name, server_url)
+    result["server_id"] = server.id
+    return result
+
+
+def _record_client_revisions(db: Session, results: List[dict]) -> None:
+    """Guarda en servers.user_sync_revision la revisión aplicada por cada cliente."""
+    by_revision: Dict[int, List[int]] = {}
+    for result in results:
+        if isinstance(result, dict) and result.get("success"):
+            by_revision.setdefault(result["revision"], []).append(result["server_id"])
+    for revision, server_ids in by_revision.items():
+        db.query(Server).filter(Server.id.in_(server_ids)).update(
+            {"user_sync_revision": revision}, synchronize_session=False
+        )
+    db.commit()
+
+
+async def sync_users_to_all_clients(db: Session, force_snapshot: bool = False) -> dict:
+    """
+    Lleva todos los clientes online a la revisión actual de users
 
     Args:
         db: Sesión de base de datos
+        force_snapshot: Enviar la lista completa aunque el cliente esté al día
 
     Returns:
         dict con el resumen de la sincronización
     """
-    # Obtener todos los usuarios de la base de datos central
-    users = get_all_users(db)
-
-    # Serializar usuarios
-    users_data = [
-        {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "password_hash": user.password_hash,
-            "is_admin": user.is_admin,
-            "is_active": user.is_active,
-            "must_change_password": user.must_change_password,
-            "system_uid": user.system_uid,
-            "system_gid": user.system_gid,
-            "ssh_public_key": user.ssh_public_key,
-            "password_max_age_days": user.password_max_age_days,
-            "password_changed_at": user.password_changed_at.isoformat() if user.password_changed_at else None,
-            "created_at": user.created_at.isoformat() if user.created_at else None
-        }
-        for user in users
-    ]
+    revision = current_revision(db)
 
     # Obtener todos los servidores/clientes registrados que estén online
     servers = get_all_servers(db, check_status=False)  # No verificar estado para ser más rápido
     online_servers = [s for s in servers if s.status == "online"]
+    pending = [
+        s for s in online_servers
+        if force_snapshot or s.user_sync_revision is None or s.user_sync_revision != revision
+    ]
 
-    if not online_servers:
-        logger.info("ℹ️  No online clients to sync")
+    if not pending:
+        message = "No online clients to sync" if not online_servers else f"All clients at revision {revision}"
+        logger.info(f"ℹ️  {message}")
         return {
             "success": True,
-            "message": "No online clients to sync",
+            "message": message,
+            "revision": revision,
             "clients_synced": 0,
             "clients_failed": 0,
             "results": []
         }
 
-    logger.info(f"🔄 Starting user sync: {len(users)} users to {len(online_servers)} online clients")
+    logger.info(f"🔄 Starting user sync to r{revision}: {len(pending)}/{len(online_servers)} online clients behind")
 
     # Obtener URL del servidor central desde variable de entorno
     # Esta URL será enviada a los clientes para que sepan dónde enviar updates de contraseña
     server_url = os.getenv("SERVER_URL", os.getenv("PUBLIC_URL", "http://localhost:8000"))
 
-    # Crear tareas asíncronas para sincronizar con todos los clientes
-    # Asumimos que los clientes corren en el puerto 8100 (configurable)
-    tasks = []
-    for server in online_servers:
-        client_url = f"http://{server.ip_address}:8100"
-        tasks.append(sync_users_to_client(client_url, users_data, server.name, server_url))
-
-    # Ejecutar todas las sincronizaciones en paralelo
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # Sincronizar con todos los clientes en paralelo; los payloads se comparten
+    # entre clientes con la misma revisión de origen
+    payloads: Dict[Optional[int], dict] = {}
+    results = await asyncio.gather(
+        *(sync_users_to_server(db, server, revision, server_url, force_snapshot, payloads) for server in pending),
+        return_exceptions=True,
+    )
+    _record_client_revisions(db, results)
+    try:
+        prune_changes(db)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️  Could not prune user changelog: {type(e).__name__}: {str(e)}")
 
     # Contar éxitos y fallos
     successful = sum(1 for r in results if isinstance(r, dict) and r.get("success"))
@@ -180,9 +327,10 @@ async def sync_users_to_all_clients(db: Session) -> dict:
     # Obtener nombres de servidores sincronizados
     synced_servers = [r.get("server_name", "Unknown") for r in results if isinstance(r, dict) and r.get("success")]
     failed_servers = [r.get("server_name", "Unknown") for r in results if isinstance(r, dict) and not r.get("success")]
+    users_sent = sum(len(p["users"]) + len(p.get("deleted_ids", [])) for p in payloads.values())
 
     if successful > 0:
-        logger.info(f"✅ Sync completed: {len(users)} users synced to {successful}/{len(online_servers)} clients")
+        logger.info(f"✅ Sync completed: r{revision} applied on {successful}/{len(pending)} clients")
         logger.info(f"   Synced to: {', '.join(synced_servers)}")
 
     if failed > 0:
@@ -190,8 +338,9 @@ async def sync_users_to_all_clients(db: Session) -> dict:
 
     return {
         "success": True,
-        "message": f"Synced {len(users)} users to {successful}/{len(online_servers)} clients",
-        "users_count": len(users),
+        "message": f"Synced revision {revision} to {successful}/{len(pending)} clients",
+        "revision": revision,
+        "users_sent": users_sent,
         "clients_synced": successful,
         "clients_failed": failed,
         "synced_servers": synced_servers,
@@ -200,8 +349,8 @@ async def sync_users_to_all_clients(db: Session) -> dict:
     }
 
 
-def sync_users_to_all_clients_sync(db: Session) -> dict:
+def sync_users_to_all_clients_sync(db: Session, force_snapshot: bool = False) -> dict:
     """
     Versión síncrona de sync_users_to_all_clients para usar en contextos síncronos
     """
-    return asyncio.run(sync_users_to_all_clients(db))
+    return asyncio.run(sync_users_to_all_clients(db, force_snapshot))